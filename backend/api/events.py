@@ -1,18 +1,49 @@
-from typing import List, Optional
+from typing import List, Literal, Optional
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
 import os
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 from urllib.parse import urlparse
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from db import crud, schemas, models
-from db.base import get_db
+from db.base import ASYNC_DATABASE_URL, AsyncSessionLocal, get_async_db
+from utils.broadcast import EVENTS_NOTIFY, Broadcaster, sse_frame
+from utils.read_cache import CachedResponse, ReadCache
 
 router = APIRouter(prefix="/events", tags=["events"])
 
 S3_BUCKET = os.getenv("S3_BUCKET", "snapshots")
 S3_PUBLIC_ENDPOINT = os.getenv("S3_PUBLIC_ENDPOINT", "http://localhost:9000").rstrip("/")
 
+# комментарий-пинг в /events/stream, чтобы прокси не закрывали тихое соединение
+STREAM_PING_SECONDS = float(os.getenv("STREAM_PING_SECONDS", "15"))
+# сколько изменений догоняется по Last-Event-ID; больше — клиенту уходит reset
+STREAM_REPLAY_LIMIT = int(os.getenv("STREAM_REPLAY_LIMIT", "500"))
+# догон начинается чуть раньше Last-Event-ID: updated_at берётся в начале
+# транзакции, и параллельная транзакция может закоммититься позже
+STREAM_RESUME_OVERLAP = timedelta(seconds=float(os.getenv("STREAM_RESUME_OVERLAP", "2")))
+
+# самый длинный период GET /events/stats
+STATS_MAX_DAYS = int(os.getenv("STATS_MAX_DAYS", "92"))
+
+broadcaster = Broadcaster(
+    notify_dsn=ASYNC_DATABASE_URL.replace("+asyncpg", "", 1) if EVENTS_NOTIFY else None,
+)
+read_cache = ReadCache()
+# изменения с других реплик (EVENTS_NOTIFY) тоже сбрасывают кэш
+broadcaster.add_listener(lambda kind, data: read_cache.invalidate(json.loads(data)["id"]))
+
+_EVENT_LIST = TypeAdapter(List[schemas.EventOut])
+
 
 def _is_http_url(value: str) -> bool:
     try:
@@ -55,6 +86,7 @@ def to_event_out(e) -> schemas.EventOut:
         owner_id=e.owner_id,
         bbox=e.bbox,
         frame_snapshot_url=build_snapshot_url(e.frame_snapshot_path),
+        clip_url=build_snapshot_url(e.clip_path),
         status=e.status.value,
         event_timestamp=e.event_timestamp,
         created_at=e.created_at,
@@ -62,34 +94,260 @@ def to_event_out(e) -> schemas.EventOut:
     )
 
 
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _encode_position(ts: datetime, event_id: int) -> str:
+    raw = json.dumps([ts.isoformat(), event_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def encode_cursor(e) -> str:
+    return _encode_position(e.created_at, e.id)
+
+
+def encode_stream_id(e) -> str:
+    return _encode_position(e.updated_at, e.id)
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    Курсор ленты -> (created_at, id), id сообщения потока -> (updated_at, id);
+    для клиента это непрозрачная строка.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, event_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(event_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _etag(events) -> str:
+    """
+    Слабый ETag по (id, updated_at) — меняется с любым изменением или составом;
+    status добавлен на случай смены в пределах точности updated_at.
+    """
+    h = hashlib.sha1()
+    for e in events:
+        h.update(f"{e.id}:{e.updated_at.isoformat()}:{e.status.value};".encode())
+    return f'W/"{h.hexdigest()[:32]}"'
+
+
+def _http_date(ts: datetime) -> str:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return format_datetime(ts.astimezone(timezone.utc), usegmt=True)
+
+
+def _not_modified(request: Request, cached: CachedResponse, by_date: bool) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        return "*" in tags or cached.etag.removeprefix("W/") in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if by_date and if_modified_since and cached.last_modified:
+        try:
+            return parsedate_to_datetime(if_modified_since) >= parsedate_to_datetime(cached.last_modified)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _cached_response(request: Request, cached: CachedResponse, by_date: bool = True) -> Response:
+    # no-cache: браузер хранит ответ, но каждый раз переспрашивает с If-None-Match
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache", **cached.headers}
+    if cached.last_modified:
+        headers["Last-Modified"] = cached.last_modified
+    if _not_modified(request, cached, by_date):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+
 @router.get("", response_model=List[schemas.EventOut])
-def get_events(
+async def get_events(
+    request: Request,
     status: Optional[schemas.EventStatusLiteral] = Query(None),
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None, description=f"значение {NEXT_CURSOR_HEADER} предыдущей страницы"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Следующая страница — по курсору из заголовка X-Next-Cursor (keyset-пагинация);
+    offset оставлен для совместимости и с курсором не сочетается.
+
+    Страница отдаётся из кэша процесса, пока события не менялись; по
+    If-None-Match — 304. If-Modified-Since для ленты не учитывается: событие,
+    ушедшее со страницы, не сдвигает её Last-Modified.
+    """
+    if cursor is not None and offset:
+        raise HTTPException(status_code=400, detail="Use either cursor or offset")
+    after = decode_cursor(cursor) if cursor is not None else None
+
+    key = (status, limit, offset, cursor)
+    cached = read_cache.get_page(key)
+    if cached is None:
+        version = read_cache.version
+        event_status = models.EventStatus(status) if status else None
+        events = await crud.list_events(db, event_status, limit, offset, after)
+        headers = {}
+        # полная страница — возможно, есть ещё
+        if len(events) == limit:
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(events[-1])
+        cached = CachedResponse(
+            body=_EVENT_LIST.dump_json([to_event_out(e) for e in events]),
+            etag=_etag(events),
+            last_modified=_http_date(max(e.updated_at for e in events)) if events else None,
+            headers=headers,
+        )
+        read_cache.put_page(key, cached, version)
+    return _cached_response(request, cached, by_date=False)
+
+
+def _utc(ts: datetime) -> datetime:
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+
+
+@router.get("/stats", response_model=schemas.EventStatsOut)
+async def get_event_stats(
+    since: Optional[datetime] = Query(None, description="начало периода, по умолчанию — сутки до until"),
+    until: Optional[datetime] = Query(None, description="конец периода (не включительно), по умолчанию — сейчас"),
+    bucket: Literal["hour", "day"] = Query("hour"),
+    group_by: str = Query(",".join(crud.STATS_DIMENSIONS), description="через запятую: status, object_id, owner_known"),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    event_status = models.EventStatus(status) if status else None
-    events = crud.list_events(db, event_status, limit, offset)
-    return [to_event_out(e) for e in events]
+    """
+    Число событий по часам или суткам event_timestamp (UTC) в разрезе status,
+    object_id (класс) и owner_known. Читается из сводки event_stats_hourly,
+    время ответа не зависит от размера events. Границы периода
+    расширяются до целых часов.
+    """
+    dims = list(dict.fromkeys(d.strip() for d in group_by.split(",") if d.strip()))
+    unknown = [d for d in dims if d not in crud.STATS_DIMENSIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown group_by: {', '.join(unknown)}")
+
+    until = _utc(until) if until else datetime.now(timezone.utc)
+    since = _utc(since) if since else until - timedelta(days=1)
+    if since >= until:
+        raise HTTPException(status_code=400, detail="since must be before until")
+    if until - since > timedelta(days=STATS_MAX_DAYS):
+        raise HTTPException(status_code=400, detail=f"Period is longer than {STATS_MAX_DAYS} days")
+
+    since = since.replace(minute=0, second=0, microsecond=0)
+    if until != until.replace(minute=0, second=0, microsecond=0):
+        until = until.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+
+    counts = {}
+    for row in await crud.event_stats(db, since, until, dims):
+        ts = _utc(row.bucket)
+        if bucket == "day":
+            ts = ts.replace(hour=0)
+        key = (ts,) + tuple(getattr(row, d) for d in dims)
+        counts[key] = counts.get(key, 0) + row.count
+
+    rows = []
+    for key in sorted(counts, key=lambda k: (k[0],) + tuple(getattr(v, "value", v) for v in k[1:])):
+        values = dict(zip(dims, key[1:]))
+        if "status" in values:
+            values["status"] = values["status"].value
+        if values.get("object_id") == models.NO_OBJECT_ID:
+            values["object_id"] = None
+        rows.append(schemas.EventStatsRow(bucket=key[0], count=counts[key], **values))
+
+    return schemas.EventStatsOut(
+        bucket=bucket,
+        group_by=dims,
+        since=since,
+        until=until,
+        total=sum(r.count for r in rows),
+        rows=rows,
+    )
+
+
+async def publish_event(kind: str, event: schemas.EventOut):
+    """
+    Событие создано или изменено (kind — created или updated): сброс кэша
+    чтения и рассылка подписчикам /events/stream.
+    """
+    read_cache.invalidate(event.id)
+    await broadcaster.publish(kind, encode_stream_id(event), event.model_dump_json())
+
+
+@router.get("/stream")
+async def stream_events(
+    last_event_id: Optional[str] = Query(None, description="то же, что заголовок Last-Event-ID"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    """
+    Server-Sent Events: created/updated с EventOut в data. При переподключении
+    браузер сам шлёт Last-Event-ID, и пропущенное за время разрыва догоняется
+    из БД; если пропущено больше STREAM_REPLAY_LIMIT, приходит reset —
+    ленту нужно перечитать через GET /events.
+    """
+    resume = last_event_id_header or last_event_id
+    after = decode_cursor(resume) if resume else None
+
+    async def frames():
+        # подписка до догона, чтобы не потерять изменения между ними (дубли безвредны)
+        async with broadcaster.subscribe() as queue:
+            yield "retry: 3000\n\n"
+            if after is not None:
+                async with AsyncSessionLocal() as db:
+                    changed = await crud.list_events_changed_since(
+                        db, after[0] - STREAM_RESUME_OVERLAP, STREAM_REPLAY_LIMIT + 1,
+                    )
+                if len(changed) > STREAM_REPLAY_LIMIT:
+                    yield "event: reset\ndata: {}\n\n"
+                else:
+                    for e in changed:
+                        out = to_event_out(e)
+                        yield sse_frame("updated", encode_stream_id(out), out.model_dump_json())
+
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), STREAM_PING_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if frame is None:
+                    return
+                yield frame
+
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/{event_id}", response_model=schemas.EventOut)
-def get_event(
+async def get_event(
+    request: Request,
     event_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    e = crud.get_event(db, event_id)
-    if e is None:
-        raise HTTPException(status_code=404, detail="Event not found")
-    return to_event_out(e)
+    cached = read_cache.get_item(event_id)
+    if cached is None:
+        version = read_cache.version
+        e = await crud.get_event(db, event_id)
+        if e is None:
+            raise HTTPException(status_code=404, detail="Event not found")
+        cached = CachedResponse(
+            body=to_event_out(e).model_dump_json().encode(),
+            etag=_etag([e]),
+            last_modified=_http_date(e.updated_at),
+        )
+        read_cache.put_item(event_id, cached, version)
+    return _cached_response(request, cached)
 
 
 @router.patch("/{event_id}", response_model=schemas.EventOut)
-def update_event_status_endpoint(
+async def update_event_status_endpoint(
     event_id: int,
     data: schemas.EventStatusUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     mapping = {
         "new": models.EventStatus.new,
@@ -98,8 +356,10 @@ def update_event_status_endpoint(
     }
     new_status = mapping[data.status]
 
-    event = crud.update_event_status(db, event_id, new_status)
+    event = await crud.update_event_status(db, event_id, new_status)
     if event is None:
         raise HTTPException(status_code=404, detail="Event not found")
 
-    return to_event_out(event)
+    out = to_event_out(event)
+    await publish_event("updated", out)
+    return out
@@ -1,17 +1,23 @@
+import asyncio
 import base64
+import json
 import os
+import re
 from uuid import uuid4
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from urllib.parse import urlparse
 
-import boto3
-from botocore.client import Config
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from pydantic import ValidationError
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from db import crud, schemas
-from db.base import get_db
+from db.base import AsyncSessionLocal, get_async_db
+from api.events import publish_event
+from utils.async_s3 import AsyncS3
+from utils.ingest_queue import IngestQueue, RecordRejected
 
 router = APIRouter(prefix="/internal", tags=["internal"])
 
@@ -23,14 +29,11 @@ S3_SECURE = os.getenv("S3_SECURE", "false").lower() == "true"
 
 S3_PUBLIC_ENDPOINT = os.getenv("S3_PUBLIC_ENDPOINT", "http://localhost:9000").rstrip("/")
 
-s3 = boto3.client(
-    "s3",
-    endpoint_url=S3_ENDPOINT,
-    aws_access_key_id=S3_ACCESS_KEY,
-    aws_secret_access_key=S3_SECRET_KEY,
-    config=Config(signature_version="s3v4"),
-    verify=S3_SECURE,
-)
+# предел событий в одном POST /internal/events/batch
+BATCH_MAX_EVENTS = int(os.getenv("BATCH_MAX_EVENTS", "100"))
+
+s3 = AsyncS3(S3_ENDPOINT, S3_ACCESS_KEY, S3_SECRET_KEY, S3_SECURE)
+ingest_queue = IngestQueue()
 
 
 def _is_http_url(value: str) -> bool:
@@ -69,11 +72,41 @@ def _timestamp_to_int(ts: datetime) -> int:
     return int(ts.timestamp())
 
 
+def _new_snapshot_key(ts: datetime) -> str:
+    return f"{_timestamp_to_int(ts)}_{uuid4().hex}.jpg"
+
+
+# ключ клипа выдаёт ML-воркер (clips.ClipRecorder.request), бэкенд только проверяет формат
+_CLIP_KEY_RE = re.compile(r"^clips/[0-9a-f]{32}\.mp4$")
+
+
+def _check_clip_key(data: schemas.EventCreateInternal) -> None:
+    if data.clip_key is not None and not _CLIP_KEY_RE.match(data.clip_key):
+        raise HTTPException(status_code=422, detail="Invalid clip key")
+
+
+def _to_event_out(e) -> schemas.EventOut:
+    object_key = _object_key_from_maybe_url(e.frame_snapshot_path) if e.frame_snapshot_path else ""
+    return schemas.EventOut(
+        id=e.id,
+        object_id=e.object_id,
+        owner_id=e.owner_id,
+        bbox=e.bbox,
+        frame_snapshot_url=_build_public_url(object_key) if object_key else None,
+        clip_url=_build_public_url(e.clip_path) if e.clip_path else None,
+        status=e.status.value,
+        event_timestamp=e.event_timestamp,
+        created_at=e.created_at,
+        updated_at=e.updated_at,
+    )
+
+
 @router.post("/events", response_model=schemas.EventOut)
-def create_event_internal(
+async def create_event_internal(
     data: schemas.EventCreateInternal,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
+    _check_clip_key(data)
     snapshot_key: Optional[str] = None
 
     if data.frame_snapshot_path:
@@ -85,16 +118,10 @@ def create_event_internal(
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid base64 image")
 
-        filename = f"{_timestamp_to_int(data.timestamp)}_{uuid4().hex}.jpg"
-        snapshot_key = filename
+        snapshot_key = _new_snapshot_key(data.timestamp)
 
         try:
-            s3.put_object(
-                Bucket=S3_BUCKET,
-                Key=snapshot_key,
-                Body=image_bytes,
-                ContentType="image/jpeg",
-            )
+            await s3.put_object(S3_BUCKET, snapshot_key, image_bytes, "image/jpeg")
         except Exception as e:
             raise HTTPException(status_code=502, detail=f"S3 upload failed: {e}")
 
@@ -106,17 +133,226 @@ def create_event_internal(
 
     data_for_db = data.model_copy(update={"frame_snapshot_path": snapshot_key})
 
-    e = crud.create_event(db, data_for_db)
+    e = await crud.create_event(db, data_for_db)
+    out = _to_event_out(e)
+    await publish_event("created", out)
+    return out
 
-    object_key = _object_key_from_maybe_url(e.frame_snapshot_path) if e.frame_snapshot_path else ""
-    return schemas.EventOut(
-        id=e.id,
-        object_id=e.object_id,
-        owner_id=e.owner_id,
-        bbox=e.bbox,
-        frame_snapshot_url=_build_public_url(object_key) if object_key else None,
-        status=e.status.value,
-        event_timestamp=e.event_timestamp,
-        created_at=e.created_at,
-        updated_at=e.updated_at,
+
+@router.post("/events/upload", response_model=schemas.EventOut)
+async def create_event_upload(
+    event: str = Form(...),
+    snapshot: UploadFile = File(...),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    То же, что POST /internal/events, но snapshot приходит сырым JPEG
+    в multipart, а не base64 в JSON, без раздувания на треть и без
+    декодирования base64 на бэкенде.
+    """
+    try:
+        data = schemas.EventCreateInternal.model_validate_json(event)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    _check_clip_key(data)
+
+    snapshot_key = _new_snapshot_key(data.timestamp)
+
+    try:
+        await s3.upload_fileobj(S3_BUCKET, snapshot_key, snapshot.file, snapshot.content_type or "image/jpeg")
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"S3 upload failed: {e}")
+
+    data_for_db = data.model_copy(
+        update={"frame_snapshot_path": snapshot_key, "frame_snapshot_base64": None}
     )
+
+    e = await crud.create_event(db, data_for_db)
+    out = _to_event_out(e)
+    await publish_event("created", out)
+    return out
+
+
+@router.post("/events/clip")
+async def upload_event_clip(
+    key: str = Form(...),
+    clip: UploadFile = File(...),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Клип до/после события. Ключ заранее пришёл в событии (clip_key),
+    clip_path (и clip_url в ответах) появляется у события только после
+    загрузки клипа в S3 — неудачная загрузка не оставляет ссылку в никуда.
+
+    409 — событие с этим ключом ещё не записано (например, ждёт в журнале
+    приёма), клип нужно прислать позже.
+    """
+    if not _CLIP_KEY_RE.match(key):
+        raise HTTPException(status_code=422, detail="Invalid clip key")
+    if await crud.get_event_by_clip_key(db, key) is None:
+        raise HTTPException(status_code=409, detail="Event for clip not found yet")
+
+    try:
+        await s3.upload_fileobj(S3_BUCKET, key, clip.file, clip.content_type or "video/mp4")
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"S3 upload failed: {e}")
+
+    e = await crud.attach_clip(db, key)
+    await publish_event("updated", _to_event_out(e))
+    return {"key": key}
+
+
+def _batch_error(index: int, error: str, retryable: bool) -> schemas.EventBatchItemResult:
+    return schemas.EventBatchItemResult(index=index, ok=False, error=error, retryable=retryable)
+
+
+@router.post("/events/batch", response_model=schemas.EventBatchOut)
+async def create_events_batch(
+    events: str = Form(...),
+    snapshots: List[UploadFile] = File(...),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Пачка событий за один запрос: events — JSON-массив событий,
+    snapshots — JPEG в том же порядке. Снапшоты грузятся в S3 параллельно
+    через общий клиент, строки вставляются одним INSERT ... RETURNING
+    в одной транзакции.
+
+    Результат по каждому событию (index — позиция в events): ok + событие
+    или ошибка. retryable=true — событие можно переслать (S3/БД), false —
+    само событие некорректно, повтор не поможет.
+    """
+    try:
+        raw_items = json.loads(events)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="events must be a JSON array")
+    if not isinstance(raw_items, list):
+        raise HTTPException(status_code=422, detail="events must be a JSON array")
+    if len(raw_items) != len(snapshots):
+        raise HTTPException(status_code=422, detail="events and snapshots count mismatch")
+    if len(raw_items) > BATCH_MAX_EVENTS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_EVENTS} events per batch")
+
+    results: List[Optional[schemas.EventBatchItemResult]] = [None] * len(raw_items)
+    valid = []
+    for i, raw in enumerate(raw_items):
+        try:
+            data = schemas.EventCreateInternal.model_validate(raw)
+        except ValidationError as e:
+            results[i] = _batch_error(i, str(e.errors(include_url=False, include_context=False)), False)
+            continue
+        if data.clip_key is not None and not _CLIP_KEY_RE.match(data.clip_key):
+            results[i] = _batch_error(i, "Invalid clip key", False)
+            continue
+        valid.append((i, data))
+
+    async def upload(i: int, data: schemas.EventCreateInternal) -> schemas.EventCreateInternal:
+        snapshot = snapshots[i]
+        snapshot_key = _new_snapshot_key(data.timestamp)
+        await s3.upload_fileobj(S3_BUCKET, snapshot_key, snapshot.file, snapshot.content_type or "image/jpeg")
+        return data.model_copy(update={"frame_snapshot_path": snapshot_key, "frame_snapshot_base64": None})
+
+    uploaded = await asyncio.gather(*(upload(i, data) for i, data in valid), return_exceptions=True)
+
+    to_insert = []
+    for (i, _), outcome in zip(valid, uploaded):
+        if isinstance(outcome, Exception):
+            results[i] = _batch_error(i, f"S3 upload failed: {outcome}", True)
+        else:
+            to_insert.append((i, outcome))
+
+    if to_insert:
+        try:
+            created = await crud.create_events(db, [data for _, data in to_insert])
+        except Exception as e:
+            await db.rollback()
+            # транзакция одна: не вставилось ничего, вся пачка повторяемая,
+            # а загруженные снапшоты при повторе получат новые ключи
+            try:
+                await s3.delete_objects(S3_BUCKET, [data.frame_snapshot_path for _, data in to_insert])
+            except Exception as cleanup_error:
+                print(f"[WARN] Не удалось удалить снапшоты несохранённой пачки: {cleanup_error}")
+            for i, _ in to_insert:
+                results[i] = _batch_error(i, f"DB insert failed: {e}", True)
+        else:
+            for (i, _), e in zip(to_insert, created):
+                results[i] = schemas.EventBatchItemResult(index=i, ok=True, event=_to_event_out(e))
+                await publish_event("created", results[i].event)
+
+    return schemas.EventBatchOut(results=results)
+
+
+@router.post("/events/ingest", response_model=schemas.IngestAccepted, status_code=202)
+async def ingest_event(
+    event: str = Form(...),
+    snapshot: UploadFile = File(...),
+):
+    """
+    Приём без ожидания S3 и БД: событие (multipart, как в /events/upload)
+    дописывается в локальный журнал, ответ 202 с ingest_id сразу после
+    fsync. В S3 и Postgres его пачками переносит фоновый писатель
+    (write_ingested), отставание — GET /internal/ingest/status.
+    """
+    try:
+        data = schemas.EventCreateInternal.model_validate_json(event)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    _check_clip_key(data)
+
+    ingest_id = uuid4().hex
+    meta = {
+        "ingest_id": ingest_id,
+        "event": data.model_dump(mode="json", exclude={"frame_snapshot_base64", "frame_snapshot_path"}),
+        "content_type": snapshot.content_type or "image/jpeg",
+    }
+    try:
+        await ingest_queue.put(meta, await snapshot.read())
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Ingest queue unavailable: {e}")
+
+    return schemas.IngestAccepted(ingest_id=ingest_id)
+
+
+@router.get("/ingest/status", response_model=schemas.IngestStatus)
+async def ingest_status():
+    """Очередь приёма этого процесса: сколько событий ещё не записано и как давно ждёт самое старое."""
+    return schemas.IngestStatus(**ingest_queue.status())
+
+
+async def write_ingested(records: list) -> int:
+    """
+    Пачка из журнала приёма: снапшоты в S3 параллельно, строки одним
+    INSERT. Ключ снапшота выводится из ingest_id, так что повтор пачки
+    перезаписывает те же объекты и не создаёт дублей в БД. Возвращает
+    число пропущенных (некорректных) записей. Если БД отвергает строки
+    по содержимому — RecordRejected, очередь разберёт пачку по одной.
+    """
+    items = []
+    for record in records:
+        try:
+            data = schemas.EventCreateInternal.model_validate(record.meta["event"])
+        except (KeyError, ValidationError) as e:
+            print(f"[ERR] Пропущена запись журнала приёма {record.meta.get('ingest_id')}: {e}")
+            continue
+        ingest_id = record.meta["ingest_id"]
+        key = f"{_timestamp_to_int(data.timestamp)}_{ingest_id}.jpg"
+        items.append((record, ingest_id, data.model_copy(update={"frame_snapshot_path": key})))
+
+    await asyncio.gather(*(
+        s3.put_object(S3_BUCKET, data.frame_snapshot_path, record.body, record.meta.get("content_type", "image/jpeg"))
+        for record, _, data in items
+    ))
+
+    try:
+        async with AsyncSessionLocal() as db:
+            created = await crud.ingest_events(db, [(ingest_id, data) for _, ingest_id, data in items])
+    except (DataError, IntegrityError) as e:
+        try:
+            await s3.delete_objects(S3_BUCKET, [data.frame_snapshot_path for _, _, data in items])
+        except Exception as cleanup_error:
+            print(f"[WARN] Не удалось удалить снапшоты отвергнутой пачки: {cleanup_error}")
+        raise RecordRejected(str(e).splitlines()[0]) from e
+    for e in created:
+        await publish_event("created", _to_event_out(e))
+
+    return len(records) - len(items)
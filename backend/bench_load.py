@@ -0,0 +1,154 @@
+"""
+Нагрузочный тест API: concurrency клиентов одновременно шлют события
+(POST /internal/events/upload с JPEG) и опрашивают ленту, как дашборд
+(GET /events). Печатает RPS и перцентили задержки по каждому виду запросов.
+
+Сравнение на одном воркере uvicorn (до и после перевода на async):
+
+    uvicorn main:app --workers 1 --port 8000
+    python bench_load.py --url http://localhost:8000 --concurrency 200 --duration 30
+
+С --batch N события уходят пачками в POST /internal/events/batch; RPS для
+post считается в событиях, а не в запросах. С --ingest — в журнал приёма
+(POST /internal/events/ingest, ответ 202 до записи в S3 и БД). С
+--conditional опрос ленты идёт с If-None-Match, как у браузера.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime, timezone
+
+import aiohttp
+
+SNAPSHOT = b"\xff\xd8\xff\xe0" + bytes(30_000) + b"\xff\xd9"
+
+
+def _percentile(samples: list, q: float) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+
+
+def _event() -> dict:
+    return {"timestamp": datetime.now(timezone.utc).isoformat(), "bbox": [10, 20, 110, 220], "object_id": 24}
+
+
+async def _post_event(session: aiohttp.ClientSession, url: str, path: str = "/internal/events/upload"):
+    form = aiohttp.FormData()
+    form.add_field("event", json.dumps(_event()))
+    form.add_field("snapshot", SNAPSHOT, filename="snapshot.jpg", content_type="image/jpeg")
+    async with session.post(f"{url}{path}", data=form) as resp:
+        await resp.read()
+        return 200 if resp.status == 202 else resp.status
+
+
+async def _post_batch(session: aiohttp.ClientSession, url: str, size: int):
+    form = aiohttp.FormData()
+    form.add_field("events", json.dumps([_event() for _ in range(size)]))
+    for _ in range(size):
+        form.add_field("snapshots", SNAPSHOT, filename="snapshot.jpg", content_type="image/jpeg")
+    async with session.post(f"{url}/internal/events/batch", data=form) as resp:
+        body = await resp.json()
+        if resp.status == 200 and not all(r["ok"] for r in body["results"]):
+            return None
+        return resp.status
+
+
+async def _get_events(session: aiohttp.ClientSession, url: str, etag: dict = None):
+    # etag — состояние клиента при --conditional: шлёт If-None-Match, как браузер
+    headers = {"If-None-Match": etag["value"]} if etag and etag.get("value") else {}
+    async with session.get(f"{url}/events", params={"limit": 50}, headers=headers) as resp:
+        await resp.read()
+        if etag is not None and resp.status == 200:
+            etag["value"] = resp.headers.get("ETag")
+        return 200 if resp.status == 304 else resp.status
+
+
+async def _client(
+    session, url: str, kind: str, deadline: float, stats: dict, batch: int, ingest: bool, conditional: bool,
+):
+    if kind == "get":
+        etag = {} if conditional else None
+        request = lambda session, url: _get_events(session, url, etag)
+    elif ingest:
+        request = lambda session, url: _post_event(session, url, "/internal/events/ingest")
+    elif batch > 1:
+        request = lambda session, url: _post_batch(session, url, batch)
+    else:
+        request = _post_event
+    while time.monotonic() < deadline:
+        t0 = time.perf_counter()
+        try:
+            status = await request(session, url)
+        except aiohttp.ClientError:
+            status = None
+        elapsed = time.perf_counter() - t0
+        if status == 200:
+            stats[kind].append(elapsed)
+            if kind == "post":
+                stats["events"] += batch
+        else:
+            stats["errors"] += 1
+
+
+async def run(
+    url: str,
+    concurrency: int,
+    duration: float,
+    post_share: float,
+    batch: int = 1,
+    ingest: bool = False,
+    conditional: bool = False,
+) -> dict:
+    stats = {"post": [], "get": [], "events": 0, "errors": 0}
+    posters = max(1, int(concurrency * post_share))
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=60)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*[
+            _client(session, url, "post" if i < posters else "get", deadline, stats, batch, ingest, conditional)
+            for i in range(concurrency)
+        ])
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--post-share", type=float, default=0.3, help="доля клиентов, отправляющих события")
+    parser.add_argument("--batch", type=int, default=1, help="событий в одном запросе (>1 — /internal/events/batch)")
+    parser.add_argument("--ingest", action="store_true", help="события через журнал приёма (202 Accepted)")
+    parser.add_argument("--conditional", action="store_true", help="опрос ленты с If-None-Match (304 без тела)")
+    args = parser.parse_args()
+    if args.ingest and args.batch > 1:
+        parser.error("--ingest и --batch взаимоисключающие")
+
+    stats = asyncio.run(run(
+        args.url.rstrip("/"), args.concurrency, args.duration, args.post_share, args.batch, args.ingest,
+        args.conditional,
+    ))
+
+    total = len(stats["post"]) + len(stats["get"])
+    print(
+        f"[STATS] concurrency={args.concurrency} rps={total / args.duration:.1f} "
+        f"events/s={stats['events'] / args.duration:.1f} errors={stats['errors']}"
+    )
+    for kind in ("post", "get"):
+        s = stats[kind]
+        if not s:
+            continue
+        print(
+            f"[STATS] {kind:<4} n={len(s)} rps={len(s) / args.duration:.1f} "
+            f"p50={_percentile(s, 0.5):.1f}ms p95={_percentile(s, 0.95):.1f}ms "
+            f"p99={_percentile(s, 0.99):.1f}ms mean={statistics.mean(s) * 1000:.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Замер GET /events на большой таблице: OFFSET против курсора (created_at, id),
+с фильтром по status и без, с индексами из db.migrations и без них.
+
+Таблица заполняется в отдельной схеме той же базы (DATABASE_URL), рабочие
+данные не трогаются:
+
+    python bench_pagination.py --rows 1000000
+    python bench_pagination.py --rows 1000000 --drop-indexes   # как было до индексов
+    python bench_pagination.py --cleanup                        # удалить схему
+"""
+import argparse
+import statistics
+import time
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from db.base import Base, engine
+from db import crud, models
+from db.migrations import UPGRADES
+
+SCHEMA = "bench_pagination"
+DEPTHS = (0, 1_000, 10_000, 100_000, 500_000)
+PAGE = 50
+REPEATS = 5
+
+
+def _seed(conn, rows: int):
+    have = conn.execute(text("SELECT count(*) FROM events")).scalar()
+    if have >= rows:
+        return
+    print(f"[INFO] Заполняем events: {have} -> {rows}")
+    # ~10 событий в секунду, статусы вперемешку, как в живой базе
+    conn.execute(text("""
+        INSERT INTO events (object_id, owner_id, bbox, frame_snapshot_path, status,
+                            event_timestamp, created_at, updated_at)
+        SELECT 24, g % 100, '[1, 2, 3, 4]'::jsonb, 'bench/' || g || '.jpg',
+               (ARRAY['new', 'confirmed', 'dismissed'])[1 + g % 3]::eventstatus,
+               ts, ts, ts
+        FROM generate_series(:start, :stop) AS g,
+             LATERAL (SELECT timestamptz '2025-01-01' + g * interval '100 milliseconds' AS ts) t
+    """), {"start": have + 1, "stop": rows})
+    conn.execute(text("ANALYZE events"))
+
+
+def _page(db: Session, status, limit: int, offset: int = 0, after=None) -> list:
+    # тот же запрос, что выполняет crud.list_events
+    return db.scalars(crud.list_events_query(status, limit, offset, after)).all()
+
+
+def _timed(fn) -> float:
+    samples = []
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--drop-indexes", action="store_true", help="замер без индексов ленты")
+    parser.add_argument("--cleanup", action="store_true")
+    args = parser.parse_args()
+
+    with engine.connect() as conn:
+        if args.cleanup:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+            conn.commit()
+            print(f"[OK] Схема {SCHEMA} удалена")
+            return
+
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}"))
+        conn.execute(text(f"SET search_path TO {SCHEMA}"))
+        Base.metadata.create_all(bind=conn)
+        if args.drop_indexes:
+            conn.execute(text("DROP INDEX IF EXISTS ix_events_created_at_id"))
+            conn.execute(text("DROP INDEX IF EXISTS ix_events_status_created_at_id"))
+        else:
+            for statement in UPGRADES:
+                conn.execute(text(statement))
+        _seed(conn, args.rows)
+        conn.commit()
+
+        db = Session(bind=conn)
+        for status in (None, models.EventStatus.confirmed):
+            label = status.value if status else "all"
+            for depth in DEPTHS:
+                # курсор на той же глубине, что и offset (сам поиск не замеряется)
+                anchor = _page(db, status, 1, depth)
+                if not anchor:
+                    continue
+                after = (anchor[0].created_at, anchor[0].id)
+                db.expunge_all()
+
+                offset_ms = _timed(lambda: _page(db, status, PAGE, depth + 1))
+                keyset_ms = _timed(lambda: _page(db, status, PAGE, after=after))
+                print(
+                    f"[STATS] status={label:<9} depth={depth:>7} "
+                    f"offset={offset_ms:8.2f}ms cursor={keyset_ms:7.2f}ms"
+                )
+
+        q = crud.list_events_query(models.EventStatus.confirmed, PAGE, DEPTHS[-1])
+        sql = str(q.compile(conn, compile_kwargs={"literal_binds": True}))
+        plan = conn.execute(text(f"EXPLAIN {sql}")).scalars().all()
+        print("[INFO] План для глубокой страницы со status:\n  " + "\n  ".join(plan))
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
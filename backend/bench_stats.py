@@ -0,0 +1,106 @@
+"""
+Замер статистики событий: GROUP BY по всей events против сводки
+event_stats_hourly (то, что читает GET /events/stats), на растущей таблице.
+
+Таблицы заполняются в отдельной схеме той же базы (DATABASE_URL), рабочие
+данные не трогаются:
+
+    python bench_stats.py --rows 1000000
+    python bench_stats.py --cleanup                        # удалить схему
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from db.base import Base, engine
+from db import crud
+from db.migrations import BACKFILL_EVENT_STATS
+
+SCHEMA = "bench_stats"
+STEPS = (10_000, 100_000, 1_000_000, 5_000_000)
+REPEATS = 5
+
+# то, что пришлось бы считать без сводки
+SCAN = text("""
+    SELECT date_trunc('hour', event_timestamp AT TIME ZONE 'UTC'), status,
+           COALESCE(object_id, -1), owner_id IS NOT NULL, count(*)
+    FROM events
+    WHERE event_timestamp >= :since AND event_timestamp < :until
+    GROUP BY 1, 2, 3, 4
+""")
+
+
+def _seed(conn, rows: int):
+    have = conn.execute(text("SELECT count(*) FROM events")).scalar()
+    if have >= rows:
+        return
+    print(f"[INFO] Заполняем events: {have} -> {rows}")
+    # ~10 событий в секунду, три класса, у каждого пятого владелец не найден
+    conn.execute(text("""
+        INSERT INTO events (object_id, owner_id, bbox, frame_snapshot_path, status,
+                            event_timestamp, created_at, updated_at)
+        SELECT (ARRAY[24, 26, 28])[1 + g % 3], CASE WHEN g % 5 = 0 THEN NULL ELSE g % 100 END,
+               '[1, 2, 3, 4]'::jsonb, 'bench/' || g || '.jpg',
+               (ARRAY['new', 'confirmed', 'dismissed'])[1 + g % 3]::eventstatus,
+               ts, ts, ts
+        FROM generate_series(:start, :stop) AS g,
+             LATERAL (SELECT timestamptz '2025-01-01' + g * interval '100 milliseconds' AS ts) t
+    """), {"start": have + 1, "stop": rows})
+    # сид идёт мимо crud, поэтому сводка пересобирается целиком
+    conn.execute(text("TRUNCATE event_stats_hourly"))
+    conn.execute(text(BACKFILL_EVENT_STATS))
+    conn.execute(text("ANALYZE events"))
+    conn.execute(text("ANALYZE event_stats_hourly"))
+
+
+def _timed(fn) -> float:
+    samples = []
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=STEPS[-1], help="до скольких строк растить events")
+    parser.add_argument("--cleanup", action="store_true")
+    args = parser.parse_args()
+
+    with engine.connect() as conn:
+        if args.cleanup:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+            conn.commit()
+            print(f"[OK] Схема {SCHEMA} удалена")
+            return
+
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}"))
+        conn.execute(text(f"SET search_path TO {SCHEMA}"))
+        Base.metadata.create_all(bind=conn)
+        conn.commit()
+
+        since = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        db = Session(bind=conn)
+        for rows in [s for s in STEPS if s < args.rows] + [args.rows]:
+            _seed(conn, rows)
+            conn.commit()
+            # весь накопленный период: сканирование растёт с таблицей, сводка — только с числом часов
+            until = conn.execute(text("SELECT max(event_timestamp) FROM events")).scalar()
+            params = {"since": since, "until": until}
+            scan_ms = _timed(lambda: conn.execute(SCAN, params).all())
+            rollup_ms = _timed(lambda: db.execute(crud.event_stats_query(since, until, crud.STATS_DIMENSIONS)).all())
+            hours = (until - since).total_seconds() / 3600
+            print(
+                f"[STATS] rows={rows:>8} hours={hours:6.0f} "
+                f"group_by={scan_ms:9.2f}ms rollup={rollup_ms:7.2f}ms"
+            )
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,51 +1,230 @@
-from typing import List, Optional
-from sqlalchemy.orm import Session
+from collections import Counter
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence, Tuple
+from sqlalchemy import Select, func, insert, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from . import models, schemas
 
 
-def create_event(db: Session, data: schemas.EventCreateInternal) -> models.Event:
+def _stats_key(event_timestamp: datetime, status: models.EventStatus, object_id, owner_id) -> tuple:
+    if event_timestamp.tzinfo is None:
+        event_timestamp = event_timestamp.replace(tzinfo=timezone.utc)
+    bucket = event_timestamp.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return (
+        bucket,
+        status,
+        object_id if object_id is not None else models.NO_OBJECT_ID,
+        owner_id is not None,
+    )
+
+
+async def _bump_stats(db: AsyncSession, deltas: Counter) -> None:
+    """
+    Прибавляет deltas к event_stats_hourly одним upsert (без commit — в
+    транзакции вызывающего). Ключи упорядочены, чтобы параллельные
+    транзакции не блокировали друг друга крест-накрест.
+    """
+    rows = [
+        {"bucket": b, "status": st, "object_id": o, "owner_known": k, "count": n}
+        for (b, st, o, k), n in sorted(deltas.items(), key=lambda kv: (kv[0][0], kv[0][1].value, kv[0][2], kv[0][3]))
+        if n
+    ]
+    if not rows:
+        return
+    T = models.EventStatsHourly
+    stmt = pg_insert(T).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[T.bucket, T.status, T.object_id, T.owner_known],
+        set_={"count": T.count + stmt.excluded.count},
+    )
+    await db.execute(stmt)
+
+
+async def create_event(db: AsyncSession, data: schemas.EventCreateInternal) -> models.Event:
     event = models.Event(
         object_id=data.object_id,
         owner_id=data.owner_id,
         bbox=data.bbox,
         frame_snapshot_path=data.frame_snapshot_path,
+        clip_key=data.clip_key,
         event_timestamp=data.timestamp,
     )
     db.add(event)
-    db.commit()
-    db.refresh(event)
+    await _bump_stats(db, Counter([_stats_key(data.timestamp, models.EventStatus.new, data.object_id, data.owner_id)]))
+    await db.commit()
+    await db.refresh(event)
     return event
 
 
-def get_event(db: Session, event_id: int) -> Optional[models.Event]:
-    return db.query(models.Event).filter(models.Event.id == event_id).first()
+async def create_events(db: AsyncSession, items: List[schemas.EventCreateInternal]) -> List[models.Event]:
+    """
+    Пачка событий одним INSERT ... VALUES (...), (...) RETURNING в одной
+    транзакции; строки возвращаются в порядке items.
+    """
+    if not items:
+        return []
+    rows = [
+        {
+            "object_id": data.object_id,
+            "owner_id": data.owner_id,
+            "bbox": data.bbox,
+            "frame_snapshot_path": data.frame_snapshot_path,
+            "clip_key": data.clip_key,
+            "event_timestamp": data.timestamp,
+        }
+        for data in items
+    ]
+    result = await db.scalars(
+        insert(models.Event).returning(models.Event, sort_by_parameter_order=True),
+        rows,
+    )
+    events = list(result)
+    await _bump_stats(db, Counter(
+        _stats_key(data.timestamp, models.EventStatus.new, data.object_id, data.owner_id) for data in items
+    ))
+    await db.commit()
+    return events
+
+
+async def ingest_events(
+    db: AsyncSession,
+    items: List[Tuple[str, schemas.EventCreateInternal]],
+) -> List[models.Event]:
+    """
+    Запись пачки из журнала приёма: (ingest_id, событие). Уже записанные
+    ingest_id пропускаются (ON CONFLICT DO NOTHING), возвращаются только
+    вставленные строки.
+    """
+    if not items:
+        return []
+    rows = [
+        {
+            "ingest_id": ingest_id,
+            "object_id": data.object_id,
+            "owner_id": data.owner_id,
+            "bbox": data.bbox,
+            "frame_snapshot_path": data.frame_snapshot_path,
+            "clip_key": data.clip_key,
+            "event_timestamp": data.timestamp,
+        }
+        for ingest_id, data in items
+    ]
+    stmt = pg_insert(models.Event).on_conflict_do_nothing(index_elements=["ingest_id"])
+    result = await db.scalars(stmt.returning(models.Event), rows)
+    events = list(result)
+    # только реально вставленные: повтор из журнала сводку не трогает
+    await _bump_stats(db, Counter(
+        _stats_key(e.event_timestamp, e.status, e.object_id, e.owner_id) for e in events
+    ))
+    await db.commit()
+    return events
+
+
+async def get_event(db: AsyncSession, event_id: int) -> Optional[models.Event]:
+    return await db.get(models.Event, event_id)
+
+
+async def get_event_by_clip_key(db: AsyncSession, clip_key: str) -> Optional[models.Event]:
+    return await db.scalar(select(models.Event).where(models.Event.clip_key == clip_key))
+
+
+async def attach_clip(db: AsyncSession, clip_key: str) -> Optional[models.Event]:
+    """Клип загружен в S3: с этого момента у события есть clip_url."""
+    event = await get_event_by_clip_key(db, clip_key)
+    if event is None:
+        return None
+    event.clip_path = clip_key
+    await db.commit()
+    await db.refresh(event)
+    return event
 
 
-def list_events(
-    db: Session,
+def list_events_query(
     status: Optional[models.EventStatus],
     limit: int,
-    offset: int,
-) -> List[models.Event]:
-    q = db.query(models.Event)
+    offset: int = 0,
+    after: Optional[Tuple[datetime, int]] = None,
+) -> Select:
+    """
+    Лента событий, новые сверху. after = (created_at, id) последнего события
+    предыдущей страницы: keyset-пагинация, глубина страницы не влияет на
+    скорость (в отличие от offset, который сохранён для совместимости).
+    """
+    q = select(models.Event)
     if status is not None:
-        q = q.filter(models.Event.status == status)
+        q = q.where(models.Event.status == status)
+    if after is not None:
+        q = q.where(tuple_(models.Event.created_at, models.Event.id) < tuple_(*after))
     return (
-        q.order_by(models.Event.created_at.desc())
+        q.order_by(models.Event.created_at.desc(), models.Event.id.desc())
         .offset(offset)
         .limit(limit)
-        .all()
     )
 
-def update_event_status(
-    db: Session,
+
+async def list_events(
+    db: AsyncSession,
+    status: Optional[models.EventStatus],
+    limit: int,
+    offset: int = 0,
+    after: Optional[Tuple[datetime, int]] = None,
+) -> List[models.Event]:
+    result = await db.scalars(list_events_query(status, limit, offset, after))
+    return list(result)
+
+async def list_events_changed_since(db: AsyncSession, since: datetime, limit: int) -> List[models.Event]:
+    """Созданные или изменённые после since, в порядке изменения."""
+    q = (
+        select(models.Event)
+        .where(models.Event.updated_at > since)
+        .order_by(models.Event.updated_at.asc(), models.Event.id.asc())
+        .limit(limit)
+    )
+    return list(await db.scalars(q))
+
+
+async def update_event_status(
+    db: AsyncSession,
     event_id: int,
     new_status: models.EventStatus,
 ) -> models.Event | None:
-    event = db.query(models.Event).filter(models.Event.id == event_id).first()
+    # FOR UPDATE: параллельная смена статуса не должна дважды списать старый статус из сводки
+    event = await db.get(models.Event, event_id, with_for_update=True)
     if event is None:
         return None
+    if event.status != new_status:
+        deltas = Counter()
+        deltas[_stats_key(event.event_timestamp, event.status, event.object_id, event.owner_id)] -= 1
+        deltas[_stats_key(event.event_timestamp, new_status, event.object_id, event.owner_id)] += 1
+        await _bump_stats(db, deltas)
     event.status = new_status
-    db.commit()
-    db.refresh(event)
-    return event
\ No newline at end of file
+    await db.commit()
+    await db.refresh(event)
+    return event
+
+
+STATS_DIMENSIONS = ("status", "object_id", "owner_known")
+
+
+def event_stats_query(since: datetime, until: datetime, group_by: Sequence[str]) -> Select:
+    """
+    Почасовые счётчики из event_stats_hourly за [since, until), сгруппированные
+    по bucket и group_by (остальные измерения суммируются). Стоимость зависит
+    от длины периода, а не от размера events.
+    """
+    T = models.EventStatsHourly
+    columns = [T.bucket] + [getattr(T, name) for name in group_by]
+    total = func.sum(T.count)
+    return (
+        select(*columns, total.label("count"))
+        .where(T.bucket >= since, T.bucket < until)
+        .group_by(*columns)
+        .having(total != 0)
+        .order_by(*columns)
+    )
+
+
+async def event_stats(db: AsyncSession, since: datetime, until: datetime, group_by: Sequence[str]) -> list:
+    result = await db.execute(event_stats_query(since, until, group_by))
+    return list(result.all())
@@ -0,0 +1,56 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+# воркеры uvicorn стартуют одновременно: миграции выполняются по очереди
+# под pg_advisory_xact_lock с этим ключом
+MIGRATIONS_LOCK_KEY = 7_301_245
+
+# сводка event_stats_hourly по уже накопленным событиям. Час считается в UTC,
+# как в crud._stats_key; пустота сводки — для баз, заполненных до schema_upgrades
+BACKFILL_EVENT_STATS = """
+    INSERT INTO event_stats_hourly (bucket, status, object_id, owner_known, count)
+    SELECT date_trunc('hour', event_timestamp AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+           status, COALESCE(object_id, -1), owner_id IS NOT NULL, count(*)
+    FROM events
+    WHERE NOT EXISTS (SELECT 1 FROM event_stats_hourly)
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (bucket, status, object_id, owner_known)
+    DO UPDATE SET count = event_stats_hourly.count + EXCLUDED.count
+"""
+
+# create_all() создаёт только недостающие таблицы, новые колонки и индексы в уже
+# существующих таблицах добавляются здесь. Каждая команда идемпотентна,
+# имена индексов совпадают с __table_args__ моделей.
+UPGRADES = [
+    "ALTER TABLE events ADD COLUMN IF NOT EXISTS clip_path TEXT",
+    "CREATE INDEX IF NOT EXISTS ix_events_created_at_id ON events (created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_events_status_created_at_id ON events (status, created_at DESC, id DESC)",
+    "ALTER TABLE events ADD COLUMN IF NOT EXISTS ingest_id VARCHAR(32)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_events_ingest_id ON events (ingest_id)",
+    "CREATE INDEX IF NOT EXISTS ix_events_updated_at_id ON events (updated_at, id)",
+    "ALTER TABLE events ADD COLUMN IF NOT EXISTS clip_key TEXT",
+    "CREATE INDEX IF NOT EXISTS ix_events_clip_key ON events (clip_key)",
+    """
+    CREATE TABLE IF NOT EXISTS schema_upgrades (
+        name TEXT PRIMARY KEY,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+]
+
+# переносы данных: каждый выполняется один раз, выполненные отмечены в schema_upgrades
+ONCE = [
+    ("backfill_event_stats_hourly", BACKFILL_EVENT_STATS),
+]
+
+
+def upgrade(engine: Engine) -> None:
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATIONS_LOCK_KEY})
+        for statement in UPGRADES:
+            conn.execute(text(statement))
+        for name, statement in ONCE:
+            done = conn.execute(text("SELECT 1 FROM schema_upgrades WHERE name = :name"), {"name": name}).first()
+            if done is None:
+                conn.execute(text(statement))
+                conn.execute(text("INSERT INTO schema_upgrades (name) VALUES (:name)"), {"name": name})
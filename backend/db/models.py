@@ -1,7 +1,7 @@
 import enum
 from sqlalchemy import (
-    Column, Integer, Float,
-    Enum, Text, TIMESTAMP, func
+    Column, Integer, Float, String, Boolean,
+    Enum, Text, TIMESTAMP, Index, func
 )
 from sqlalchemy.dialects.postgresql import JSONB
 from .base import Base
@@ -24,6 +24,13 @@ class Event(Base):
     bbox = Column(JSONB, nullable=True)
 
     frame_snapshot_path = Column(Text, nullable=False)
+    # клип до/после события: clip_key выдаёт ML-воркер вместе с событием,
+    # clip_path (ключ в S3) заполняется, только когда клип действительно загружен
+    clip_key = Column(Text, nullable=True)
+    clip_path = Column(Text, nullable=True)
+
+    # ID из POST /internal/events/ingest: повторная запись из журнала приёма не создаёт дубль
+    ingest_id = Column(String(32), nullable=True)
 
     status = Column(Enum(EventStatus), nullable=False, default=EventStatus.new)
 
@@ -43,3 +50,34 @@ class Event(Base):
         onupdate=func.now(),
         nullable=False,
     )
+
+    # ленты событий: ORDER BY created_at DESC, id DESC (+ фильтр по status)
+    # читаются по индексу без сортировки, в т.ч. постранично по курсору
+    __table_args__ = (
+        Index("ix_events_created_at_id", created_at.desc(), id.desc()),
+        Index("ix_events_status_created_at_id", status, created_at.desc(), id.desc()),
+        Index("ix_events_ingest_id", ingest_id, unique=True),
+        # догон /events/stream по Last-Event-ID: изменения после (updated_at, id)
+        Index("ix_events_updated_at_id", updated_at, id),
+        Index("ix_events_clip_key", clip_key),
+    )
+
+
+# object_id в сводке, когда класс не известен (в первичном ключе NULL нельзя)
+NO_OBJECT_ID = -1
+
+
+class EventStatsHourly(Base):
+    """
+    Сводка events по часам event_timestamp (UTC): сколько событий в каждом
+    статусе, классе и с известным/неизвестным владельцем. Ведётся в crud
+    в той же транзакции, что и вставка событий и смена статуса.
+    """
+    __tablename__ = "event_stats_hourly"
+
+    bucket = Column(TIMESTAMP(timezone=True), primary_key=True)
+    status = Column(Enum(EventStatus), primary_key=True)
+    object_id = Column(Integer, primary_key=True)
+    owner_known = Column(Boolean, primary_key=True)
+
+    count = Column(Integer, nullable=False, default=0)
@@ -1,19 +1,31 @@
-from typing import Optional, Literal, List
-from datetime import datetime
-from pydantic import BaseModel
+from typing import Annotated, Optional, Literal, List
+from datetime import datetime, timezone
+from pydantic import BaseModel, Field, field_validator
 
 EventStatusLiteral = Literal["new", "confirmed", "dismissed"]
+# колонки Integer в Postgres: больше не влезет, и запись отвергнет уже БД
+Int32 = Annotated[int, Field(ge=-2**31, le=2**31 - 1)]
 
 class EventStatusUpdate(BaseModel):
     status: EventStatusLiteral
 
 class EventCreateInternal(BaseModel):
     timestamp: datetime
-    owner_id: Optional[int] = None
-    object_id: Optional[int] = None
+    owner_id: Optional[Int32] = None
+    object_id: Optional[Int32] = None
     bbox: List[float]
     frame_snapshot_base64: Optional[str] = None
     frame_snapshot_path: Optional[str] = None
+    clip_key: Optional[str] = None
+
+    @field_validator("timestamp")
+    @classmethod
+    def _timestamp_utc(cls, value: datetime) -> datetime:
+        # время без смещения — UTC (иначе драйвер БД посчитал бы его местным временем
+        # сервера, и час в event_stats_hourly разошёлся бы с event_timestamp)
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value
 
 class EventOut(BaseModel):
     id: int
@@ -21,7 +33,56 @@ class EventOut(BaseModel):
     owner_id: Optional[int]
     bbox: Optional[List[float]]
     frame_snapshot_url: str
+    clip_url: Optional[str] = None
     status: EventStatusLiteral
     event_timestamp: datetime
     created_at: datetime
     updated_at: datetime
+
+
+class EventBatchItemResult(BaseModel):
+    index: int
+    ok: bool
+    event: Optional[EventOut] = None
+    error: Optional[str] = None
+    # ошибку можно повторить (S3/БД), а не отказ по содержимому события
+    retryable: bool = False
+
+class EventBatchOut(BaseModel):
+    results: List[EventBatchItemResult]
+
+
+class IngestAccepted(BaseModel):
+    ingest_id: str
+    status: Literal["queued"] = "queued"
+
+class IngestStatus(BaseModel):
+    running: bool
+    dir: Optional[str]
+    pending: int
+    lag_seconds: float
+    accepted: int
+    written: int
+    skipped: int
+    dead_lettered: int
+    retries: int
+    last_error: Optional[str]
+    last_write_at: Optional[float]
+    wal_bytes: int
+
+
+class EventStatsRow(BaseModel):
+    bucket: datetime
+    # None, если измерения нет в group_by; object_id None — класс не известен
+    status: Optional[EventStatusLiteral] = None
+    object_id: Optional[int] = None
+    owner_known: Optional[bool] = None
+    count: int
+
+class EventStatsOut(BaseModel):
+    bucket: Literal["hour", "day"]
+    group_by: List[str]
+    since: datetime
+    until: datetime
+    total: int
+    rows: List[EventStatsRow]
@@ -3,8 +3,9 @@ from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 from fastapi.middleware.cors import CORSMiddleware
 
-from db.base import Base, engine
+from db.base import Base, engine, async_engine
 from db import models
+from db.migrations import upgrade
 from api import events, streams, internal
 
 
@@ -13,6 +14,24 @@ app = FastAPI(title="Abandoned Object Detection API")
 @app.on_event("startup")
 def startup():
     Base.metadata.create_all(bind=engine)
+    upgrade(engine)
+    # синхронный движок нужен только для миграций
+    engine.dispose()
+
+
+@app.on_event("startup")
+async def start_clients():
+    await internal.s3.start()
+    await events.broadcaster.start()
+    await internal.ingest_queue.start(internal.write_ingested)
+
+
+@app.on_event("shutdown")
+async def stop_clients():
+    await internal.ingest_queue.stop()
+    await events.broadcaster.stop()
+    await internal.s3.stop()
+    await async_engine.dispose()
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,6 +39,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[events.NEXT_CURSOR_HEADER],
 )
 
 app.include_router(streams.router)
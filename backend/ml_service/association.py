@@ -0,0 +1,165 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from config import (
+    PERSON_CLASS,
+    LEFT_OBJECT_CLASSES,
+    OBJ_CONF_THR,
+    MIN_OBJ_AREA_FRAC,
+    MAX_OBJ_AREA_FRAC,
+    APPEAR_WINDOW,
+    MIN_INITIAL_IOU,
+    NEAR_IOU,
+)
+from tracking import ObjectStore
+
+_LEFT_CLASSES = np.array(sorted(LEFT_OBJECT_CLASSES), dtype=int)
+
+
+class FrameDetections(NamedTuple):
+    person_boxes: np.ndarray    # (P, 4) xyxy
+    person_ids: np.ndarray      # (P,) id трека, -1 если нет
+    object_boxes: np.ndarray    # (O, 4) xyxy
+    object_ids: np.ndarray      # (O,)
+    object_classes: np.ndarray  # (O,)
+
+
+def iou_matrix(boxes_a, boxes_b) -> np.ndarray:
+    """
+    Попарный IoU: (N, 4) x (M, 4) -> (N, M).
+    Считается по той же формуле, что и скалярный вариант,
+    поэтому результаты совпадают бит в бит.
+    """
+    a = np.asarray(boxes_a, dtype=float).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=float).reshape(-1, 4)
+
+    xA = np.maximum(a[:, None, 0], b[None, :, 0])
+    yA = np.maximum(a[:, None, 1], b[None, :, 1])
+    xB = np.minimum(a[:, None, 2], b[None, :, 2])
+    yB = np.minimum(a[:, None, 3], b[None, :, 3])
+
+    inter = np.maximum(0, xB - xA) * np.maximum(0, yB - yA)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+
+    out = np.zeros_like(inter)
+    np.divide(inter, union, out=out, where=union > 0)
+    return out
+
+
+def split_detections(xyxy, cls, conf, ids, frame_area: float) -> FrameDetections:
+    """
+    Делит детекции кадра на людей и предметы масками, без построчного обхода.
+    """
+    xyxy = np.asarray(xyxy, dtype=float).reshape(-1, 4)
+    cls = np.asarray(cls, dtype=int)
+    conf = np.asarray(conf, dtype=float)
+    ids = np.asarray(ids, dtype=int)
+
+    keep = conf >= OBJ_CONF_THR
+
+    person_mask = keep & (cls == PERSON_CLASS)
+
+    area_frac = (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1]) / frame_area
+    object_mask = (
+        keep
+        & np.isin(cls, _LEFT_CLASSES)
+        & (area_frac >= MIN_OBJ_AREA_FRAC)
+        & (area_frac <= MAX_OBJ_AREA_FRAC)
+    )
+
+    return FrameDetections(
+        person_boxes=xyxy[person_mask],
+        person_ids=ids[person_mask],
+        object_boxes=xyxy[object_mask],
+        object_ids=ids[object_mask],
+        object_classes=cls[object_mask],
+    )
+
+
+def associate(
+    tracked_objects: ObjectStore,
+    person_boxes: np.ndarray,
+    person_ids: np.ndarray,
+    now: int,
+    threshold_frames: int,
+) -> list:
+    """
+    Связывает людей с отслеживаемыми предметами по одной матрице IoU на кадр:
+    обновляет last_person_near_frame, owner_id и last_owner_frame,
+    возвращает предметы, ставшие оставленными, и удаляет давно пропавшие
+    (по ttl хранилища, независимо от владельца).
+    """
+    if not tracked_objects:
+        return []
+
+    objs = list(tracked_objects.values())
+    n = len(objs)
+
+    active = np.fromiter((not o.flagged_left for o in objs), dtype=bool, count=n)
+    boxes = np.array([o.bbox for o in objs], dtype=float).reshape(n, 4)
+
+    if len(person_boxes):
+        ious = iou_matrix(person_boxes, boxes)  # (P, T)
+        best_person = ious.argmax(axis=0)
+        best_iou = ious[best_person, np.arange(n)]
+        near = ious.max(axis=0) > NEAR_IOU
+    else:
+        best_person = np.zeros(n, dtype=int)
+        best_iou = np.zeros(n, dtype=float)
+        near = np.zeros(n, dtype=bool)
+
+    # человек рядом с предметом
+    near &= active
+    for i in np.flatnonzero(near):
+        objs[i].last_person_near_frame = now
+
+    # владелец
+    has_owner = np.fromiter((o.owner_id is not None for o in objs), dtype=bool, count=n)
+    appeared = np.fromiter((o.appeared_frame for o in objs), dtype=float, count=n)
+    last_near = np.fromiter(
+        (np.nan if o.last_person_near_frame is None else o.last_person_near_frame for o in objs),
+        dtype=float,
+        count=n,
+    )
+
+    no_owner = active & ~has_owner
+    assign = no_owner & (best_iou > MIN_INITIAL_IOU) & (np.abs(appeared - now) <= APPEAR_WINDOW)
+    # неизвестный владелец, но явно был рядом человек недавно
+    with np.errstate(invalid="ignore"):
+        unknown = no_owner & ~assign & (now - last_near <= APPEAR_WINDOW)
+    refresh = active & has_owner & (best_iou > NEAR_IOU)
+
+    for i in np.flatnonzero(assign):
+        # владелец — конкретный трек персоны (int), если есть
+        pid = int(person_ids[best_person[i]])
+        objs[i].owner_id = pid if pid != -1 else None
+        objs[i].last_owner_frame = now
+    for i in np.flatnonzero(unknown):
+        objs[i].owner_id = -1  # спец-значение "unknown"
+        objs[i].last_owner_frame = now
+    for i in np.flatnonzero(refresh):
+        objs[i].last_owner_frame = now
+
+    # оставленные / давно пропавшие
+    last_owner = np.fromiter(
+        (np.nan if o.owner_id is None or o.last_owner_frame is None else o.last_owner_frame for o in objs),
+        dtype=float,
+        count=n,
+    )
+    last_seen = np.fromiter((o.last_seen_frame for o in objs), dtype=float, count=n)
+
+    eligible = active & ~np.isnan(last_owner)
+    not_seen_for = now - last_seen
+    with np.errstate(invalid="ignore"):
+        left = eligible & (now - last_owner > threshold_frames) & (not_seen_for <= threshold_frames)
+
+    left_events = []
+    for i in np.flatnonzero(left):
+        objs[i].flagged_left = True
+        left_events.append(objs[i])
+
+    tracked_objects.expire(now)
+    return left_events
@@ -0,0 +1,201 @@
+"""
+Микро-бенчмарк стадии ассоциации людей и предметов.
+
+Сравнивает прежний вариант (вложенные циклы со скалярным iou и dict-детекциями)
+с векторизованным из association.py на синтетической сцене и проверяет,
+что оба дают одинаковые события и одинаковое состояние объектов.
+
+    python ml_service/bench_association.py [--frames 200] [--sizes 10 100 500]
+"""
+import argparse
+import copy
+import time
+
+import numpy as np
+
+from config import (
+    PERSON_CLASS,
+    LEFT_OBJECT_CLASSES,
+    OBJ_CONF_THR,
+    MIN_OBJ_AREA_FRAC,
+    MAX_OBJ_AREA_FRAC,
+    APPEAR_WINDOW,
+    MIN_INITIAL_IOU,
+    LEFT_SECONDS,
+    TARGET_FPS,
+)
+from tracking import ObjectStore, bbox_center, update_tracked_objects
+from association import split_detections, associate
+
+FRAME_W, FRAME_H = 1280, 720
+
+
+def _iou(boxA, boxB):
+    xA = max(boxA[0], boxB[0])
+    yA = max(boxA[1], boxB[1])
+    xB = min(boxA[2], boxB[2])
+    yB = min(boxA[3], boxB[3])
+    inter = max(0, xB - xA) * max(0, yB - yA)
+    areaA = (boxA[2] - boxA[0]) * (boxA[3] - boxA[1])
+    areaB = (boxB[2] - boxB[0]) * (boxB[3] - boxB[1])
+    union = areaA + areaB - inter
+    return inter / union if union > 0 else 0
+
+
+def legacy_step(tracked_objects, xyxy_np, cls_np, conf_np, ids_np, frame_area, now, threshold_frames):
+    persons = []
+    objects = []
+    for i in range(len(xyxy_np)):
+        xy = tuple(xyxy_np[i].tolist())
+        class_id = cls_np[i]
+        tid = ids_np[i]
+        conf = float(conf_np[i])
+        if conf < OBJ_CONF_THR:
+            continue
+        area_frac = (xy[2] - xy[0]) * (xy[3] - xy[1]) / frame_area
+        if class_id == PERSON_CLASS:
+            persons.append({"tid": tid, "bbox": xy, "center": bbox_center(xy)})
+        elif class_id in LEFT_OBJECT_CLASSES:
+            if not (MIN_OBJ_AREA_FRAC <= area_frac <= MAX_OBJ_AREA_FRAC):
+                continue
+            objects.append({"tid": tid, "bbox": xy, "class": class_id})
+
+    update_tracked_objects(
+        tracked_objects,
+        np.array([o["bbox"] for o in objects], dtype=float).reshape(-1, 4),
+        np.array([o["tid"] for o in objects], dtype=int),
+        np.array([o["class"] for o in objects], dtype=int),
+        now,
+    )
+
+    for p in persons:
+        for obj in tracked_objects.values():
+            if obj.flagged_left:
+                continue
+            if _iou(p["bbox"], obj.bbox) > 0.05:
+                obj.last_person_near_frame = now
+
+    for obj in tracked_objects.values():
+        if obj.flagged_left:
+            continue
+        best_iou = 0.0
+        best_person_id = None
+        for p in persons:
+            i = _iou(p["bbox"], obj.bbox)
+            if i > best_iou:
+                best_iou = i
+                best_person_id = p["tid"]
+        if obj.owner_id is None:
+            if best_iou > MIN_INITIAL_IOU and abs(obj.appeared_frame - now) <= APPEAR_WINDOW:
+                obj.owner_id = best_person_id if best_person_id != -1 else None
+                obj.last_owner_frame = now
+            elif obj.last_person_near_frame is not None:
+                if now - obj.last_person_near_frame <= APPEAR_WINDOW:
+                    obj.owner_id = -1
+                    obj.last_owner_frame = now
+        else:
+            if best_iou > 0.05:
+                obj.last_owner_frame = now
+
+    left_events = []
+    for tid_, obj in list(tracked_objects.items()):
+        not_seen_for = now - obj.last_seen_frame
+        if obj.flagged_left or obj.owner_id is None or obj.last_owner_frame is None:
+            # TTL для всех объектов, включая ghost_* без владельца
+            if not_seen_for > 5 * threshold_frames:
+                del tracked_objects[tid_]
+            continue
+        no_owner_for = now - obj.last_owner_frame
+        if no_owner_for > threshold_frames and not_seen_for <= threshold_frames:
+            obj.flagged_left = True
+            left_events.append(obj)
+        if not_seen_for > 5 * threshold_frames:
+            del tracked_objects[tid_]
+    return left_events
+
+
+def vectorized_step(tracked_objects, xyxy_np, cls_np, conf_np, ids_np, frame_area, now, threshold_frames):
+    dets = split_detections(xyxy_np, cls_np, conf_np, ids_np, frame_area)
+    update_tracked_objects(
+        tracked_objects, dets.object_boxes, dets.object_ids, dets.object_classes, now
+    )
+    return associate(tracked_objects, dets.person_boxes, dets.person_ids, now, threshold_frames)
+
+
+def make_scene(n_boxes, n_frames, seed=0):
+    """
+    Половина боксов — стоящие предметы, половина — люди, которые бродят
+    и со временем уходят из кадра (чтобы появлялись оставленные предметы).
+    """
+    rng = np.random.default_rng(seed)
+    n_obj = max(1, n_boxes // 2)
+    n_per = max(1, n_boxes - n_obj)
+
+    obj_xy = rng.uniform([0, 0], [FRAME_W - 60, FRAME_H - 60], size=(n_obj, 2))
+    obj_wh = rng.uniform(20, 60, size=(n_obj, 2))
+    obj_cls = rng.choice(sorted(LEFT_OBJECT_CLASSES), size=n_obj)
+    obj_ids = np.where(rng.random(n_obj) < 0.2, -1, np.arange(1, n_obj + 1))
+
+    per_xy = obj_xy[rng.integers(0, n_obj, size=n_per)] - 20
+    per_vel = rng.normal(0, 6, size=(n_per, 2))
+    per_leave = rng.integers(n_frames // 4, n_frames, size=n_per)
+
+    frames = []
+    for f in range(n_frames):
+        per_xy = per_xy + per_vel
+        alive = per_leave > f
+        per_boxes = np.hstack([per_xy, per_xy + [60, 160]])[alive]
+        obj_boxes = np.hstack([obj_xy, obj_xy + obj_wh])
+        xyxy = np.vstack([obj_boxes, per_boxes])
+        cls = np.concatenate([obj_cls, np.full(len(per_boxes), PERSON_CLASS)])
+        conf = rng.uniform(0.3, 1.0, size=len(xyxy))
+        ids = np.concatenate([obj_ids, 1000 + np.flatnonzero(alive)])
+        frames.append((xyxy, cls.astype(int), conf, ids.astype(int)))
+    return frames
+
+
+def _state(tracked_objects):
+    return [
+        (k, o.bbox, o.class_id, o.owner_id, o.last_owner_frame,
+         o.last_person_near_frame, o.last_seen_frame, o.flagged_left)
+        for k, o in tracked_objects.items()
+    ]
+
+
+def run(step, frames, threshold_frames):
+    tracked_objects = ObjectStore(ttl=5 * threshold_frames, max_size=0)
+    events = []
+    timings = []
+    frame_area = FRAME_W * FRAME_H
+    for now, (xyxy, cls, conf, ids) in enumerate(frames):
+        t0 = time.perf_counter()
+        left = step(tracked_objects, xyxy, cls, conf, ids, frame_area, now, threshold_frames)
+        timings.append(time.perf_counter() - t0)
+        events.extend((now, o.tid, o.class_id, o.owner_id, o.bbox) for o in left)
+    return events, _state(tracked_objects), np.array(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500])
+    args = parser.parse_args()
+
+    threshold_frames = int(LEFT_SECONDS * TARGET_FPS)
+
+    print(f"{'boxes':>6} {'legacy ms/frame':>16} {'vector ms/frame':>16} {'speedup':>8} {'events':>7}")
+    for n in args.sizes:
+        frames = make_scene(n, args.frames)
+        ev_old, st_old, t_old = run(legacy_step, copy.deepcopy(frames), threshold_frames)
+        ev_new, st_new, t_new = run(vectorized_step, copy.deepcopy(frames), threshold_frames)
+
+        if ev_old != ev_new or st_old != st_new:
+            raise SystemExit(f"[ERR] Результаты расходятся при {n} боксах")
+
+        old_ms = t_old.mean() * 1000
+        new_ms = t_new.mean() * 1000
+        print(f"{n:>6} {old_ms:>16.3f} {new_ms:>16.3f} {old_ms / new_ms:>7.1f}x {len(ev_new):>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Бенчмарк предобработки кадра: прежний brighten_frame (HSV во float)
+против Preprocessor (uint8, LUT/CLAHE, переиспользуемые буферы).
+
+    python ml_service/bench_preprocess.py [--frames 200] [--sizes 1280x720 1920x1080]
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from preprocessing import Preprocessor
+
+
+def brighten_frame(frame, factor=1.35):
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV).astype(float)
+    hsv[:, :, 2] = np.clip(hsv[:, :, 2] * factor, 0, 255)
+    hsv = hsv.astype(np.uint8)
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+
+
+def _time(fn, frames) -> float:
+    fn(frames[0])  # прогрев и выделение буферов
+    t0 = time.perf_counter()
+    for f in frames:
+        fn(f)
+    return (time.perf_counter() - t0) / len(frames) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--sizes", nargs="+", default=["1280x720", "1920x1080"])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    variants = [
+        ("gain=1.4", dict(gain=1.4)),
+        ("gamma=1.6", dict(gamma=1.6)),
+        ("gain+clahe", dict(gain=1.4, clahe=True)),
+        ("gain+w1280", dict(gain=1.4, max_width=1280)),
+    ]
+
+    for size in args.sizes:
+        w, h = map(int, size.split("x"))
+        frames = [rng.integers(0, 256, size=(h, w, 3), dtype=np.uint8) for _ in range(8)]
+        frames = (frames * (args.frames // len(frames) + 1))[: args.frames]
+
+        base_ms = _time(lambda f: brighten_frame(f, factor=1.4), frames)
+        print(f"{size}: brighten_frame {base_ms:.2f} ms/frame")
+        for name, cfg in variants:
+            pre = Preprocessor(**cfg)
+            ms = _time(pre, frames)
+            print(f"{size}: {name:<12} {ms:>8.2f} ms/frame {base_ms / ms:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
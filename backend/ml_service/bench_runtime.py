@@ -0,0 +1,118 @@
+"""
+Сравнение рантаймов детектора на тестовом видео: скорость и расхождение
+с текущим путём PyTorch.
+
+Эталон — детекции модели PyTorch FP32 на тех же кадрах. Для каждого варианта
+детекции сопоставляются с эталоном жадно по IoU >= 0.5 внутри класса;
+печатаются precision/recall относительно эталона, средний IoU совпавших
+и FPS (инференс по одному кадру, после прогрева).
+
+    python ml_service/bench_runtime.py media_server/test.mp4 --model <веса> [--frames 200] [--threads 4]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from association import iou_matrix
+from capture import FileSource
+from config import MODEL_PATH, TARGET_FPS, PERSON_CLASS, LEFT_OBJECT_CLASSES, OBJ_CONF_THR
+from detection import detect_batch
+from runtime import load_model
+
+VARIANTS = [
+    ("torch", False),
+    ("onnx", False),
+    ("onnx", True),
+    ("openvino", False),
+    ("openvino", True),
+]
+
+
+def read_frames(video: str, count: int, target_fps: int) -> list:
+    source = FileSource(video, target_fps)
+    if not source.is_opened():
+        raise SystemExit(f"[ERR] Не удалось открыть видео {video}")
+    frames = []
+    while len(frames) < count:
+        item = source.read()
+        if item is None:
+            break
+        frames.append(item[1])
+    source.release()
+    return frames
+
+
+def match(ref, got, thr: float = 0.5) -> tuple:
+    """(совпало, средний IoU совпавших) при жадном сопоставлении внутри класса."""
+    matched, ious = 0, []
+    for c in np.union1d(ref.cls, got.cls):
+        a = ref.xyxy[ref.cls == c]
+        b = got.xyxy[got.cls == c]
+        if not len(a) or not len(b):
+            continue
+        m = iou_matrix(a, b)
+        while m.size and m.max() >= thr:
+            i, j = np.unravel_index(m.argmax(), m.shape)
+            ious.append(m[i, j])
+            matched += 1
+            m[i, :] = -1
+            m[:, j] = -1
+    return matched, ious
+
+
+def run_variant(frames, model_path, backend, int8, threads, calib_video, classes, conf):
+    model = load_model(model_path, backend, int8, threads, calib_video=calib_video)
+    out, times = [], []
+    for frame in frames:
+        t0 = time.perf_counter()
+        out.append(detect_batch(model, [frame], conf=conf, classes=classes)[0])
+        times.append(time.perf_counter() - t0)
+    return out, np.array(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("video", nargs="?", default="media_server/test.mp4")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--fps", type=int, default=TARGET_FPS)
+    parser.add_argument("--conf", type=float, default=OBJ_CONF_THR)
+    parser.add_argument("--calib", help="калибровочное видео для INT8 (по умолчанию то же)")
+    args = parser.parse_args()
+
+    frames = read_frames(args.video, args.frames, args.fps)
+    classes = list(LEFT_OBJECT_CLASSES | {PERSON_CLASS})
+    calib = args.calib or args.video
+
+    reference = None
+    print(f"{'backend':<14} {'fps':>7} {'p50 ms':>8} {'p95 ms':>8} {'dets':>6} {'prec':>6} {'recall':>6} {'mIoU':>6}")
+    for backend, int8 in VARIANTS:
+        name = f"{backend}{'-int8' if int8 else ''}"
+        try:
+            dets, times = run_variant(frames, args.model, backend, int8, args.threads, calib, classes, args.conf)
+        except Exception as e:
+            print(f"{name:<14} [ERR] {e}")
+            continue
+        if reference is None:
+            reference = dets
+
+        n_ref = sum(len(d) for d in reference)
+        n_got = sum(len(d) for d in dets)
+        matched, ious = 0, []
+        for r, g in zip(reference, dets):
+            m, i = match(r, g)
+            matched += m
+            ious.extend(i)
+        prec = matched / n_got if n_got else 1.0
+        recall = matched / n_ref if n_ref else 1.0
+        miou = float(np.mean(ious)) if ious else float("nan")
+        print(
+            f"{name:<14} {1 / times.mean():>7.1f} {np.percentile(times, 50) * 1000:>8.1f} "
+            f"{np.percentile(times, 95) * 1000:>8.1f} {n_got:>6} {prec:>6.3f} {recall:>6.3f} {miou:>6.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
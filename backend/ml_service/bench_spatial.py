@@ -0,0 +1,79 @@
+"""
+Бенчмарк поиска "потерянных" треков: линейный обход против сетки ObjectStore.
+
+Много стоящих предметов уже отслеживается, каждый кадр приходит пачка
+детекций без id трекера. Проверяется, что оба способа находят одни и те же
+объекты, и печатается время поиска на кадр.
+
+    python ml_service/bench_spatial.py [--tracked 100 500 2000] [--detections 50]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from config import MAX_COORD_DIST, LEFT_OBJECT_CLASSES
+from tracking import ObjectStore, TrackedObject, bbox_center
+
+FRAME_W, FRAME_H = 1920, 1080
+
+
+def linear_find(tracked_objects, bbox, class_id):
+    c = bbox_center(bbox)
+    best_tid = None
+    best_dist = 10**9
+    for tid_, obj in tracked_objects.items():
+        if obj.class_id != class_id:
+            continue
+        prev_c = bbox_center(obj.bbox)
+        d = np.linalg.norm(np.array(c) - np.array(prev_c))
+        if d < MAX_COORD_DIST and d < best_dist:
+            best_dist = d
+            best_tid = tid_
+    return best_tid
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tracked", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--detections", type=int, default=50)
+    parser.add_argument("--frames", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    classes = sorted(LEFT_OBJECT_CLASSES)[:5]
+
+    print(f"{'tracked':>8} {'linear ms/frame':>16} {'grid ms/frame':>14} {'speedup':>8}")
+    for n in args.tracked:
+        store = ObjectStore()
+        xy = rng.uniform(0, [FRAME_W - 50, FRAME_H - 50], size=(n, 2))
+        for i in range(n):
+            bbox = (xy[i, 0], xy[i, 1], xy[i, 0] + 40, xy[i, 1] + 40)
+            store.add(TrackedObject(i, bbox, int(rng.choice(classes)), 0))
+
+        queries = []
+        for _ in range(args.frames):
+            src = rng.integers(0, n, size=args.detections)
+            jitter = rng.normal(0, MAX_COORD_DIST / 2, size=(args.detections, 2))
+            q = xy[src] + jitter
+            queries.append([
+                ((q[j, 0], q[j, 1], q[j, 0] + 40, q[j, 1] + 40), store[int(src[j])].class_id)
+                for j in range(args.detections)
+            ])
+
+        t0 = time.perf_counter()
+        lin = [[linear_find(store, b, c) for b, c in frame] for frame in queries]
+        t_lin = (time.perf_counter() - t0) / args.frames
+
+        t0 = time.perf_counter()
+        grid = [[store.find_nearest(b, c) for b, c in frame] for frame in queries]
+        t_grid = (time.perf_counter() - t0) / args.frames
+
+        if lin != grid:
+            raise SystemExit(f"[ERR] Результаты расходятся при {n} объектах")
+
+        print(f"{n:>8} {t_lin * 1000:>16.3f} {t_grid * 1000:>14.3f} {t_lin / t_grid:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
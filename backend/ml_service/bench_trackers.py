@@ -0,0 +1,92 @@
+"""
+Сравнение трекеров на офлайн-прогоне: BoT-SORT, ByteTrack и свой
+центроидный (trackers.CentroidTracker).
+
+Разметки нет, поэтому стабильность id оценивается косвенно: бокс,
+который в соседних кадрах почти не сдвинулся (IoU >= 0.5, тот же класс),
+но сменил id, считается переключением id. Печатаются переключения,
+число уникальных id, средняя длина трека, число событий, FPS и время
+стадии трекинга. Детектор работает на каждом кадре (без MotionGate),
+чтобы трекеры получали одинаковый вход.
+
+    python ml_service/bench_trackers.py media_server/test.mp4 --model <веса> [--max-frames 600]
+"""
+import argparse
+from collections import Counter
+
+import numpy as np
+
+from association import iou_matrix
+from config import MODEL_PATH, TARGET_FPS
+from replay import replay
+
+TRACKERS = ["botsort.yaml", "bytetrack.yaml", "centroid"]
+
+
+class TrackStats:
+    def __init__(self, iou_thr: float = 0.5):
+        self.iou_thr = iou_thr
+        self.prev = None
+        self.switches = 0
+        self.lengths = Counter()
+
+    def __call__(self, pipeline, inferred: bool):
+        if not inferred or pipeline.last_tracked is None:
+            return
+        dets = pipeline.last_tracked
+        dets = dets[dets.ids != -1]
+        self.lengths.update(dets.ids.tolist())
+
+        if self.prev is not None and len(self.prev) and len(dets):
+            ious = iou_matrix(self.prev.xyxy, dets.xyxy)
+            ious[self.prev.cls[:, None] != dets.cls[None, :]] = 0
+            while ious.size and ious.max() >= self.iou_thr:
+                i, j = np.unravel_index(ious.argmax(), ious.shape)
+                if self.prev.ids[i] != dets.ids[j]:
+                    self.switches += 1
+                ious[i, :] = 0
+                ious[:, j] = 0
+        self.prev = dets
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("video", nargs="?", default="media_server/test.mp4")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--fps", type=int, default=TARGET_FPS)
+    parser.add_argument("--max-frames", type=int, default=0)
+    parser.add_argument("--trackers", nargs="+", default=TRACKERS)
+    args = parser.parse_args()
+
+    rows = []
+    for tracker_cfg in args.trackers:
+        stats = TrackStats()
+        report = replay(
+            args.video,
+            args.model,
+            args.fps,
+            tracker_cfg=tracker_cfg,
+            max_frames=args.max_frames,
+            motion={"enabled": False},
+            on_frame=stats,
+        )
+        tracking = report["stages"].get("tracking", {})
+        lengths = list(stats.lengths.values())
+        rows.append((
+            tracker_cfg,
+            report["fps"],
+            tracking.get("p50_ms", 0.0),
+            tracking.get("p95_ms", 0.0),
+            stats.switches,
+            len(lengths),
+            float(np.mean(lengths)) if lengths else 0.0,
+            len(report["events"]),
+        ))
+
+    print(f"{'tracker':<16} {'fps':>7} {'trk p50':>8} {'trk p95':>8} {'id sw':>6} {'ids':>6} {'len':>6} {'events':>7}")
+    for name, fps, p50, p95, sw, ids, length, events in rows:
+        print(f"{name:<16} {fps:>7.1f} {p50:>8.2f} {p95:>8.2f} {sw:>6} {ids:>6} {length:>6.1f} {events:>7}")
+
+
+if __name__ == "__main__":
+    main()
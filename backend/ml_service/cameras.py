@@ -0,0 +1,41 @@
+import json
+from dataclasses import dataclass, field
+
+from config import CAMERAS_CONFIG, RTSP_URL, RTSP_URLS, BRIGHTEN, TRACKER
+
+
+@dataclass
+class CameraConfig:
+    id: str
+    url: str
+    tracker: str = TRACKER
+    # параметры Preprocessor: gain, gamma, clahe, clahe_clip, clahe_grid, max_width
+    preprocess: dict = field(default_factory=dict)
+    # параметры MotionGate: enabled, width, pixel_thr, min_area, force_seconds;
+    # None — по умолчанию из MOTION_GATE
+    motion: dict = None
+    # полигоны зоны интереса в долях кадра: [[[x, y], ...], ...]
+    roi: list = None
+    # тайловый инференс: size, overlap, min_width, full_frame, nms_iou; None — выключен
+    tiles: dict = None
+    # каскад (cascade.py): enabled, conf, due_seconds, force_seconds, crop, pad, crop_max_area;
+    # None — включён, если задан CASCADE_MODEL_PATH
+    cascade: dict = None
+
+
+def load_cameras() -> list:
+    """
+    Камеры из JSON-файла CAMERAS_CONFIG (см. cameras.example.json),
+    иначе — из RTSP_URLS / RTSP_URL с общими настройками.
+    """
+    if CAMERAS_CONFIG:
+        with open(CAMERAS_CONFIG, encoding="utf-8") as f:
+            raw = json.load(f)
+        return [
+            CameraConfig(**{"id": item.get("id", f"cam{i}"), **item})
+            for i, item in enumerate(raw)
+        ]
+
+    urls = RTSP_URLS or [RTSP_URL]
+    preprocess = {"gain": 1.4} if BRIGHTEN else {}
+    return [CameraConfig(id=f"cam{i}", url=url, preprocess=dict(preprocess)) for i, url in enumerate(urls)]
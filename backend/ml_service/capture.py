@@ -0,0 +1,193 @@
+import threading
+import time
+
+import cv2
+
+from profiling import NULL_TIMER
+
+OPEN_TIMEOUT_MS = 5000
+READ_TIMEOUT_MS = 5000
+
+
+class FrameGrabber(threading.Thread):
+    """
+    Отдельный поток чтения одной камеры.
+
+    Непрерывно вычитывает поток (grab), чтобы буфер FFmpeg не копился,
+    и хранит только самый свежий кадр с моментом захвата. Конвертация кадра
+    (retrieve) делается не чаще target_fps. Если поток молчит дольше
+    stall_timeout — переподключается с экспоненциальной задержкой.
+    """
+
+    def __init__(
+        self,
+        stream_url: str,
+        target_fps: int,
+        stall_timeout: float = 5.0,
+        reconnect_min: float = 0.5,
+        reconnect_max: float = 30.0,
+        timer=NULL_TIMER,
+    ):
+        super().__init__(name=f"grabber:{stream_url}", daemon=True)
+        self.stream_url = stream_url
+        self.timer = timer
+        self.retrieve_interval = 1.0 / target_fps if target_fps else 0.0
+        self.stall_timeout = stall_timeout
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._frame = None
+        self._ts = None
+        self._fresh = False
+
+        self.connected = False
+        self.decoded = 0
+        self.consumed = 0
+        self.reconnects = 0
+
+    @property
+    def dropped(self) -> int:
+        """Декодированные кадры, которые так и не попали в инференс."""
+        return self.decoded - self.consumed
+
+    def latest(self):
+        """
+        Самый свежий ещё не отданный кадр: (ts, frame) или None.
+        ts — time.monotonic() в момент захвата.
+        """
+        with self._lock:
+            if not self._fresh:
+                return None
+            self._fresh = False
+            self.consumed += 1
+            return self._ts, self._frame
+
+    def stats(self) -> dict:
+        with self._lock:
+            age = time.monotonic() - self._ts if self._ts is not None else None
+        return {
+            "connected": self.connected,
+            "decoded": self.decoded,
+            "dropped": self.dropped,
+            "reconnects": self.reconnects,
+            "frame_age": age,
+        }
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        backoff = self.reconnect_min
+        while not self._stop_event.is_set():
+            self._alive()
+            cap = cv2.VideoCapture(
+                self.stream_url,
+                cv2.CAP_FFMPEG,
+                [
+                    cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, OPEN_TIMEOUT_MS,
+                    cv2.CAP_PROP_READ_TIMEOUT_MSEC, READ_TIMEOUT_MS,
+                ],
+            )
+            if cap.isOpened():
+                print(f"[INFO] Поток открыт: {self.stream_url}")
+                self.connected = True
+                if self._read_loop(cap):
+                    backoff = self.reconnect_min
+                self.connected = False
+            cap.release()
+
+            if self._stop_event.is_set():
+                break
+            self.reconnects += 1
+            print(f"[WARN] {self.stream_url}: нет кадров, переподключение через {backoff:.1f}s")
+            # ожидание по частям: поток жив, пока ждёт переподключения
+            deadline = time.monotonic() + backoff
+            while not self._stop_event.wait(min(1.0, max(0.0, deadline - time.monotonic()))):
+                self._alive()
+                if time.monotonic() >= deadline:
+                    break
+            backoff = min(backoff * 2, self.reconnect_max)
+
+    def _read_loop(self, cap) -> bool:
+        """Читает поток, пока он жив. Возвращает True, если был получен хоть один кадр."""
+        got_any = False
+        last_ok = time.monotonic()
+        last_retrieve = 0.0
+
+        while not self._stop_event.is_set():
+            t0 = time.perf_counter()
+            ok = cap.grab()
+            self._alive()
+            if not ok:
+                if time.monotonic() - last_ok > self.stall_timeout:
+                    return got_any
+                time.sleep(0.01)
+                continue
+            self.timer.observe("grab", time.perf_counter() - t0)
+
+            now = time.monotonic()
+            last_ok = now
+            got_any = True
+            self.decoded += 1
+
+            if now - last_retrieve < self.retrieve_interval:
+                continue
+            with self.timer.stage("retrieve"):
+                ret, frame = cap.retrieve()
+            if not ret:
+                continue
+            last_retrieve = now
+            self._publish(now, frame)
+        return got_any
+
+    def _alive(self):
+        """
+        Поток чтения не завис: вызывается после каждого grab() и во время
+        переподключения (в BusGrabber — пульс декодера для супервизора).
+        """
+
+    def _publish(self, ts: float, frame):
+        """Отдаёт свежий кадр потребителю (в BusGrabber — в общую память)."""
+        with self._lock:
+            self._frame = frame
+            self._ts = ts
+            self._fresh = True
+
+
+class FileSource:
+    """
+    Видеофайл для офлайн-прогона: кадры идут так быстро, как их успевают
+    обработать, с шагом 1/target_fps по времени видео (а не по часам).
+    """
+
+    def __init__(self, path: str, target_fps: int):
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.video_fps = fps if fps and fps > 0 else float(target_fps)
+        self.interval = 1.0 / target_fps
+        self.frame_idx = 0
+        self.next_ts = 0.0
+
+    def is_opened(self) -> bool:
+        return self.cap.isOpened()
+
+    def read(self):
+        """(ts, frame) следующего кадра или None в конце файла; ts — секунды от начала видео."""
+        while True:
+            if not self.cap.grab():
+                return None
+            ts = self.frame_idx / self.video_fps
+            self.frame_idx += 1
+            if ts + 1e-6 < self.next_ts:
+                continue
+            self.next_ts += self.interval
+            ret, frame = self.cap.retrieve()
+            if not ret:
+                return None
+            return ts, frame
+
+    def release(self):
+        self.cap.release()
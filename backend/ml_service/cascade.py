@@ -0,0 +1,138 @@
+import numpy as np
+
+from config import (
+    CASCADE_MODEL_PATH,
+    CASCADE_CONF,
+    CASCADE_DUE_SECONDS,
+    CASCADE_FORCE_SECONDS,
+    CASCADE_CROP_PAD,
+    CASCADE_CROP_MAX_AREA,
+)
+from detection import Detections
+
+# поля кропа не меньше этого, пикселей: мелкому предмету нужен контекст
+_MIN_PAD = 16
+
+
+class Cascade:
+    """
+    Решает после дешёвой первой ступени (маленькая модель на CASCADE_IMGSZ),
+    нужен ли кадру полный детектор MODEL_PATH.
+
+    Полный детектор запускается, если первая ступень нашла кандидатов
+    (людей или предметы с conf >= CASCADE_CONF); если у предмета с владельцем
+    до LEFT_SECONDS осталось меньше due_seconds — решение об оставленном
+    предмете должно опираться на полную модель; и не реже чем раз в
+    force_seconds. Иначе кадр обрабатывается как статичный (process_idle).
+
+    Если кандидаты, "горящие" предметы и последние треки занимают небольшую
+    часть области детекции, полный детектор получает только кроп вокруг них;
+    принудительный прогон всегда идёт по всей области.
+    """
+
+    def __init__(
+        self,
+        conf: float = CASCADE_CONF,
+        due_seconds: float = CASCADE_DUE_SECONDS,
+        force_seconds: float = CASCADE_FORCE_SECONDS,
+        crop: bool = True,
+        pad: float = CASCADE_CROP_PAD,
+        crop_max_area: float = CASCADE_CROP_MAX_AREA,
+    ):
+        self.conf = conf
+        self.due_seconds = due_seconds
+        self.force_seconds = force_seconds
+        self.crop = crop
+        self.pad = pad
+        self.crop_max_area = crop_max_area
+
+        self._last_full_ts = None
+
+        self.screened = 0
+        self.escalated = 0
+        self.cropped = 0
+        self.reasons = {"candidates": 0, "due": 0, "force": 0}
+
+    @classmethod
+    def from_config(cls, cfg: dict):
+        return cls(
+            conf=cfg.get("conf", CASCADE_CONF),
+            due_seconds=cfg.get("due_seconds", CASCADE_DUE_SECONDS),
+            force_seconds=cfg.get("force_seconds", CASCADE_FORCE_SECONDS),
+            crop=cfg.get("crop", True),
+            pad=cfg.get("pad", CASCADE_CROP_PAD),
+            crop_max_area=cfg.get("crop_max_area", CASCADE_CROP_MAX_AREA),
+        )
+
+    @property
+    def escalated_share(self) -> float:
+        """Доля кадров первой ступени, дошедших до полного детектора."""
+        return self.escalated / self.screened if self.screened else 0.0
+
+    def _due_boxes(self, pipeline, ts: float) -> np.ndarray:
+        now = pipeline.tick(ts)
+        edge = pipeline.threshold_frames - self.due_seconds * pipeline.target_fps
+        boxes = [
+            o.bbox
+            for o in pipeline.tracked_objects.values()
+            if not o.flagged_left and o.owner_id is not None and o.last_owner_frame is not None
+            and now - o.last_owner_frame > edge
+        ]
+        return np.array(boxes, dtype=float).reshape(-1, 4)
+
+    def plan(self, pipeline, shape, cheap: Detections, ts: float):
+        """
+        None — полный детектор не нужен, иначе прямоугольник (x0, y0, x1, y1)
+        в кадре, по которому его запускать.
+        """
+        self.screened += 1
+        candidates = cheap.xyxy[cheap.conf >= self.conf]
+        due = self._due_boxes(pipeline, ts)
+        force = self._last_full_ts is None or ts - self._last_full_ts >= self.force_seconds
+
+        if len(candidates):
+            reason = "candidates"
+        elif len(due):
+            reason = "due"
+        elif force:
+            reason = "force"
+        else:
+            return None
+
+        self.escalated += 1
+        self.reasons[reason] += 1
+        self._last_full_ts = ts
+
+        area = pipeline.roi.rect(shape)
+        if force or not self.crop:
+            return area
+
+        boxes = [candidates, due]
+        # последние треки тоже в кроп, иначе трекер потеряет тех, кого дешёвая модель не видит
+        if pipeline.last_tracked is not None:
+            boxes.append(pipeline.last_tracked.xyxy)
+        rect = self._crop_rect(np.concatenate(boxes), area)
+        if rect != area:
+            self.cropped += 1
+        return rect
+
+    def _crop_rect(self, boxes: np.ndarray, area: tuple) -> tuple:
+        ax0, ay0, ax1, ay1 = area
+        wh = boxes[:, 2:] - boxes[:, :2]
+        pad = np.maximum(wh * self.pad, _MIN_PAD)
+        x0, y0 = np.maximum((boxes[:, :2] - pad).min(axis=0), [ax0, ay0]).astype(int)
+        x1, y1 = np.minimum((boxes[:, 2:] + pad).max(axis=0), [ax1, ay1]).astype(int)
+        if x1 <= x0 or y1 <= y0:
+            return area
+        if (x1 - x0) * (y1 - y0) > self.crop_max_area * (ax1 - ax0) * (ay1 - ay0):
+            return area
+        return (int(x0), int(y0), int(x1), int(y1))
+
+
+def make_cascade(cfg: dict = None):
+    """None — каскад выключен, полный детектор на каждом кадре после MotionGate."""
+    if cfg is None:
+        cfg = {"enabled": bool(CASCADE_MODEL_PATH)}
+    if not cfg.get("enabled", True):
+        return None
+    return Cascade.from_config(cfg)
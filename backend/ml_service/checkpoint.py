@@ -0,0 +1,186 @@
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+
+from config import CHECKPOINT_DIR, CHECKPOINT_INTERVAL, CHECKPOINT_MAX_AGE
+from tracking import TrackedObject
+
+CHECKPOINT_VERSION = 1
+
+_RESTORED_PREFIX = "restored_"
+
+# порядок полей в записи объекта
+_FIELDS = (
+    "tid",
+    "bbox",
+    "class_id",
+    "appeared_frame",
+    "last_seen_frame",
+    "owner_id",
+    "last_owner_frame",
+    "last_person_near_frame",
+    "flagged_left",
+)
+
+
+def capture(pipeline) -> dict:
+    """
+    Снимок состояния камеры: только скаляры, без ссылок на живые объекты,
+    поэтому его можно сериализовать в другом потоке. Вызывается из
+    основного цикла, между кадрами.
+    """
+    objects = []
+    for obj in pipeline.tracked_objects.values():
+        rec = [getattr(obj, f) for f in _FIELDS]
+        rec[1] = [round(float(v), 1) for v in obj.bbox]
+        objects.append(rec)
+    return {
+        "version": CHECKPOINT_VERSION,
+        "camera_id": pipeline.camera_id,
+        "saved_at": time.time(),
+        "target_fps": pipeline.target_fps,
+        "now": pipeline.now,
+        "fields": _FIELDS,
+        "objects": objects,
+    }
+
+
+def restore(pipeline, state: dict, max_age: float = CHECKPOINT_MAX_AGE) -> int:
+    """
+    Поднимает tracked_objects из снимка, если он свежий и совместимый.
+    Возвращает число восстановленных объектов.
+
+    Тики сдвигаются так, что момент снимка оказывается на -(простой * fps)
+    относительно первого кадра после рестарта: простой честно засчитывается
+    в таймеры. id треков получают префикс restored_, потому что новый трекер
+    начинает нумерацию заново и его id означают другие объекты; восстановленный
+    объект подхватывается новым треком по близости центра, как ghost_*.
+    Префикс не наращивается: объект, переживший несколько рестартов, остаётся
+    restored_<исходный id>.
+    """
+    if state.get("version") != CHECKPOINT_VERSION:
+        print(f"[WARN] {pipeline.camera_id}: чекпоинт версии {state.get('version')} не поддерживается")
+        return 0
+    if state.get("camera_id") != pipeline.camera_id or state.get("target_fps") != pipeline.target_fps:
+        print(f"[WARN] {pipeline.camera_id}: чекпоинт от другой камеры или другого fps, пропущен")
+        return 0
+
+    age = time.time() - state["saved_at"]
+    if age > max_age:
+        print(f"[INFO] {pipeline.camera_id}: чекпоинт устарел ({age:.0f}s), старт с нуля")
+        return 0
+
+    shift = -state["now"] - int(round(age * pipeline.target_fps))
+
+    def moved(frame):
+        return None if frame is None else frame + shift
+
+    idx = {name: i for i, name in enumerate(state["fields"])}
+    records = sorted(state["objects"], key=lambda r: r[idx["last_seen_frame"]])
+    for rec in records:
+        tid = str(rec[idx["tid"]])
+        if not tid.startswith(_RESTORED_PREFIX):
+            tid = _RESTORED_PREFIX + tid
+        obj = TrackedObject(
+            tid,
+            tuple(rec[idx["bbox"]]),
+            rec[idx["class_id"]],
+            rec[idx["appeared_frame"]] + shift,
+        )
+        obj.last_seen_frame = rec[idx["last_seen_frame"]] + shift
+        obj.owner_id = rec[idx["owner_id"]]
+        obj.last_owner_frame = moved(rec[idx["last_owner_frame"]])
+        obj.last_person_near_frame = moved(rec[idx["last_person_near_frame"]])
+        obj.flagged_left = rec[idx["flagged_left"]]
+        pipeline.tracked_objects.add(obj)
+
+    print(f"[INFO] {pipeline.camera_id}: восстановлено {len(records)} объектов из чекпоинта ({age:.1f}s назад)")
+    return len(records)
+
+
+class Checkpointer:
+    """
+    Периодические снимки состояния камер на диск.
+
+    Основной цикл раз в interval секунд вызывает maybe_capture(): снимок
+    скаляров стоит O(объектов) и не трогает диск. Сериализация (gzip JSON)
+    и запись идут в отдельном потоке; в очереди держится только последний
+    снимок каждой камеры. Файл пишется во временный и атомарно подменяется.
+    """
+
+    def __init__(self, directory: str = CHECKPOINT_DIR, interval: float = CHECKPOINT_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._writer, name="checkpoint", daemon=True)
+        self._last = time.monotonic()
+        self.written = 0
+
+    def path(self, camera_id: str) -> str:
+        return os.path.join(self.directory, f"{camera_id}.json.gz")
+
+    def restore_all(self, pipelines: list):
+        for pipeline in pipelines:
+            path = self.path(pipeline.camera_id)
+            if not os.path.exists(path):
+                continue
+            try:
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    state = json.load(f)
+                restore(pipeline, state)
+            except Exception as e:
+                print(f"[WARN] {pipeline.camera_id}: не удалось прочитать чекпоинт {path}: {e}")
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread.start()
+
+    def maybe_capture(self, pipelines: list):
+        mono = time.monotonic()
+        if mono - self._last < self.interval:
+            return
+        self._last = mono
+        self._queue.put([capture(p) for p in pipelines if p.start_ts is not None])
+
+    def stop(self, pipelines: list = None):
+        """Останавливает запись; с pipelines — напоследок синхронно пишет свежий снимок."""
+        self._queue.put(None)
+        self._thread.join(5.0)
+        if pipelines:
+            for state in [capture(p) for p in pipelines if p.start_ts is not None]:
+                self._write(state)
+
+    def _writer(self):
+        while True:
+            states = self._queue.get()
+            if states is None:
+                return
+            # если запись отстала — важен только самый свежий снимок
+            while True:
+                try:
+                    newer = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if newer is None:
+                    self._queue.put(None)
+                    break
+                states = newer
+            for state in states:
+                try:
+                    self._write(state)
+                except Exception as e:
+                    print(f"[ERR] Не удалось записать чекпоинт {state['camera_id']}: {e}")
+
+    def _write(self, state: dict):
+        path = self.path(state["camera_id"])
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=3) as f:
+                f.write(json.dumps(state, separators=(",", ":")).encode("utf-8"))
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp, path)
+        self.written += 1
@@ -0,0 +1,367 @@
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+
+import cv2
+import numpy as np
+import requests
+
+from config import (
+    BACKEND_CLIP_URL,
+    CLIP_BUFFER_MB,
+    CLIP_PRE_SECONDS,
+    CLIP_POST_SECONDS,
+    CLIP_WIDTH,
+    CLIP_JPEG_QUALITY,
+    CLIP_SPOOL_MAX_AGE,
+    DELIVERY_RETRIES,
+    DELIVERY_TIMEOUT,
+    EVENT_JOURNAL_DIR,
+)
+from profiling import NULL_TIMER
+
+# как часто досылаются клипы из очереди на диске (как журнал событий), сек
+SPOOL_INTERVAL = 10
+
+
+class _EventNotWritten(Exception):
+    """409: события с этим клипом ещё нет в БД (ждёт в журнале ML-сервиса или бэкенда)."""
+
+
+class FrameRing:
+    """
+    Кольцевой буфер сжатых кадров одной камеры: (ts, jpeg), не старше
+    window секунд и суммарно не больше max_bytes. Память на камеру
+    фиксирована независимо от разрешения и битрейта потока.
+    """
+
+    def __init__(self, max_bytes: int, window: float):
+        self.max_bytes = max_bytes
+        self.window = window
+        self._frames = deque()
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self._frames)
+
+    @property
+    def latest_ts(self):
+        return self._frames[-1][0] if self._frames else None
+
+    def append(self, ts: float, jpeg: bytes):
+        self._frames.append((ts, jpeg))
+        self.nbytes += len(jpeg)
+        while self._frames and (
+            self.nbytes > self.max_bytes or ts - self._frames[0][0] > self.window
+        ):
+            _, old = self._frames.popleft()
+            self.nbytes -= len(old)
+
+    def between(self, t0: float, t1: float) -> list:
+        return [(ts, jpeg) for ts, jpeg in self._frames if t0 <= ts <= t1]
+
+
+def encode_clip(frames: list, path: str):
+    """
+    Склеивает JPEG-кадры в MP4. С ffmpeg — H.264 (играется в браузере),
+    без него — MPEG-4 через OpenCV. FPS — средний по меткам времени кадров.
+    """
+    span = frames[-1][0] - frames[0][0]
+    fps = max(1.0, (len(frames) - 1) / span) if span > 0 else 1.0
+
+    if shutil.which("ffmpeg"):
+        cmd = [
+            "ffmpeg", "-loglevel", "error", "-y",
+            "-f", "image2pipe", "-framerate", f"{fps:.3f}", "-c:v", "mjpeg", "-i", "-",
+            "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+            "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-movflags", "+faststart",
+            path,
+        ]
+        proc = subprocess.run(cmd, input=b"".join(j for _, j in frames), capture_output=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg: {proc.stderr.decode(errors='replace')[-300:]}")
+        return
+
+    first = cv2.imdecode(np.frombuffer(frames[0][1], dtype=np.uint8), cv2.IMREAD_COLOR)
+    h, w = first.shape[:2]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+    try:
+        for _, jpeg in frames:
+            img = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if img.shape[:2] != (h, w):
+                img = cv2.resize(img, (w, h))
+            writer.write(img)
+    finally:
+        writer.release()
+
+
+class ClipRecorder:
+    """
+    Клипы до/после события для всех камер.
+
+    push() из основного цикла сразу уменьшает кадр до width и кладёт его
+    во входную очередь своей камеры, ограниченную buffer_mb (при
+    переполнении кадр пропускается) — полноразмерные кадры не копируются
+    и не удерживаются. Поток clip-encoder сжимает их в JPEG и держит
+    в FrameRing камеры. request() сразу возвращает ключ клипа для события;
+    когда пройдут post секунд, кадры [ts - pre, ts + post] склеиваются
+    в MP4 и загружаются в бэкенд потоком clip-upload.
+
+    Если событие клипа ещё не записано (409) или бэкенд недоступен, MP4
+    переносится в spool_dir (рядом с журналом событий) и досылается раз
+    в SPOOL_INTERVAL, в том числе после рестарта, пока событие не дойдёт
+    до БД — но не дольше spool_max_age.
+    """
+
+    def __init__(
+        self,
+        url: str = BACKEND_CLIP_URL,
+        pre: float = CLIP_PRE_SECONDS,
+        post: float = CLIP_POST_SECONDS,
+        width: int = CLIP_WIDTH,
+        quality: int = CLIP_JPEG_QUALITY,
+        buffer_mb: float = CLIP_BUFFER_MB,
+        retries: int = DELIVERY_RETRIES,
+        timeout: float = DELIVERY_TIMEOUT,
+        spool_dir: str = os.path.join(EVENT_JOURNAL_DIR, "clips"),
+        spool_max_age: float = CLIP_SPOOL_MAX_AGE,
+        timer=NULL_TIMER,
+    ):
+        self.url = url
+        self.pre = pre
+        self.post = post
+        self.width = width
+        self.quality = quality
+        self.max_bytes = int(buffer_mb * 1024 * 1024)
+        self.retries = retries
+        self.timeout = timeout
+        self.spool_dir = spool_dir
+        self.spool_max_age = spool_max_age
+        self.timer = timer
+
+        self.rings = {}
+        # camera_id -> deque((ts, уменьшенный кадр)), ещё не сжатые в JPEG
+        self._inbox = {}
+        self._inbox_bytes = {}
+        self._inbox_lock = threading.Lock()
+        self._has_frames = threading.Event()
+        self._requests = queue.Queue()
+        self._uploads = queue.Queue(maxsize=32)
+        self._pending = []  # (camera_id, ts, key)
+        self._stop_event = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._encoder, name="clip-encoder", daemon=True),
+            threading.Thread(target=self._uploader, name="clip-upload", daemon=True),
+        ]
+        self.session = requests.Session()
+
+        self.frames_dropped = 0
+        self.uploaded = 0
+        self.failed = 0
+
+    @property
+    def spooled(self) -> int:
+        try:
+            return sum(1 for name in os.listdir(self.spool_dir) if name.endswith(".mp4"))
+        except FileNotFoundError:
+            return 0
+
+    def start(self):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        for t in self._threads:
+            t.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        for t in self._threads:
+            t.join(timeout)
+
+    def push(self, camera_id: str, ts: float, frame: np.ndarray):
+        """Кадр в буфер камеры; сам frame не сохраняется, его можно переиспользовать."""
+        small = self._downscale(frame)
+        with self._inbox_lock:
+            inbox = self._inbox.get(camera_id)
+            if inbox is None:
+                inbox = self._inbox[camera_id] = deque()
+                self._inbox_bytes[camera_id] = 0
+            if self._inbox_bytes[camera_id] + small.nbytes > self.max_bytes:
+                self.frames_dropped += 1
+                return
+            inbox.append((ts, small))
+            self._inbox_bytes[camera_id] += small.nbytes
+        self._has_frames.set()
+
+    def request(self, camera_id: str, ts: float) -> str:
+        """Заказывает клип вокруг момента ts; возвращает будущий ключ клипа в S3."""
+        key = f"clips/{uuid.uuid4().hex}.mp4"
+        self._requests.put((camera_id, ts, key))
+        return key
+
+    # ---------- потоки ----------
+
+    def _downscale(self, frame: np.ndarray) -> np.ndarray:
+        h, w = frame.shape[:2]
+        if w > self.width:
+            # вызывается в основном цикле: INTER_LINEAR быстрее копии полного кадра, INTER_AREA — в разы медленнее
+            return cv2.resize(frame, (self.width, int(round(h * self.width / w))), interpolation=cv2.INTER_LINEAR)
+        return frame.copy()
+
+    def _compress(self, frame: np.ndarray) -> bytes:
+        ok, buf = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.quality])
+        if not ok:
+            raise RuntimeError("Не удалось закодировать кадр клипа")
+        return buf.tobytes()
+
+    def _take_frames(self) -> list:
+        with self._inbox_lock:
+            self._has_frames.clear()
+            taken = []
+            for camera_id, inbox in self._inbox.items():
+                taken.extend((camera_id, ts, frame) for ts, frame in inbox)
+                inbox.clear()
+                self._inbox_bytes[camera_id] = 0
+            return taken
+
+    def _encoder(self):
+        while not self._stop_event.is_set():
+            self._has_frames.wait(timeout=0.2)
+            for camera_id, ts, frame in self._take_frames():
+                ring = self.rings.get(camera_id)
+                if ring is None:
+                    ring = self.rings[camera_id] = FrameRing(self.max_bytes, self.pre + self.post + 1.0)
+                with self.timer.stage("clip_jpeg"):
+                    ring.append(ts, self._compress(frame))
+
+            while True:
+                try:
+                    self._pending.append(self._requests.get_nowait())
+                except queue.Empty:
+                    break
+            self._collect_ready()
+
+    def _collect_ready(self):
+        """Заказы, для которых уже есть все кадры после события (или камера замолчала)."""
+        mono = time.monotonic()
+        still = []
+        for camera_id, ts, key in self._pending:
+            ring = self.rings.get(camera_id)
+            end = ts + self.post
+            latest = ring.latest_ts if ring is not None else None
+            if (latest is None or latest < end) and mono < end + 2.0:
+                still.append((camera_id, ts, key))
+                continue
+            frames = ring.between(ts - self.pre, end) if ring is not None else []
+            if not frames:
+                self.failed += 1
+                print(f"[WARN] Нет кадров для клипа {key} ({camera_id})")
+                continue
+            try:
+                self._uploads.put_nowait((key, frames))
+            except queue.Full:
+                self.failed += 1
+                print(f"[WARN] Очередь клипов переполнена, клип {key} пропущен")
+        self._pending = still
+
+    def _uploader(self):
+        # клипы, оставшиеся на диске от прошлого запуска, — при первом же проходе
+        next_resend = time.monotonic()
+        while not self._stop_event.is_set():
+            if time.monotonic() >= next_resend:
+                self._resend_spooled()
+                next_resend = time.monotonic() + SPOOL_INTERVAL
+            try:
+                key, frames = self._uploads.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            tmpdir = tempfile.mkdtemp(prefix="clip_")
+            path = os.path.join(tmpdir, "clip.mp4")
+            try:
+                with self.timer.stage("clip_encode"):
+                    encode_clip(frames, path)
+                with self.timer.stage("clip_send"):
+                    self._post_with_retries(key, path)
+                self.uploaded += 1
+                print(f"[OK] Clip uploaded: {key} ({len(frames)} frames)")
+            except ValueError as e:
+                self.failed += 1
+                print(f"[ERR] Clip {key} rejected by backend:", e)
+            except Exception as e:
+                if os.path.exists(path):
+                    shutil.move(path, self._spool_path(key))
+                    print(f"[WARN] Клип {key} отложен до записи события: {e}")
+                else:
+                    self.failed += 1
+                    print(f"[ERR] Failed to upload clip {key}:", e)
+            finally:
+                shutil.rmtree(tmpdir, ignore_errors=True)
+
+    def _spool_path(self, key: str) -> str:
+        return os.path.join(self.spool_dir, os.path.basename(key))
+
+    def _resend_spooled(self):
+        """Один проход по отложенным клипам, старые — первыми."""
+        try:
+            names = [name for name in os.listdir(self.spool_dir) if name.endswith(".mp4")]
+        except FileNotFoundError:
+            return
+        paths = sorted((os.path.join(self.spool_dir, name) for name in names), key=os.path.getmtime)
+        for path in paths:
+            if self._stop_event.is_set():
+                return
+            key = f"clips/{os.path.basename(path)}"
+            if time.time() - os.path.getmtime(path) > self.spool_max_age:
+                os.remove(path)
+                self.failed += 1
+                print(f"[WARN] Событие клипа {key} так и не записано, клип удалён")
+                continue
+            try:
+                self._post(key, path)
+            except _EventNotWritten:
+                continue
+            except ValueError as e:
+                os.remove(path)
+                self.failed += 1
+                print(f"[ERR] Clip {key} rejected by backend:", e)
+                continue
+            except Exception:
+                # бэкенд недоступен — остальные не мучаем до следующего прохода
+                return
+            os.remove(path)
+            self.uploaded += 1
+            print(f"[OK] Clip uploaded: {key} (отложенный)")
+
+    def _post(self, key: str, path: str):
+        with open(path, "rb") as f:
+            resp = self.session.post(
+                self.url,
+                data={"key": key},
+                files={"clip": ("clip.mp4", f, "video/mp4")},
+                timeout=self.timeout,
+            )
+        if resp.status_code == 409:
+            raise _EventNotWritten(f"409 {resp.text[:200]}")
+        if 400 <= resp.status_code < 500:
+            raise ValueError(f"{resp.status_code} {resp.text[:200]}")
+        resp.raise_for_status()
+
+    def _post_with_retries(self, key: str, path: str):
+        """Повторяет только сбои сети и 5xx; 409 и отказ (ValueError) — сразу вызывающему."""
+        delay = 0.5
+        for attempt in range(self.retries + 1):
+            try:
+                self._post(key, path)
+                return
+            except (_EventNotWritten, ValueError):
+                raise
+            except Exception:
+                if attempt == self.retries or self._stop_event.is_set():
+                    raise
+                self._stop_event.wait(delay)
+                delay *= 2
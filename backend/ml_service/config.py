@@ -0,0 +1,151 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RTSP_URL = os.getenv(
+    "RTSP_URL",
+)
+# несколько камер в одном процессе: RTSP_URLS=rtsp://a,rtsp://b
+RTSP_URLS = [u.strip() for u in os.getenv("RTSP_URLS", "").split(",") if u.strip()]
+# JSON со списком камер и их настройками (см. cameras.example.json)
+CAMERAS_CONFIG = os.getenv("CAMERAS_CONFIG")
+BACKEND_URL = os.getenv(
+    "BACKEND_URL",
+)
+# snapshot отправляется сырым JPEG (multipart), а не base64 в JSON
+BACKEND_UPLOAD_URL = os.getenv(
+    "BACKEND_UPLOAD_URL",
+    f"{(BACKEND_URL or '').rstrip('/')}/upload",
+)
+# пачка событий одним запросом (пустое значение — по одному через BACKEND_UPLOAD_URL)
+BACKEND_BATCH_URL = os.getenv(
+    "BACKEND_BATCH_URL",
+    f"{(BACKEND_URL or '').rstrip('/')}/batch",
+)
+# куда загружаются клипы до/после события
+BACKEND_CLIP_URL = os.getenv(
+    "BACKEND_CLIP_URL",
+    f"{(BACKEND_URL or '').rstrip('/')}/clip",
+)
+MODEL_PATH = os.getenv(
+    "MODEL_PATH",
+)
+
+PERSON_CLASS = 0
+
+LEFT_OBJECT_CLASSES = set([x for x in range(80) if x not in [0, 2, 3, 4, 5, 6, 7]])
+
+MAX_COORD_DIST = 40
+
+# потолок числа отслеживаемых предметов на камеру (сверх — вытеснение LRU)
+OBJECT_STORE_MAX = int(os.getenv("OBJECT_STORE_MAX", "2000"))
+# предмет, не виденный столько секунд, удаляется (с владельцем или без);
+# по умолчанию 5 * LEFT_SECONDS — тот же горизонт, что был у предметов с владельцем
+OBJECT_TTL_SECONDS = float(os.getenv("OBJECT_TTL_SECONDS", "20"))
+
+APPEAR_WINDOW = 12
+MIN_INITIAL_IOU = 0.05
+# IoU, при котором человек считается "рядом" с предметом
+NEAR_IOU = 0.05
+LEFT_SECONDS = 4
+
+OBJ_CONF_THR = 0.4
+MIN_OBJ_AREA_FRAC = 0.0005
+MAX_OBJ_AREA_FRAC = 0.2
+
+TARGET_FPS = 10
+
+# рантайм детектора (см. runtime.py): torch | onnx | openvino
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+# INT8-квантизация (onnx/openvino) по кадрам CALIBRATION_VIDEO
+INFERENCE_INT8 = os.getenv("INFERENCE_INT8", "0") == "1"
+# потоки CPU для инференса, 0 — по умолчанию библиотеки
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "0"))
+INFERENCE_IMGSZ = int(os.getenv("INFERENCE_IMGSZ", "640"))
+CALIBRATION_VIDEO = os.getenv("CALIBRATION_VIDEO", "media_server/test.mp4")
+CALIBRATION_FRAMES = 64
+# куда складываются экспортированные модели (кэш между перезапусками)
+MODEL_EXPORT_DIR = os.getenv("MODEL_EXPORT_DIR", "data/models")
+WARMUP_RUNS = 3
+TRACKER = os.getenv("TRACKER", "botsort.yaml")
+BRIGHTEN = False
+
+# пропуск детектора на статичных кадрах (см. motion.py)
+MOTION_GATE = os.getenv("MOTION_GATE", "1") == "1"
+# ширина уменьшенного кадра для сравнения
+MOTION_WIDTH = 160
+# разница яркости пикселя, считающаяся изменением
+MOTION_PIXEL_THR = 25
+# доля изменившихся пикселей, при которой кадр идёт в детектор
+MOTION_MIN_AREA = 0.002
+# детектор запускается не реже чем раз в столько секунд (должно быть заметно меньше LEFT_SECONDS)
+MOTION_FORCE_SECONDS = float(os.getenv("MOTION_FORCE_SECONDS", "1"))
+
+# тайловый инференс для широких кадров (включается per-camera ключом "tiles")
+TILE_SIZE = 640
+TILE_OVERLAP = 0.2
+# тайлы режутся, только если область детекции не уже этой ширины
+TILE_MIN_WIDTH = 1920
+# порог перекрытия (пересечение / меньшая площадь) при склейке тайлов
+TILE_NMS_IOU = 0.5
+
+# каскад: дешёвая модель на каждом кадре, MODEL_PATH — только по требованию (см. cascade.py);
+# пусто — выключено
+CASCADE_MODEL_PATH = os.getenv("CASCADE_MODEL_PATH", "")
+CASCADE_IMGSZ = int(os.getenv("CASCADE_IMGSZ", "320"))
+# порог уверенности кандидатов первой ступени (ниже OBJ_CONF_THR — лучше лишний раз разбудить)
+CASCADE_CONF = float(os.getenv("CASCADE_CONF", "0.25"))
+# полный детектор, если до LEFT_SECONDS у какого-то предмета осталось меньше этого, сек
+CASCADE_DUE_SECONDS = float(os.getenv("CASCADE_DUE_SECONDS", "1.5"))
+# полный детектор не реже чем раз в столько секунд
+CASCADE_FORCE_SECONDS = float(os.getenv("CASCADE_FORCE_SECONDS", "2"))
+# поля вокруг кандидатов при вырезании кропа, доля размера бокса
+CASCADE_CROP_PAD = 0.5
+# если кроп больше этой доли области детекции — полный детектор идёт по всей области
+CASCADE_CROP_MAX_AREA = 0.5
+
+# доставка событий в бэкенд
+DELIVERY_WORKERS = int(os.getenv("DELIVERY_WORKERS", "2"))
+DELIVERY_QUEUE_SIZE = int(os.getenv("DELIVERY_QUEUE_SIZE", "256"))
+DELIVERY_BATCH_SIZE = int(os.getenv("DELIVERY_BATCH_SIZE", "8"))
+DELIVERY_RETRIES = int(os.getenv("DELIVERY_RETRIES", "3"))
+DELIVERY_TIMEOUT = float(os.getenv("DELIVERY_TIMEOUT", "5"))
+# сюда складываются события, пока бэкенд недоступен
+EVENT_JOURNAL_DIR = os.getenv("EVENT_JOURNAL_DIR", "data/journal")
+
+# клипы до/после события (см. clips.py); по умолчанию выключены
+CLIPS_ENABLED = os.getenv("CLIPS_ENABLED", "0") == "1"
+CLIP_PRE_SECONDS = float(os.getenv("CLIP_PRE_SECONDS", "5"))
+CLIP_POST_SECONDS = float(os.getenv("CLIP_POST_SECONDS", "5"))
+# память под кадры одной камеры, МБ: столько же под сжатые и под ожидающие сжатия
+CLIP_BUFFER_MB = float(os.getenv("CLIP_BUFFER_MB", "8"))
+CLIP_WIDTH = int(os.getenv("CLIP_WIDTH", "480"))
+CLIP_JPEG_QUALITY = int(os.getenv("CLIP_JPEG_QUALITY", "50"))
+# клип, событие которого ещё не в БД (ждёт в журнале), лежит на диске рядом с журналом
+# событий и досылается; старше этого — удаляется, сек
+CLIP_SPOOL_MAX_AGE = float(os.getenv("CLIP_SPOOL_MAX_AGE", "86400"))
+
+# снимки состояния трекинга для быстрого рестарта (см. checkpoint.py)
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", "data/checkpoints")
+CHECKPOINT_INTERVAL = float(os.getenv("CHECKPOINT_INTERVAL", "5"))
+# снимок старше этого при старте игнорируется, сек
+CHECKPOINT_MAX_AGE = float(os.getenv("CHECKPOINT_MAX_AGE", "120"))
+
+# многопроцессный режим (см. supervisor.py): столько процессов инференса,
+# декодеры — по процессу на камеру, кадры — через общую память; 0 — всё в одном процессе
+ML_WORKERS = int(os.getenv("ML_WORKERS", "0"))
+# слотов на камеру в общей памяти (тройная буферизация: пишущий, читаемый, последний)
+FRAME_BUS_SLOTS = 3
+# больше этого кадр уменьшается декодером перед записью в слот
+FRAME_BUS_MAX_WIDTH = int(os.getenv("FRAME_BUS_MAX_WIDTH", "1920"))
+FRAME_BUS_MAX_HEIGHT = int(os.getenv("FRAME_BUS_MAX_HEIGHT", "1080"))
+# процесс, не подававший признаков жизни столько секунд, перезапускается
+SUPERVISOR_HEARTBEAT_TIMEOUT = float(os.getenv("SUPERVISOR_HEARTBEAT_TIMEOUT", "30"))
+
+# порт HTTP /metrics (Prometheus), 0 — выключено
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+# как часто печатать статистику чтения потоков, сек
+STATS_INTERVAL = 30
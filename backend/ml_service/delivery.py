@@ -0,0 +1,466 @@
+import base64
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+import cv2
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    BACKEND_BATCH_URL,
+    BACKEND_UPLOAD_URL,
+    DELIVERY_WORKERS,
+    DELIVERY_QUEUE_SIZE,
+    DELIVERY_BATCH_SIZE,
+    DELIVERY_RETRIES,
+    DELIVERY_TIMEOUT,
+    EVENT_JOURNAL_DIR,
+)
+from profiling import NULL_TIMER
+
+JOURNAL_NAME = "events.jsonl"
+REPLAY_INTERVAL = 10
+# после 413 пачка уменьшается вдвое; после стольких удачных пачек подряд — растёт вдвое
+BATCH_GROW_AFTER = 20
+
+
+def frame_to_jpeg(frame, quality=60) -> bytes:
+    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+    ok, buffer = cv2.imencode(".jpg", frame, encode_param)
+    if not ok:
+        raise RuntimeError("Не удалось закодировать кадр в JPEG")
+    return buffer.tobytes()
+
+
+class _PendingEvent:
+    __slots__ = ("frame", "bbox", "owner_id", "object_id", "timestamp", "clip_key")
+
+    def __init__(self, frame, bbox, owner_id, object_id, timestamp, clip_key=None):
+        self.frame = frame
+        self.bbox = bbox
+        self.owner_id = owner_id
+        self.object_id = object_id
+        self.timestamp = timestamp
+        self.clip_key = clip_key
+
+    def to_payload(self) -> dict:
+        """Метаданные события + сырой JPEG (уходит в multipart отдельной частью)."""
+        x1, y1, x2, y2 = self.bbox
+        return {
+            "event": {
+                "timestamp": self.timestamp,
+                "owner_id": int(self.owner_id) if self.owner_id is not None else None,
+                "object_id": int(self.object_id) if self.object_id is not None else None,
+                "bbox": [float(x1), float(y1), float(x2), float(y2)],
+                "clip_key": self.clip_key,
+            },
+            "jpeg": frame_to_jpeg(self.frame),
+        }
+
+
+def _payload_to_journal(payload: dict) -> str:
+    return json.dumps({
+        "event": payload["event"],
+        "jpeg_base64": base64.b64encode(payload["jpeg"]).decode("ascii"),
+    })
+
+
+def _payload_from_journal(line: str) -> dict:
+    record = json.loads(line)
+    return {"event": record["event"], "jpeg": base64.b64decode(record["jpeg_base64"])}
+
+
+class _PermanentError(Exception):
+    """Бэкенд отверг событие (4xx) — повторять и журналировать бессмысленно."""
+
+
+class _BatchUnsupported(Exception):
+    """Бэкенд без POST /internal/events/batch (старая версия)."""
+
+
+class _BatchTooLarge(Exception):
+    """Пачка больше BATCH_MAX_EVENTS бэкенда (413)."""
+
+
+class EventDispatcher:
+    """
+    Фоновая доставка событий в бэкенд.
+
+    submit() только кладёт кадр в ограниченную очередь и сразу возвращается.
+    Кодирование JPEG и HTTP (multipart с сырым JPEG) идут в пуле воркеров
+    с общим keep-alive сеансом;
+    воркер забирает из очереди до batch_size событий за раз и отправляет их
+    одним запросом на batch_url (если бэкенд его не знает — по одному). Неудачные
+    отправки повторяются с backoff, а если бэкенд так и не ответил — пишутся
+    в журнал на диске и досылаются, когда бэкенд снова доступен.
+
+    Если очередь полна (бэкенд лежит, воркеры ждут повторов), submit кладёт
+    событие в список переполнения, а кодирует и пишет его в журнал поток
+    delivery-spill — основной цикл на диск не ходит.
+    """
+
+    def __init__(
+        self,
+        url: str = BACKEND_UPLOAD_URL,
+        batch_url: str = BACKEND_BATCH_URL,
+        workers: int = DELIVERY_WORKERS,
+        queue_size: int = DELIVERY_QUEUE_SIZE,
+        batch_size: int = DELIVERY_BATCH_SIZE,
+        retries: int = DELIVERY_RETRIES,
+        timeout: float = DELIVERY_TIMEOUT,
+        journal_dir: str = EVENT_JOURNAL_DIR,
+        timer=NULL_TIMER,
+    ):
+        self.url = url
+        self.batch_url = batch_url or None
+        self.timer = timer
+        self.max_batch_size = batch_size
+        self.batch_size = batch_size
+        self._batch_successes = 0
+        self.retries = retries
+        self.timeout = timeout
+
+        self.journal_dir = journal_dir
+        self.journal_path = os.path.join(journal_dir, JOURNAL_NAME)
+        self._journal_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        # переполнение очереди: события ждут записи в журнал потоком delivery-spill
+        self._spill = deque()
+        self._spill_ready = threading.Event()
+        self._stop_event = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"delivery-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        self._threads.append(
+            threading.Thread(target=self._replayer, name="delivery-replay", daemon=True)
+        )
+        self._threads.append(
+            threading.Thread(target=self._spiller, name="delivery-spill", daemon=True)
+        )
+
+        # счётчики и batch_url/batch_size меняют все воркеры и досылка
+        self._stats_lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.journal_pending = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self):
+        os.makedirs(self.journal_dir, exist_ok=True)
+        # до подсчёта: недоставленное из .replay тоже ждёт в журнале
+        self._merge_replays()
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding="utf-8") as f:
+                self.journal_pending = sum(1 for line in f if line.strip())
+        for t in self._threads:
+            t.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Останавливает воркеры; всё, что осталось в очереди, уходит в журнал."""
+        self._stop_event.set()
+        for t in self._threads:
+            t.join(timeout)
+        leftovers = []
+        while True:
+            try:
+                leftovers.append(self._queue.get_nowait().to_payload())
+            except queue.Empty:
+                break
+        while self._spill:
+            leftovers.append(self._spill.popleft().to_payload())
+        if leftovers:
+            self._journal(leftovers)
+
+    def submit(self, frame: np.ndarray, bbox, owner_id=None, object_id=None, clip_key=None) -> None:
+        event = _PendingEvent(
+            frame=frame,
+            bbox=bbox,
+            owner_id=owner_id,
+            object_id=object_id,
+            timestamp=datetime.now(timezone.utc).isoformat(),
+            clip_key=clip_key,
+        )
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # очередь забита — лучше записать на диск, чем потерять событие, но не здесь
+            self._spill.append(event)
+            self._spill_ready.set()
+
+    # ---------- воркеры ----------
+
+    def _count(self, sent: int = 0, failed: int = 0, journaled: int = 0):
+        with self._stats_lock:
+            self.sent += sent
+            self.failed += failed
+            self.journal_pending += journaled
+
+    def _batch_params(self) -> tuple:
+        with self._stats_lock:
+            return self.batch_url, self.batch_size
+
+    def _batch_unsupported(self):
+        with self._stats_lock:
+            self.batch_url = None
+
+    def _batch_too_large(self, size: int) -> int:
+        """413 на пачке из size событий: дальше вдвое меньше; возвращает новый batch_size."""
+        with self._stats_lock:
+            self.batch_size = min(self.batch_size, max(1, size // 2))
+            self._batch_successes = 0
+            return self.batch_size
+
+    def _batch_succeeded(self):
+        with self._stats_lock:
+            if self.batch_size >= self.max_batch_size:
+                return
+            self._batch_successes += 1
+            if self._batch_successes >= BATCH_GROW_AFTER:
+                self._batch_successes = 0
+                self.batch_size = min(self.max_batch_size, self.batch_size * 2)
+
+    def _next_batch(self) -> list:
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        batch = [first]
+        # на пачки по текущему batch_size делит _deliver
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while not self._stop_event.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+
+            payloads = []
+            for event in batch:
+                try:
+                    with self.timer.stage("jpeg"):
+                        payloads.append(event.to_payload())
+                except Exception as e:
+                    self._count(failed=1)
+                    print("[ERR] Failed to encode event:", e)
+
+            undelivered = self._deliver(payloads)
+            if undelivered:
+                self._journal(undelivered)
+
+    def _deliver(self, payloads: list) -> list:
+        """Отправляет пачку; возвращает то, что не удалось доставить (для журнала)."""
+        batch_url, batch_size = self._batch_params()
+        if batch_url and len(payloads) > 1:
+            undelivered = []
+            for start in range(0, len(payloads), batch_size):
+                chunk = payloads[start:start + batch_size]
+                try:
+                    undelivered += self._post_batch_with_retries(batch_url, chunk)
+                    self._batch_succeeded()
+                except _BatchUnsupported:
+                    print("[WARN] Бэкенд не поддерживает пакетную отправку, шлём по одному")
+                    self._batch_unsupported()
+                    return undelivered + self._deliver(payloads[start:])
+                except _BatchTooLarge:
+                    if len(chunk) == 1:
+                        self._count(failed=1)
+                        print("[ERR] Event rejected by backend: 413")
+                        continue
+                    # дальше пачками вдвое меньше, пока бэкенд их не примет
+                    new_size = self._batch_too_large(len(chunk))
+                    print(f"[WARN] Бэкенд отклонил пачку из {len(chunk)} событий (413), batch_size={new_size}")
+                    return undelivered + self._deliver(payloads[start:])
+                except _PermanentError as e:
+                    self._count(failed=len(chunk))
+                    print("[ERR] Event batch rejected by backend:", e)
+                except Exception as e:
+                    self._count(failed=len(chunk))
+                    print("[ERR] Failed to send event batch:", e)
+                    return undelivered + payloads[start:]
+            return undelivered
+
+        for i, payload in enumerate(payloads):
+            try:
+                self._post_with_retries(payload)
+            except _PermanentError as e:
+                self._count(failed=1)
+                print("[ERR] Event rejected by backend:", e)
+            except Exception as e:
+                self._count(failed=1)
+                print("[ERR] Failed to send event:", e)
+                # бэкенд недоступен — остаток пачки не мучаем, сразу в журнал
+                return payloads[i:]
+        return []
+
+    def _post_with_retries(self, payload: dict):
+        delay = 0.5
+        for attempt in range(self.retries + 1):
+            try:
+                with self.timer.stage("send"):
+                    resp = self.session.post(
+                        self.url,
+                        data={"event": json.dumps(payload["event"])},
+                        files={"snapshot": ("snapshot.jpg", payload["jpeg"], "image/jpeg")},
+                        timeout=self.timeout,
+                    )
+                if 400 <= resp.status_code < 500:
+                    raise _PermanentError(f"{resp.status_code} {resp.text[:200]}")
+                resp.raise_for_status()
+                self._count(sent=1)
+                print("[OK] Event sent:", resp.json())
+                return
+            except _PermanentError:
+                raise
+            except Exception:
+                if attempt == self.retries or self._stop_event.is_set():
+                    raise
+                self._stop_event.wait(delay)
+                delay *= 2
+
+    def _post_batch_with_retries(self, batch_url: str, payloads: list) -> list:
+        """
+        Одна пачка одним запросом. Возвращает события, которые бэкенд не
+        принял по повторяемой причине (S3/БД) — они уходят в журнал.
+        """
+        delay = 0.5
+        for attempt in range(self.retries + 1):
+            try:
+                with self.timer.stage("send"):
+                    resp = self.session.post(
+                        batch_url,
+                        data={"events": json.dumps([p["event"] for p in payloads])},
+                        files=[
+                            ("snapshots", ("snapshot.jpg", p["jpeg"], "image/jpeg"))
+                            for p in payloads
+                        ],
+                        timeout=self.timeout,
+                    )
+                if resp.status_code in (404, 405):
+                    raise _BatchUnsupported()
+                if resp.status_code == 413:
+                    raise _BatchTooLarge()
+                if 400 <= resp.status_code < 500:
+                    raise _PermanentError(f"{resp.status_code} {resp.text[:200]}")
+                resp.raise_for_status()
+                results = resp.json()["results"]
+                break
+            except (_BatchUnsupported, _BatchTooLarge, _PermanentError):
+                raise
+            except Exception:
+                if attempt == self.retries or self._stop_event.is_set():
+                    raise
+                self._stop_event.wait(delay)
+                delay *= 2
+
+        retry = []
+        for result in results:
+            if result["ok"]:
+                self._count(sent=1)
+                print("[OK] Event sent:", result["event"])
+            elif result["retryable"]:
+                self._count(failed=1)
+                print("[ERR] Failed to send event:", result["error"])
+                retry.append(payloads[result["index"]])
+            else:
+                self._count(failed=1)
+                print("[ERR] Event rejected by backend:", result["error"])
+        return retry
+
+    # ---------- журнал ----------
+
+    def _journal(self, payloads: list):
+        with self._journal_lock:
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                for payload in payloads:
+                    f.write(_payload_to_journal(payload) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        self._count(journaled=len(payloads))
+        print(f"[WARN] {len(payloads)} событий записано в журнал {self.journal_path}")
+
+    def _take_journal(self) -> tuple:
+        """
+        Атомарно забирает журнал целиком (новые записи пойдут в новый файл).
+        Возвращает (путь .replay, события); файл удаляет вызывающий, когда
+        каждое событие доставлено или снова записано в журнал.
+        """
+        with self._journal_lock:
+            if not os.path.exists(self.journal_path):
+                return None, []
+            replay_path = f"{self.journal_path}.{int(time.time() * 1000)}.replay"
+            os.replace(self.journal_path, replay_path)
+
+        payloads = []
+        with open(replay_path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    payloads.append(_payload_from_journal(line))
+        return replay_path, payloads
+
+    def _spiller(self):
+        while not self._stop_event.is_set():
+            if not self._spill_ready.wait(0.5):
+                continue
+            self._spill_ready.clear()
+            payloads = []
+            while self._spill:
+                event = self._spill.popleft()
+                try:
+                    with self.timer.stage("jpeg"):
+                        payloads.append(event.to_payload())
+                except Exception as e:
+                    self._count(failed=1)
+                    print("[ERR] Failed to encode event:", e)
+            if payloads:
+                print(f"[WARN] Очередь событий переполнена, {len(payloads)} событий пишем в журнал")
+                self._journal(payloads)
+
+    def _merge_replays(self):
+        """Недоставленные файлы от прошлого запуска, упавшего посреди досылки, — обратно в журнал."""
+        with self._journal_lock:
+            for name in os.listdir(self.journal_dir):
+                if name.startswith(JOURNAL_NAME) and name.endswith(".replay"):
+                    path = os.path.join(self.journal_dir, name)
+                    with open(path, encoding="utf-8") as src, \
+                            open(self.journal_path, "a", encoding="utf-8") as dst:
+                        dst.write(src.read())
+                        dst.flush()
+                        os.fsync(dst.fileno())
+                    os.remove(path)
+
+    def _replayer(self):
+        while not self._stop_event.wait(REPLAY_INTERVAL):
+            replay_path, payloads = self._take_journal()
+            if replay_path is None:
+                continue
+            if payloads:
+                print(f"[INFO] Досылаем {len(payloads)} событий из журнала")
+                self._count(journaled=-len(payloads))
+                undelivered = self._deliver(payloads)
+                if undelivered:
+                    self._journal(undelivered)
+            # только теперь: упади процесс посреди досылки, файл подхватится
+            # при следующем запуске (часть событий может уйти повторно)
+            os.remove(replay_path)
@@ -0,0 +1,150 @@
+import numpy as np
+
+
+class Detections:
+    """
+    Детекции одного кадра в numpy: xyxy (N, 4), conf (N,), cls (N,), ids (N,).
+    id = -1, если трек не назначен. Интерфейс (xywh/conf/cls/xyxy, len,
+    индексация маской) совместим с трекерами ultralytics.
+    """
+
+    def __init__(self, xyxy, conf, cls, ids=None):
+        self.xyxy = np.asarray(xyxy, dtype=float).reshape(-1, 4)
+        self.conf = np.asarray(conf, dtype=float).reshape(-1)
+        self.cls = np.asarray(cls, dtype=float).reshape(-1)
+        if ids is None:
+            self.ids = np.full(len(self.xyxy), -1, dtype=int)
+        else:
+            self.ids = np.asarray(ids).astype(int).reshape(-1)
+
+    def __len__(self):
+        return len(self.xyxy)
+
+    def __getitem__(self, idx):
+        return Detections(self.xyxy[idx], self.conf[idx], self.cls[idx], self.ids[idx])
+
+    @property
+    def xywh(self):
+        xy = (self.xyxy[:, :2] + self.xyxy[:, 2:]) / 2
+        wh = self.xyxy[:, 2:] - self.xyxy[:, :2]
+        return np.concatenate([xy, wh], axis=1)
+
+    def shifted(self, dx: float, dy: float):
+        """Те же детекции со сдвигом координат (из тайла/кропа в координаты кадра)."""
+        if not dx and not dy:
+            return self
+        return Detections(self.xyxy + [dx, dy, dx, dy], self.conf, self.cls, self.ids)
+
+    @classmethod
+    def concat(cls, items: list):
+        if not items:
+            return cls.empty()
+        if len(items) == 1:
+            return items[0]
+        return cls(
+            np.concatenate([d.xyxy for d in items]),
+            np.concatenate([d.conf for d in items]),
+            np.concatenate([d.cls for d in items]),
+            np.concatenate([d.ids for d in items]),
+        )
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((0, 4)), np.zeros(0), np.zeros(0))
+
+    @classmethod
+    def from_result(cls, result):
+        rboxes = getattr(result, "boxes", None)
+        if rboxes is None or getattr(rboxes, "xyxy", None) is None or getattr(rboxes, "cls", None) is None:
+            return cls.empty()
+
+        xyxy = rboxes.xyxy.cpu().numpy()
+        cls_ = rboxes.cls.cpu().numpy()
+        conf_t = getattr(rboxes, "conf", None)
+        conf = conf_t.cpu().numpy() if conf_t is not None else np.ones(len(xyxy))
+        ids_t = getattr(rboxes, "id", None)
+        ids = ids_t.cpu().numpy() if ids_t is not None else None
+        return cls(xyxy, conf, cls_, ids)
+
+
+def detect_batch(model, frames: list, conf: float, classes: list, imgsz: int = None) -> list:
+    """
+    Один вызов детектора на пачку кадров (по кадру с камеры).
+    Возвращает список Detections в том же порядке.
+    imgsz — размер входа, если он отличается от размера модели по умолчанию.
+    """
+    if not frames:
+        return []
+    extra = {"imgsz": imgsz} if imgsz else {}
+    results = model.predict(
+        frames,
+        verbose=False,
+        conf=conf,
+        classes=classes,
+        **extra,
+    )
+    return [Detections.from_result(r) for r in results]
+
+
+def detect_views(model, groups: list, conf: float, classes: list, imgsz: int = None) -> list:
+    """
+    Как detect_batch, но у каждого кадра может быть несколько изображений
+    (кроп ROI, тайлы): все они уходят в детектор одной пачкой.
+    groups — список списков изображений, ответ — в той же структуре.
+    """
+    flat = detect_batch(model, [img for group in groups for img in group], conf, classes, imgsz)
+    out = []
+    pos = 0
+    for group in groups:
+        out.append(flat[pos:pos + len(group)])
+        pos += len(group)
+    return out
+
+
+def make_tiles(width: int, height: int, size: int, overlap: float) -> list:
+    """Квадратные тайлы size x size с перекрытием overlap, покрывающие (width, height)."""
+
+    def starts(length):
+        if length <= size:
+            return [0]
+        step = max(1, int(size * (1 - overlap)))
+        out = list(range(0, length - size, step))
+        out.append(length - size)
+        return out
+
+    return [
+        (x, y, min(x + size, width), min(y + size, height))
+        for y in starts(height)
+        for x in starts(width)
+    ]
+
+
+def merge_nms(dets: Detections, iou_thr: float = 0.5) -> Detections:
+    """
+    NMS по классам для склейки тайлов. Перекрытие считается как пересечение,
+    делённое на площадь меньшего бокса: объект, разрезанный краем тайла,
+    гасится целым боксом из соседнего тайла, хотя обычный IoU у них мал.
+    """
+    n = len(dets)
+    if n < 2:
+        return dets
+
+    x1, y1, x2, y2 = dets.xyxy.T
+    area = (x2 - x1) * (y2 - y1)
+    order = np.argsort(-dets.conf, kind="stable")
+    suppressed = np.zeros(n, dtype=bool)
+    keep = []
+    for pos, i in enumerate(order):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        rest = order[pos + 1:]
+        rest = rest[~suppressed[rest] & (dets.cls[rest] == dets.cls[i])]
+        if not len(rest):
+            continue
+        iw = np.maximum(0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+        ih = np.maximum(0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+        smaller = np.minimum(area[i], area[rest])
+        overlap = np.divide(iw * ih, smaller, out=np.zeros(len(rest)), where=smaller > 0)
+        suppressed[rest[overlap > iou_thr]] = True
+    return dets[np.sort(np.array(keep))]
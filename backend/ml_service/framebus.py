@@ -0,0 +1,249 @@
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from capture import FrameGrabber
+from config import FRAME_BUS_SLOTS, FRAME_BUS_MAX_WIDTH, FRAME_BUS_MAX_HEIGHT
+
+# поля состояния камеры (int64)
+LATEST = 0  # слот с последним опубликованным кадром, -1 — кадров ещё не было
+READING = 1  # слот, который сейчас держит читатель, -1 — никакой
+SEQ = 2  # номер последнего опубликованного кадра
+DECODED = 3
+RECONNECTS = 4
+CONNECTED = 5
+DECODER_BEAT = 6  # time.monotonic() потока чтения декодера, мс
+READER_BEAT = 7  # time.monotonic() читателя, мс
+_FIELDS = 8
+
+_ALIGN = 64
+
+
+def _now_ms() -> int:
+    # CLOCK_MONOTONIC общий для всех процессов хоста
+    return int(time.monotonic() * 1000)
+
+
+class FrameBus:
+    """
+    Кадры камер в одном сегменте общей памяти (multiprocessing.shared_memory).
+
+    У каждой камеры slots слотов по max_width * max_height * 3 байт и строка
+    состояния. Один пишущий (процесс-декодер камеры) и один читающий
+    (процесс инференса) на камеру, без блокировок — тройная буферизация:
+    декодер пишет в слот, который не последний опубликованный и не занят
+    читателем, и только потом публикует его номер в LATEST. Читатель получает
+    view на слот без копирования; он валиден до следующего read() этой камеры.
+
+    Сегмент создаёт супервизор (create), дочерние процессы подключаются
+    по имени (attach).
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, cameras: int, slots: int, max_width: int, max_height: int):
+        self.shm = shm
+        self.cameras = cameras
+        self.slots = slots
+        self.max_width = max_width
+        self.max_height = max_height
+        self.slot_bytes = max_width * max_height * 3
+
+        buf = shm.buf
+        offset = 0
+
+        def take(shape, dtype):
+            nonlocal offset
+            arr = np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset)
+            offset += -(-arr.nbytes // _ALIGN) * _ALIGN
+            return arr
+
+        self.state = take((cameras, _FIELDS), np.int64)
+        self.slot_seq = take((cameras, slots), np.int64)
+        self.slot_ts = take((cameras, slots), np.float64)
+        self.slot_shape = take((cameras, slots, 2), np.int64)
+        self.frames = take((cameras, slots, self.slot_bytes), np.uint8)
+
+    @staticmethod
+    def size(cameras: int, slots: int, max_width: int, max_height: int) -> int:
+        meta = [cameras * _FIELDS * 8, cameras * slots * 8, cameras * slots * 8, cameras * slots * 16]
+        total = sum(-(-n // _ALIGN) * _ALIGN for n in meta)
+        return total + cameras * slots * max_width * max_height * 3
+
+    @classmethod
+    def create(
+        cls,
+        cameras: int,
+        slots: int = FRAME_BUS_SLOTS,
+        max_width: int = FRAME_BUS_MAX_WIDTH,
+        max_height: int = FRAME_BUS_MAX_HEIGHT,
+    ):
+        shm = shared_memory.SharedMemory(create=True, size=cls.size(cameras, slots, max_width, max_height))
+        bus = cls(shm, cameras, slots, max_width, max_height)
+        bus.state[:] = 0
+        bus.state[:, LATEST] = -1
+        bus.state[:, READING] = -1
+        bus.slot_seq[:] = 0
+        return bus
+
+    @classmethod
+    def attach(cls, name: str, cameras: int, slots: int, max_width: int, max_height: int):
+        return cls(shared_memory.SharedMemory(name=name), cameras, slots, max_width, max_height)
+
+    @property
+    def spec(self) -> tuple:
+        """Аргументы attach() для дочернего процесса."""
+        return (self.shm.name, self.cameras, self.slots, self.max_width, self.max_height)
+
+    def close(self):
+        # view на буфер нужно отпустить до close(), иначе BufferError
+        del self.state, self.slot_seq, self.slot_ts, self.slot_shape, self.frames
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+    # ---------- пишущий (декодер) ----------
+
+    def write(self, cam: int, ts: float, frame: np.ndarray) -> None:
+        h, w = frame.shape[:2]
+        if w > self.max_width or h > self.max_height:
+            scale = min(self.max_width / w, self.max_height / h)
+            w, h = max(1, int(w * scale)), max(1, int(h * scale))
+            frame = cv2.resize(frame, (w, h), interpolation=cv2.INTER_AREA)
+
+        st = self.state[cam]
+        busy = (st[LATEST], st[READING])
+        slot = next(s for s in range(self.slots) if s not in busy)
+
+        np.copyto(self.frames[cam, slot, :h * w * 3].reshape(h, w, 3), frame)
+        seq = int(st[SEQ]) + 1
+        self.slot_ts[cam, slot] = ts
+        self.slot_shape[cam, slot] = (h, w)
+        self.slot_seq[cam, slot] = seq
+        # публикация — последней записью
+        st[LATEST] = slot
+        st[SEQ] = seq
+
+    # ---------- читающий (инференс) ----------
+
+    def read(self, cam: int, after_seq: int):
+        """
+        Последний кадр новее after_seq: (seq, ts, frame) или None.
+        frame — view на слот, валиден до следующего read() этой камеры.
+        """
+        st = self.state[cam]
+        st[READER_BEAT] = _now_ms()
+        while True:
+            slot = int(st[LATEST])
+            if slot < 0 or self.slot_seq[cam, slot] <= after_seq:
+                return None
+            st[READING] = slot
+            # декодер мог успеть опубликовать следующий кадр и взять этот слот
+            # до того, как мы его заняли — тогда берём новый последний
+            if st[LATEST] == slot:
+                break
+
+        h, w = self.slot_shape[cam, slot]
+        frame = self.frames[cam, slot, :h * w * 3].reshape(h, w, 3)
+        return int(self.slot_seq[cam, slot]), float(self.slot_ts[cam, slot]), frame
+
+    # ---------- супервизор ----------
+
+    def reset_reader(self, cam: int) -> None:
+        """Читатель камеры перезапускается: освобождаем его слот и пульс."""
+        self.state[cam, READING] = -1
+        self.state[cam, READER_BEAT] = 0
+
+    def reset_decoder(self, cam: int) -> None:
+        self.state[cam, DECODER_BEAT] = 0
+        self.state[cam, CONNECTED] = 0
+
+    def _age(self, cam: int, field: int):
+        beat = int(self.state[cam, field])
+        return (_now_ms() - beat) / 1000 if beat else None
+
+    def decoder_age(self, cam: int):
+        """Секунды с последнего пульса декодера, None — пульса ещё не было."""
+        return self._age(cam, DECODER_BEAT)
+
+    def reader_age(self, cam: int):
+        return self._age(cam, READER_BEAT)
+
+
+class BusGrabber(FrameGrabber):
+    """FrameGrabber процесса-декодера: свежие кадры сразу пишутся в FrameBus."""
+
+    def __init__(self, bus: FrameBus, index: int, stream_url: str, target_fps: int, **kwargs):
+        super().__init__(stream_url, target_fps, **kwargs)
+        self.bus = bus
+        self.index = index
+
+    def _publish(self, ts: float, frame):
+        self.bus.write(self.index, ts, frame)
+
+    def _alive(self):
+        # пульс из самого потока чтения: завис grab() — супервизор перезапустит декодер
+        self.bus.state[self.index, DECODER_BEAT] = _now_ms()
+
+    def beat(self) -> None:
+        """Счётчики декодера в общую память (из главного потока процесса)."""
+        st = self.bus.state[self.index]
+        st[DECODED] = self.decoded
+        st[RECONNECTS] = self.reconnects
+        st[CONNECTED] = 1 if self.connected else 0
+
+
+class BusSource:
+    """
+    Камера из FrameBus с интерфейсом FrameGrabber (latest, stats, stop)
+    для run_on_cameras в процессе инференса. Кадр — view в общей памяти,
+    валиден до следующего latest(): всё, что живёт дольше тика (emit,
+    клипы), копирует или уменьшает его сразу.
+    """
+
+    def __init__(self, bus: FrameBus, index: int):
+        self.bus = bus
+        self.index = index
+        self._seq = 0
+        self._ts = None
+        self.consumed = 0
+
+    def _field(self, name: int) -> int:
+        return int(self.bus.state[self.index, name])
+
+    @property
+    def decoded(self) -> int:
+        return self._field(DECODED)
+
+    @property
+    def dropped(self) -> int:
+        return max(0, self.decoded - self.consumed)
+
+    @property
+    def reconnects(self) -> int:
+        return self._field(RECONNECTS)
+
+    @property
+    def connected(self) -> bool:
+        return bool(self._field(CONNECTED))
+
+    def latest(self):
+        item = self.bus.read(self.index, self._seq)
+        if item is None:
+            return None
+        self._seq, self._ts, frame = item
+        self.consumed += 1
+        return self._ts, frame
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.connected,
+            "decoded": self.decoded,
+            "dropped": self.dropped,
+            "reconnects": self.reconnects,
+            "frame_age": time.monotonic() - self._ts if self._ts is not None else None,
+        }
+
+    def stop(self):
+        self.bus.state[self.index, READING] = -1
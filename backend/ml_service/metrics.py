@@ -0,0 +1,106 @@
+from prometheus_client import Histogram, start_http_server
+from prometheus_client.core import REGISTRY, CounterMetricFamily, GaugeMetricFamily
+
+from profiling import BaseTimer
+
+STAGE_SECONDS = Histogram(
+    "ml_stage_seconds",
+    "Время стадий конвейера ML-воркера",
+    ["camera", "stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+
+class MetricsTimer(BaseTimer):
+    """
+    Таймер стадий в гистограмму Prometheus. Дочерние серии с метками
+    кэшируются, так что на горячем пути остаётся один observe().
+    """
+
+    def __init__(self, camera: str):
+        self.camera = camera
+        self._children = {}
+
+    def observe(self, stage: str, seconds: float):
+        child = self._children.get(stage)
+        if child is None:
+            child = self._children[stage] = STAGE_SECONDS.labels(self.camera, stage)
+        child.observe(seconds)
+
+
+class WorkerCollector:
+    """
+    Счётчики и gauge читаются из уже существующих атрибутов граберов,
+    конвейеров и диспетчера в момент scrape — горячий цикл ничего не платит.
+    """
+
+    def __init__(self, cameras: list, dispatcher, clips=None):
+        self.cameras = cameras  # [(grabber, pipeline), ...]
+        self.dispatcher = dispatcher
+        self.clips = clips
+
+    def collect(self):
+        decoded = CounterMetricFamily("ml_frames_decoded", "Декодированные кадры", labels=["camera"])
+        skipped = CounterMetricFamily(
+            "ml_frames_skipped", "Декодированные, но не попавшие в инференс кадры", labels=["camera"]
+        )
+        inferred = CounterMetricFamily("ml_frames_inferred", "Кадры, прошедшие инференс", labels=["camera"])
+        idle = CounterMetricFamily(
+            "ml_frames_idle", "Кадры без движения, обработанные без детектора", labels=["camera"]
+        )
+        reconnects = CounterMetricFamily("ml_stream_reconnects", "Переподключения к потоку", labels=["camera"])
+        connected = GaugeMetricFamily("ml_stream_connected", "Поток открыт", labels=["camera"])
+        tracked = GaugeMetricFamily("ml_tracked_objects", "Размер tracked_objects", labels=["camera"])
+        evicted = CounterMetricFamily(
+            "ml_tracked_objects_evicted", "Вытесненные из tracked_objects предметы", labels=["camera", "reason"]
+        )
+        fps = GaugeMetricFamily("ml_effective_fps", "Фактический FPS обработки", labels=["camera"])
+        screened = CounterMetricFamily(
+            "ml_cascade_screened", "Кадры, прошедшие первую ступень каскада", labels=["camera"]
+        )
+        escalated = CounterMetricFamily(
+            "ml_cascade_escalated", "Кадры, отправленные каскадом в полный детектор", labels=["camera", "reason"]
+        )
+
+        for grabber, pipeline in self.cameras:
+            cam = [pipeline.camera_id]
+            decoded.add_metric(cam, grabber.decoded)
+            skipped.add_metric(cam, grabber.dropped)
+            reconnects.add_metric(cam, grabber.reconnects)
+            connected.add_metric(cam, 1 if grabber.connected else 0)
+            inferred.add_metric(cam, pipeline.frames_processed)
+            idle.add_metric(cam, pipeline.frames_idle)
+            store = pipeline.tracked_objects
+            tracked.add_metric(cam, len(store))
+            evicted.add_metric(cam + ["ttl"], store.evicted_ttl)
+            evicted.add_metric(cam + ["lru"], store.evicted_lru)
+            fps.add_metric(cam, pipeline.effective_fps)
+            if pipeline.cascade is not None:
+                screened.add_metric(cam, pipeline.cascade.screened)
+                for reason, n in pipeline.cascade.reasons.items():
+                    escalated.add_metric(cam + [reason], n)
+
+        yield from (decoded, skipped, inferred, idle, reconnects, connected, tracked, evicted, fps, screened, escalated)
+
+        d = self.dispatcher
+        yield CounterMetricFamily("ml_events_sent", "Доставленные события", value=d.sent)
+        yield CounterMetricFamily("ml_events_failed", "Неудачные отправки событий", value=d.failed)
+        yield GaugeMetricFamily("ml_event_queue_depth", "События в очереди доставки", value=d.queue_depth)
+        yield GaugeMetricFamily("ml_event_journal_pending", "События в журнале на диске", value=d.journal_pending)
+
+        if self.clips is not None:
+            c = self.clips
+            ring_bytes = GaugeMetricFamily("ml_clip_buffer_bytes", "Память буфера кадров для клипов", labels=["camera"])
+            for camera_id, ring in list(c.rings.items()):
+                ring_bytes.add_metric([camera_id], ring.nbytes)
+            yield ring_bytes
+            yield CounterMetricFamily("ml_clips_uploaded", "Загруженные клипы", value=c.uploaded)
+            yield CounterMetricFamily("ml_clips_failed", "Клипы, которые не удалось собрать или загрузить", value=c.failed)
+            yield CounterMetricFamily("ml_clip_frames_dropped", "Кадры, не попавшие в буфер клипов", value=c.frames_dropped)
+            yield GaugeMetricFamily("ml_clips_spooled", "Клипы на диске, ждущие записи своего события", value=c.spooled)
+
+
+def start_metrics_server(port: int, cameras: list, dispatcher, clips=None):
+    REGISTRY.register(WorkerCollector(cameras, dispatcher, clips))
+    start_http_server(port)
+    print(f"[INFO] Метрики Prometheus: http://0.0.0.0:{port}/metrics")
@@ -1,362 +1,226 @@
 import os
-
+import signal
+import sys
 import time
-import base64
-from dotenv import load_dotenv
-from datetime import datetime, timezone
-
-import cv2
-import numpy as np
-import requests
-from ultralytics import YOLO
-
-load_dotenv()
 
-RTSP_URL = os.getenv(
-    "RTSP_URL",
+from config import (
+    MODEL_PATH,
+    PERSON_CLASS,
+    LEFT_OBJECT_CLASSES,
+    OBJ_CONF_THR,
+    TARGET_FPS,
+    STATS_INTERVAL,
+    CASCADE_MODEL_PATH,
+    CASCADE_IMGSZ,
+    CLIPS_ENABLED,
+    EVENT_JOURNAL_DIR,
+    METRICS_PORT,
+    ML_WORKERS,
 )
-BACKEND_URL = os.getenv(
-    "BACKEND_URL",
-)
-MODEL_PATH = os.getenv(
-    "MODEL_PATH",
-)
-
-PERSON_CLASS = 0
-
-LEFT_OBJECT_CLASSES = set([x for x in range(80) if x not in [0, 2, 3, 4, 5, 6, 7]])
-
-MAX_COORD_DIST = 40
-
-APPEAR_WINDOW = 12
-MIN_INITIAL_IOU = 0.05
-LEFT_SECONDS = 4
-
-OBJ_CONF_THR = 0.4
-MIN_OBJ_AREA_FRAC = 0.0005
-MAX_OBJ_AREA_FRAC = 0.2
-
-TARGET_FPS = 10
-BRIGHTEN = False
-
-def frame_to_base64(frame, quality=60):
-    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
-    ok, buffer = cv2.imencode(".jpg", frame, encode_param)
-    if not ok:
-        raise RuntimeError("Не удалось закодировать кадр в JPEG")
-    return base64.b64encode(buffer).decode("utf-8")
-
-def send_event(frame: np.ndarray, bbox, owner_id=None, object_id=None):
-    x1, y1, x2, y2 = bbox
-    timestamp = datetime.now(timezone.utc).isoformat()
-
-    payload = {
-        "timestamp": timestamp,
-        "owner_id": int(owner_id) if owner_id is not None else None,
-        "object_id": int(object_id) if object_id is not None else None,
-        "bbox": [float(x1), float(y1), float(x2), float(y2)],
-        "frame_snapshot_base64": frame_to_base64(frame),
-    }
-
-    try:
-        resp = requests.post(BACKEND_URL, json=payload, timeout=5)
-        resp.raise_for_status()
-        print("[OK] Event sent:", resp.json())
-    except Exception as e:
-        print("[ERR] Failed to send event:", e)
-
-
-def bbox_center(xyxy):
-    x1, y1, x2, y2 = xyxy
-    return (0.5 * (x1 + x2), 0.5 * (y1 + y2))
-
-
-def iou(boxA, boxB):
-    xA = max(boxA[0], boxB[0])
-    yA = max(boxA[1], boxB[1])
-    xB = min(boxA[2], boxB[2])
-    yB = min(boxA[3], boxB[3])
-    inter = max(0, xB - xA) * max(0, yB - yA)
-    areaA = (boxA[2] - boxA[0]) * (boxA[3] - boxA[1])
-    areaB = (boxB[2] - boxB[0]) * (boxB[3] - boxB[1])
-    union = areaA + areaB - inter
-    return inter / union if union > 0 else 0
-
-
-def brighten_frame(frame, factor=1.35):
-    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV).astype(float)
-    hsv[:, :, 2] = np.clip(hsv[:, :, 2] * factor, 0, 255)
-    hsv = hsv.astype(np.uint8)
-    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
-
-
-class TrackedObject:
-    def __init__(self, tid, bbox, class_id, frame_idx):
-        self.tid = tid
-        self.bbox = bbox
-        self.class_id = class_id
-
-        self.appeared_frame = frame_idx
-        self.last_seen_frame = frame_idx
-
-        self.owner_id = None
-        self.last_owner_frame = None
-
-        self.last_person_near_frame = None
-
-        self.flagged_left = False
-
-
-def run_on_stream(
-    stream_url: str,
+from cameras import CameraConfig, load_cameras
+from capture import FrameGrabber
+from checkpoint import Checkpointer
+from clips import ClipRecorder
+from delivery import EventDispatcher
+from detection import detect_views
+from metrics import MetricsTimer, start_metrics_server
+from pipeline import CameraPipeline
+from runtime import load_model
+from supervisor import Supervisor
+
+
+def run_on_cameras(
+    camera_configs: list,
     model_path: str = MODEL_PATH,
     target_fps: int = TARGET_FPS,
-    brighten: bool = BRIGHTEN,
+    sources: list = None,
+    journal_dir: str = EVENT_JOURNAL_DIR,
+    metrics_port: int = METRICS_PORT,
 ):
-    print(f"[INFO] Loading YOLO model: {model_path}")
-    model = YOLO(model_path)
-
-    print(f"[INFO] Connecting to stream: {stream_url}")
-    cap = cv2.VideoCapture(stream_url, cv2.CAP_FFMPEG)
-    if not cap.isOpened():
-        print("[ERR] Не удалось открыть поток")
-        return
-
-    orig_fps = cap.get(cv2.CAP_PROP_FPS)
-    if orig_fps and orig_fps > 0 and target_fps:
-        ratio = orig_fps / target_fps
-    else:
-        ratio = 1
-    frame_step = max(1, int(ratio))
-
-    tracked_objects: dict = {}
-    frame_idx = 0
-    start_time = time.time()
-
-    track_classes = list(LEFT_OBJECT_CLASSES | {PERSON_CLASS})
-
-    threshold_frames = int(LEFT_SECONDS * target_fps)
-
-    while True:
-        ret = cap.grab()
-        if not ret:
-            print("[WARN] Кадр не прочитан, ждём...")
-            time.sleep(0.05)
-            continue
-
-        if frame_idx % frame_step != 0:
-            frame_idx += 1
-            continue
-
-        ret, frame = cap.retrieve()
-        if not ret:
-            print("[WARN] Не удалось получить кадр после grab()")
-            time.sleep(0.05)
-            frame_idx += 1
-            continue
-
-        if brighten:
-            frame = brighten_frame(frame, factor=1.4)
-
-        frame_h, frame_w = frame.shape[:2]
-        frame_area = frame_h * frame_w
-
-        results = model.track(
-            frame,
-            persist=True,
-            tracker="botsort.yaml",
-            verbose=False,
-            conf=OBJ_CONF_THR,
-            classes=track_classes,
-        )
-
-        if not results:
-            frame_idx += 1
-            continue
-
-        result = results[0]
-        rboxes = getattr(result, "boxes", None)
-        if rboxes is None:
-            frame_idx += 1
-            continue
-
-        xyxy_t = getattr(rboxes, "xyxy", None)
-        cls_t = getattr(rboxes, "cls", None)
-        ids_t = getattr(rboxes, "id", None)
-        conf_t = getattr(rboxes, "conf", None)
-
-        if xyxy_t is None or cls_t is None:
-            frame_idx += 1
-            continue
-
-        xyxy_np = xyxy_t.cpu().numpy().astype(float)
-        cls_np = cls_t.cpu().numpy().astype(int)
-
-        if conf_t is not None:
-            conf_np = conf_t.cpu().numpy().astype(float)
-        else:
-            conf_np = np.ones(len(xyxy_np), dtype=float)
-
-        if ids_t is not None:
-            ids_np = ids_t.cpu().numpy()
-            ids_np = [-1 if v is None else int(v) for v in ids_np]
+    """
+    Несколько камер в одном процессе: одна модель на всех,
+    один батчевый вызов детектора на тик, у каждой камеры свой трекер и состояние.
+    Кадры читаются в отдельных потоках, в инференс идёт только самый свежий.
+    sources — готовые источники кадров по камерам (BusSource в процессе
+    инференса под supervisor.py); по умолчанию — свой FrameGrabber на камеру.
+    """
+    # рантайм, INT8 и потоки — из INFERENCE_*; прогрев до старта граберов
+    model = load_model(model_path, warmup_batch=len(camera_configs))
+    # первая ступень каскада: маленькая модель на уменьшенном входе
+    cheap_model = None
+    if CASCADE_MODEL_PATH:
+        cheap_model = load_model(CASCADE_MODEL_PATH, imgsz=CASCADE_IMGSZ, warmup_batch=len(camera_configs))
+
+    shared_timer = MetricsTimer("all")
+
+    dispatcher = EventDispatcher(journal_dir=journal_dir, timer=shared_timer)
+    dispatcher.start()
+
+    clips = None
+    if CLIPS_ENABLED:
+        clips = ClipRecorder(spool_dir=os.path.join(journal_dir, "clips"), timer=shared_timer)
+        clips.start()
+
+    cameras = []
+    for i, cam in enumerate(camera_configs):
+        timer = MetricsTimer(cam.id)
+        if sources is not None:
+            grabber = sources[i]
         else:
-            ids_np = [-1] * len(xyxy_np)
+            print(f"[INFO] Connecting to stream: {cam.url} ({cam.id})")
+            grabber = FrameGrabber(cam.url, target_fps, timer=timer)
+            grabber.start()
+        pipeline = CameraPipeline(
+            cam.id,
+            target_fps,
+            tracker_cfg=cam.tracker,
+            preprocess=cam.preprocess,
+            motion=cam.motion,
+            roi=cam.roi,
+            tiles=cam.tiles,
+            cascade=cam.cascade if cheap_model is not None else {"enabled": False},
+            timer=timer,
+        )
+        cameras.append((grabber, pipeline))
 
-        persons = []
-        objects = []
+    pipelines = [pipeline for _, pipeline in cameras]
+    # состояние трекинга с прошлого запуска, если оно свежее
+    checkpointer = Checkpointer()
+    checkpointer.restore_all(pipelines)
+    checkpointer.start()
 
-        for i in range(len(xyxy_np)):
-            xy = tuple(xyxy_np[i].tolist())
-            class_id = cls_np[i]
-            tid = ids_np[i]
-            conf = float(conf_np[i])
+    if metrics_port:
+        start_metrics_server(metrics_port, cameras, dispatcher, clips)
 
-            if conf < OBJ_CONF_THR:
-                continue
+    last_stats = time.monotonic()
 
-            box_area = (xy[2] - xy[0]) * (xy[3] - xy[1])
-            area_frac = box_area / frame_area
+    track_classes = list(LEFT_OBJECT_CLASSES | {PERSON_CLASS})
 
-            if class_id == PERSON_CLASS:
-                persons.append({"tid": tid, "bbox": xy, "center": bbox_center(xy)})
-            elif class_id in LEFT_OBJECT_CLASSES:
-                if not (MIN_OBJ_AREA_FRAC <= area_frac <= MAX_OBJ_AREA_FRAC):
-                    continue
-                objects.append({"tid": tid, "bbox": xy, "class": class_id})
+    tick_interval = 1.0 / target_fps
+    next_tick = time.monotonic()
 
-        def find_existing_object(bbox, class_id):
-            c = bbox_center(bbox)
-            best_tid = None
-            best_dist = 10**9
-            for tid_, obj in tracked_objects.items():
-                if obj.class_id != class_id:
+    try:
+        while True:
+            screen = []
+            batch = []
+            for grabber, pipeline in cameras:
+                item = grabber.latest()
+                if item is None:
                     continue
-                prev_c = bbox_center(obj.bbox)
-                d = np.linalg.norm(np.array(c) - np.array(prev_c))
-                if d < MAX_COORD_DIST and d < best_dist:
-                    best_dist = d
-                    best_tid = tid_
-            return best_tid
-
-        now = frame_idx
-
-        # обновляем/создаём объекты
-        for obj in objects:
-            raw_tid = obj["tid"]
-            bbox = obj["bbox"]
-            class_id = obj["class"]
-
-            if raw_tid != -1 and raw_tid in tracked_objects:
-                tobj = tracked_objects[raw_tid]
-                tobj.bbox = bbox
-                tobj.last_seen_frame = now
-                continue
-
-            match_tid = find_existing_object(bbox, class_id)
-            if match_tid is not None:
-                tobj = tracked_objects[match_tid]
-                tobj.bbox = bbox
-                tobj.last_seen_frame = now
-                continue
-
-            new_tid = raw_tid if raw_tid != -1 else f"ghost_{now}_{hash(bbox)}"
-            tracked_objects[new_tid] = TrackedObject(new_tid, bbox, class_id, now)
-
-        # обновляем last_person_near_frame
-        for p in persons:
-            for tid_, obj in tracked_objects.items():
-                if obj.flagged_left:
+                ts, frame = item
+                if clips is not None:
+                    # push сразу уменьшает кадр, исходный не удерживается
+                    clips.push(pipeline.camera_id, ts, frame)
+                if not pipeline.needs_inference(frame, ts):
+                    # статичная сцена: детектор не нужен, таймеры идут дальше
+                    left_events = pipeline.process_idle(ts)
+                    if left_events:
+                        pipeline.emit(pipeline.preprocess(frame), left_events, dispatcher, clips)
                     continue
-                i = iou(p["bbox"], obj.bbox)
-                if i > 0.05:
-                    obj.last_person_near_frame = now
-
-        # обновляем owner_id и last_owner_frame
-        for tid_, obj in tracked_objects.items():
-            if obj.flagged_left:
-                continue
-
-            best_iou = 0.0
-            best_person_id = None
-            for p in persons:
-                i = iou(p["bbox"], obj.bbox)
-                if i > best_iou:
-                    best_iou = i
-                    best_person_id = p["tid"]
-
-            if obj.owner_id is None:
-                if best_iou > MIN_INITIAL_IOU and abs(obj.appeared_frame - now) <= APPEAR_WINDOW:
-                    # владелец — конкретный трек персоны (int), если есть
-                    obj.owner_id = best_person_id if best_person_id != -1 else None
-                    obj.last_owner_frame = now
-
-                elif obj.last_person_near_frame is not None:
-                    if now - obj.last_person_near_frame <= APPEAR_WINDOW:
-                        # неизвестный владелец, но явно был рядом человек недавно
-                        obj.owner_id = -1  # спец-значение "unknown"
-                        obj.last_owner_frame = now
-            else:
-                if best_iou > 0.05:
-                    obj.last_owner_frame = now
-
-        current_time = time.time()
-
-        left_events = []
-
-        for tid_, obj in list(tracked_objects.items()):
-            if obj.flagged_left:
-                continue
-            if obj.owner_id is None:
-                continue
-            if obj.last_owner_frame is None:
-                continue
-
-            no_owner_for = now - obj.last_owner_frame
-            not_seen_for = now - obj.last_seen_frame
-
-            if no_owner_for > threshold_frames and not_seen_for <= threshold_frames:
-                obj.flagged_left = True
-                left_events.append(obj)
-
-            if not_seen_for > 5 * threshold_frames:
-                del tracked_objects[tid_]
-
-        # отправляем события сразу
-        if left_events:
-            rendered = frame.copy()
-            for obj in left_events:
-                x1, y1, x2, y2 = map(int, obj.bbox)
-                cv2.rectangle(rendered, (x1, y1), (x2, y2), (0, 0, 255), 3)
-                cv2.putText(
-                    rendered,
-                    f"LEFT {obj.class_id}",
-                    (x1, max(0, y1 - 10)),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    1.0,
-                    (0, 0, 255),
-                    2,
-                )
-
+                frame = pipeline.preprocess(frame)
+                if pipeline.cascade is not None:
+                    screen.append((pipeline, ts, frame))
+                else:
+                    batch.append((pipeline, ts, frame, pipeline.views(frame)))
+
+            if screen:
+                # первая ступень каскада для всех камер — тоже одним вызовом
+                views = [pipeline.screen_views(frame) for pipeline, _, frame in screen]
+                with shared_timer.stage("screen"):
+                    per_camera = detect_views(
+                        cheap_model,
+                        [images for images, _ in views],
+                        conf=min(pipeline.cascade.conf for pipeline, _, _ in screen),
+                        classes=track_classes,
+                        imgsz=CASCADE_IMGSZ,
+                    )
+
+                for (pipeline, ts, frame), (_, offsets), view_dets in zip(screen, views, per_camera):
+                    full_views = pipeline.screen(frame, pipeline.merge(frame, offsets, view_dets), ts)
+                    if full_views is not None:
+                        batch.append((pipeline, ts, frame, full_views))
+                        continue
+                    left_events = pipeline.process_idle(ts)
+                    if left_events:
+                        pipeline.emit(frame, left_events, dispatcher, clips)
+
+            if batch:
+                # кропы ROI и тайлы всех камер — одним вызовом детектора
+                with shared_timer.stage("inference"):
+                    per_camera = detect_views(
+                        model,
+                        [images for _, _, _, (images, _) in batch],
+                        conf=OBJ_CONF_THR,
+                        classes=track_classes,
+                    )
+
+                for (pipeline, ts, frame, (_, offsets)), view_dets in zip(batch, per_camera):
+                    dets = pipeline.merge(frame, offsets, view_dets)
+                    left_events = pipeline.process(frame, dets, ts)
+
+                    # события уходят в фоновую доставку, цикл не ждёт сеть
+                    if left_events:
+                        pipeline.emit(frame, left_events, dispatcher, clips)
+
+            checkpointer.maybe_capture(pipelines)
+
+            mono = time.monotonic()
+            if mono - last_stats >= STATS_INTERVAL:
+                last_stats = mono
+                for grabber, pipeline in cameras:
+                    s = grabber.stats()
+                    age = f"{s['frame_age']:.2f}s" if s["frame_age"] is not None else "-"
+                    print(
+                        f"[STATS] {pipeline.camera_id}: connected={s['connected']} "
+                        f"decoded={s['decoded']} dropped={s['dropped']} "
+                        f"inferred={pipeline.frames_processed} idle={pipeline.frames_idle} "
+                        f"tracked={len(pipeline.tracked_objects)} "
+                        f"reconnects={s['reconnects']} frame_age={age}"
+                    )
+                    c = pipeline.cascade
+                    if c is not None:
+                        print(
+                            f"[STATS] {pipeline.camera_id}: cascade screened={c.screened} "
+                            f"full={c.escalated} ({c.escalated_share:.0%}) cropped={c.cropped} "
+                            f"reasons={c.reasons}"
+                        )
                 print(
-                    f"[LEFT] t={current_time - start_time:.1f}s "
-                    f"frame={now} tid={obj.tid} class={obj.class_id}"
+                    f"[STATS] events: sent={dispatcher.sent} failed={dispatcher.failed} "
+                    f"queue={dispatcher.queue_depth} journal={dispatcher.journal_pending}"
                 )
 
-                send_event(
-                    frame=rendered,
-                    bbox=obj.bbox,
-                    owner_id=obj.owner_id,
-                    object_id=obj.class_id,
-                )
+            # не чаще target_fps; если отстаём — сразу следующий тик
+            next_tick += tick_interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()
+    finally:
+        for grabber, _ in cameras:
+            grabber.stop()
+        checkpointer.stop(pipelines)
+        if clips is not None:
+            clips.stop()
+        dispatcher.stop()
 
-        frame_idx += 1
 
-    cap.release()
+def run_on_stream(
+    stream_url: str,
+    model_path: str = MODEL_PATH,
+    target_fps: int = TARGET_FPS,
+    preprocess: dict = None,
+):
+    run_on_cameras([CameraConfig(id="cam0", url=stream_url, preprocess=preprocess or {})], model_path, target_fps)
 
 
 def main():
-    run_on_stream(RTSP_URL, MODEL_PATH, TARGET_FPS, BRIGHTEN)
+    # docker stop шлёт SIGTERM: выходим через finally, чтобы записать чекпоинт и журнал
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    if ML_WORKERS:
+        Supervisor(load_cameras(), ML_WORKERS, MODEL_PATH, TARGET_FPS).run()
+    else:
+        run_on_cameras(load_cameras(), MODEL_PATH, TARGET_FPS)
 
 
 if __name__ == "__main__":
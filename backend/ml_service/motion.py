@@ -0,0 +1,100 @@
+import cv2
+import numpy as np
+
+from config import MOTION_WIDTH, MOTION_PIXEL_THR, MOTION_MIN_AREA, MOTION_FORCE_SECONDS
+
+
+class MotionGate:
+    """
+    Дешёвая проверка "изменилось ли что-то в кадре" перед детектором.
+
+    Кадр уменьшается до width по ширине, переводится в серый и размывается;
+    сравнивается с опорным кадром — последним, на котором запускался
+    детектор (а не с предыдущим, чтобы медленные изменения тоже накапливались).
+    Движение есть, если доля пикселей с разницей больше pixel_thr превышает
+    min_area. Не реже чем раз в force_seconds детектор запускается принудительно.
+    """
+
+    def __init__(
+        self,
+        width: int = MOTION_WIDTH,
+        pixel_thr: int = MOTION_PIXEL_THR,
+        min_area: float = MOTION_MIN_AREA,
+        force_seconds: float = MOTION_FORCE_SECONDS,
+    ):
+        self.width = width
+        self.pixel_thr = pixel_thr
+        self.min_area = min_area
+        self.force_seconds = force_seconds
+
+        self._shape = None
+        self._small = None
+        self._gray = None
+        self._ref = None
+        self._diff = None
+        self._last_infer_ts = None
+
+        self.motion_frames = 0
+        self.idle_frames = 0
+
+    @classmethod
+    def from_config(cls, cfg: dict):
+        return cls(
+            width=cfg.get("width", MOTION_WIDTH),
+            pixel_thr=cfg.get("pixel_thr", MOTION_PIXEL_THR),
+            min_area=cfg.get("min_area", MOTION_MIN_AREA),
+            force_seconds=cfg.get("force_seconds", MOTION_FORCE_SECONDS),
+        )
+
+    def _alloc(self, shape):
+        h, w = shape[:2]
+        sw = min(self.width, w)
+        sh = max(1, int(round(h * sw / w)))
+        self._small = np.empty((sh, sw, 3), dtype=np.uint8)
+        self._gray = np.empty((sh, sw), dtype=np.uint8)
+        self._ref = np.empty((sh, sw), dtype=np.uint8)
+        self._diff = np.empty((sh, sw), dtype=np.uint8)
+        self._shape = shape
+        self._last_infer_ts = None
+
+    def check(self, frame: np.ndarray, ts: float) -> bool:
+        """True — кадр нужно прогнать через детектор, False — сцена не изменилась."""
+        if frame.shape != self._shape:
+            self._alloc(frame.shape)
+
+        sh, sw = self._gray.shape
+        cv2.resize(frame, (sw, sh), dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        cv2.GaussianBlur(self._gray, (5, 5), 0, dst=self._gray)
+
+        if self._last_infer_ts is None or ts - self._last_infer_ts >= self.force_seconds:
+            moved = True
+        else:
+            cv2.absdiff(self._gray, self._ref, dst=self._diff)
+            cv2.threshold(self._diff, self.pixel_thr, 255, cv2.THRESH_BINARY, dst=self._diff)
+            moved = cv2.countNonZero(self._diff) > self.min_area * self._diff.size
+
+        if moved:
+            self._gray, self._ref = self._ref, self._gray
+            self._last_infer_ts = ts
+            self.motion_frames += 1
+        else:
+            self.idle_frames += 1
+        return moved
+
+
+class AlwaysOn:
+    """Гейт выключен: детектор на каждом кадре."""
+
+    motion_frames = 0
+    idle_frames = 0
+
+    def check(self, frame: np.ndarray, ts: float) -> bool:
+        self.motion_frames += 1
+        return True
+
+
+def make_gate(cfg: dict):
+    if not cfg.get("enabled", True):
+        return AlwaysOn()
+    return MotionGate.from_config(cfg)
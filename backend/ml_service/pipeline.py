@@ -0,0 +1,231 @@
+import cv2
+import numpy as np
+
+from cascade import make_cascade
+from config import (
+    LEFT_SECONDS,
+    OBJECT_TTL_SECONDS,
+    LEFT_OBJECT_CLASSES,
+    TRACKER,
+    MOTION_GATE,
+    TILE_SIZE,
+    TILE_OVERLAP,
+    TILE_MIN_WIDTH,
+    TILE_NMS_IOU,
+)
+from detection import Detections, make_tiles, merge_nms
+from motion import make_gate
+from preprocessing import Preprocessor
+from profiling import NULL_TIMER
+from roi import Roi
+from trackers import make_tracker, apply_tracker
+from tracking import ObjectStore, update_tracked_objects
+from association import split_detections, associate
+
+_LEFT_CLASSES = sorted(LEFT_OBJECT_CLASSES)
+
+
+class CameraPipeline:
+    """
+    Состояние одной камеры: свой трекер и свои tracked_objects.
+    Модель общая и живёт снаружи, сюда приходят уже готовые детекции.
+    """
+
+    def __init__(
+        self,
+        camera_id: str,
+        target_fps: int,
+        tracker_cfg: str = TRACKER,
+        preprocess: dict = None,
+        motion: dict = None,
+        roi: list = None,
+        tiles: dict = None,
+        cascade: dict = None,
+        timer=NULL_TIMER,
+    ):
+        self.camera_id = camera_id
+        self.timer = timer
+        self.target_fps = target_fps
+        self.preprocessor = Preprocessor.from_config(preprocess or {})
+        self.motion = make_gate(motion if motion is not None else {"enabled": MOTION_GATE})
+        self.roi = Roi(roi)
+        self.tiles = tiles
+        self.cascade = make_cascade(cascade)
+        self.tracker = make_tracker(tracker_cfg)
+        self.threshold_frames = int(LEFT_SECONDS * target_fps)
+        self.tracked_objects = ObjectStore(ttl=int(OBJECT_TTL_SECONDS * target_fps))
+
+        self.start_ts = None
+        self.now = 0
+
+        self.frames_processed = 0
+        self.frames_idle = 0
+        self.effective_fps = 0.0
+        self._last_ts = None
+        # детекции последнего кадра, прошедшего детектор (после трекера)
+        self.last_tracked = None
+        self._last_split = None
+
+    def tick(self, ts: float) -> int:
+        """
+        Номер тика по времени захвата кадра: все счётчики в кадрах
+        (APPEAR_WINDOW, LEFT_SECONDS * fps) считаются в тиках target_fps,
+        независимо от того, сколько кадров реально успели обработать.
+        """
+        if self.start_ts is None:
+            self.start_ts = ts
+        return int(round((ts - self.start_ts) * self.target_fps))
+
+    def preprocess(self, frame: np.ndarray) -> np.ndarray:
+        """Предобработка кадра по настройкам камеры (результат валиден до следующего кадра)."""
+        if not self.preprocessor.enabled:
+            return frame
+        with self.timer.stage("preprocess"):
+            return self.preprocessor(frame)
+
+    def needs_inference(self, frame: np.ndarray, ts: float) -> bool:
+        """Есть ли в кадре изменения, ради которых стоит запускать детектор."""
+        with self.timer.stage("motion"):
+            moved = self.motion.check(self.roi.crop(frame), ts)
+        return moved or self._last_split is None
+
+    def screen_views(self, frame: np.ndarray) -> tuple:
+        """Изображение для первой ступени каскада: кроп ROI без тайлов."""
+        x0, y0, _, _ = self.roi.rect(frame.shape)
+        return [self.roi.crop(frame)], [(x0, y0)]
+
+    def screen(self, frame: np.ndarray, cheap: Detections, ts: float):
+        """
+        Решение каскада по детекциям первой ступени: None — полный детектор
+        не нужен (кадр идёт в process_idle), иначе views() для него.
+        """
+        rect = self.cascade.plan(self, frame.shape, cheap, ts)
+        return None if rect is None else self.views(frame, rect)
+
+    def views(self, frame: np.ndarray, rect: tuple = None) -> tuple:
+        """
+        Изображения для детектора и их смещения (dx, dy) в кадре:
+        кроп ROI (или rect от каскада) целиком, а для широких кадров в режиме
+        тайлов — ещё и перекрывающиеся тайлы этого кропа.
+        """
+        x0, y0, x1, y1 = rect or self.roi.rect(frame.shape)
+        region = frame[y0:y1, x0:x1]
+        h, w = region.shape[:2]
+
+        t = self.tiles
+        if not t or w < t.get("min_width", TILE_MIN_WIDTH):
+            return [region], [(x0, y0)]
+
+        images, offsets = [], []
+        if t.get("full_frame", True):
+            # крупные объекты (человек вблизи) на тайлах режутся, их ловит общий проход
+            images.append(region)
+            offsets.append((x0, y0))
+        size = t.get("size", TILE_SIZE)
+        for tx0, ty0, tx1, ty1 in make_tiles(w, h, size, t.get("overlap", TILE_OVERLAP)):
+            images.append(region[ty0:ty1, tx0:tx1])
+            offsets.append((x0 + tx0, y0 + ty0))
+        return images, offsets
+
+    def merge(self, frame: np.ndarray, offsets: list, dets_list: list) -> Detections:
+        """Собирает детекции views() в координаты кадра и отбрасывает предметы вне ROI."""
+        dets = Detections.concat([d.shifted(dx, dy) for d, (dx, dy) in zip(dets_list, offsets)])
+        if len(offsets) > 1:
+            dets = merge_nms(dets, self.tiles.get("nms_iou", TILE_NMS_IOU))
+        if self.roi.enabled and len(dets):
+            # людей не режем: владелец может стоять за границей зоны
+            outside = ~self.roi.contains(dets.xyxy, frame.shape) & np.isin(dets.cls, _LEFT_CLASSES)
+            dets = dets[~outside]
+        return dets
+
+    def _advance(self, ts: float) -> int:
+        now = self.tick(ts)
+        self.now = now
+        if self._last_ts is not None and ts > self._last_ts:
+            inst = 1.0 / (ts - self._last_ts)
+            self.effective_fps = inst if not self.effective_fps else 0.9 * self.effective_fps + 0.1 * inst
+        self._last_ts = ts
+        return now
+
+    def process(self, frame: np.ndarray, dets: Detections, ts: float) -> list:
+        """Трекинг + ассоциация для кадра; возвращает новые LEFT-объекты."""
+        now = self._advance(ts)
+        self.frames_processed += 1
+
+        with self.timer.stage("tracking"):
+            dets = apply_tracker(self.tracker, dets, frame)
+        self.last_tracked = dets
+
+        with self.timer.stage("association"):
+            # MIN/MAX_OBJ_AREA_FRAC — доля от области, которую видит детектор
+            split = split_detections(dets.xyxy, dets.cls, dets.conf, dets.ids, self.roi.area(frame.shape))
+            self._last_split = split
+            return self._associate(split, now)
+
+    def process_idle(self, ts: float) -> list:
+        """
+        Кадр без изменений: детектор и трекер пропускаются, ассоциация идёт
+        по детекциям последнего обработанного кадра, а тики — по времени,
+        так что таймеры LEFT_SECONDS продолжают идти.
+        """
+        now = self._advance(ts)
+        self.frames_idle += 1
+        with self.timer.stage("association"):
+            return self._associate(self._last_split, now)
+
+    def _associate(self, split, now: int) -> list:
+        # обновляем/создаём объекты
+        update_tracked_objects(
+            self.tracked_objects,
+            split.object_boxes,
+            split.object_ids,
+            split.object_classes,
+            now,
+        )
+
+        # владельцы, люди рядом, оставленные предметы
+        return associate(
+            self.tracked_objects,
+            split.person_boxes,
+            split.person_ids,
+            now,
+            self.threshold_frames,
+        )
+
+    def emit(self, frame: np.ndarray, left_events: list, sink, clips=None) -> None:
+        """
+        Рисует LEFT-объекты на кадре и отдаёт события в sink (EventDispatcher
+        или заглушку). С clips (ClipRecorder) к событию заказывается клип.
+        """
+        rendered = frame.copy()
+        for obj in left_events:
+            draw_left(rendered, obj)
+
+            print(
+                f"[LEFT] t={self.now / self.target_fps:.1f}s "
+                f"cam={self.camera_id} frame={self.now} "
+                f"tid={obj.tid} class={obj.class_id}"
+            )
+
+            clip_key = clips.request(self.camera_id, self._last_ts) if clips is not None else None
+            sink.submit(
+                frame=rendered.copy(),
+                bbox=obj.bbox,
+                owner_id=obj.owner_id,
+                object_id=obj.class_id,
+                clip_key=clip_key,
+            )
+
+
+def draw_left(rendered: np.ndarray, obj) -> None:
+    x1, y1, x2, y2 = map(int, obj.bbox)
+    cv2.rectangle(rendered, (x1, y1), (x2, y2), (0, 0, 255), 3)
+    cv2.putText(
+        rendered,
+        f"LEFT {obj.class_id}",
+        (x1, max(0, y1 - 10)),
+        cv2.FONT_HERSHEY_SIMPLEX,
+        1.0,
+        (0, 0, 255),
+        2,
+    )
@@ -0,0 +1,96 @@
+import cv2
+import numpy as np
+
+
+def build_lut(gain: float = 1.0, gamma: float = 1.0) -> np.ndarray:
+    """Таблица 256 -> 256: out = clip(255 * (in / 255) ** (1 / gamma) * gain)."""
+    x = np.arange(256, dtype=np.float64) / 255.0
+    y = np.power(x, 1.0 / gamma) * gain * 255.0
+    return np.clip(np.rint(y), 0, 255).astype(np.uint8)
+
+
+class Preprocessor:
+    """
+    Предобработка кадра только в uint8: уменьшение, LUT (яркость/гамма)
+    и CLAHE по яркостному каналу. Все промежуточные буферы выделяются один раз
+    под размер кадра и переиспользуются.
+
+    Возвращаемый кадр — внутренний буфер, он валиден до следующего вызова.
+    """
+
+    def __init__(
+        self,
+        gain: float = 1.0,
+        gamma: float = 1.0,
+        clahe: bool = False,
+        clahe_clip: float = 2.0,
+        clahe_grid: int = 8,
+        max_width: int = 0,
+    ):
+        self.max_width = max_width
+        self.lut = None
+        if gain != 1.0 or gamma != 1.0:
+            self.lut = build_lut(gain, gamma)
+        self.clahe = cv2.createCLAHE(clipLimit=clahe_clip, tileGridSize=(clahe_grid, clahe_grid)) if clahe else None
+
+        self._shape = None
+        self._small = None
+        self._out = None
+        self._ycrcb = None
+        self._luma = None
+
+    @classmethod
+    def from_config(cls, cfg: dict):
+        return cls(
+            gain=cfg.get("gain", 1.0),
+            gamma=cfg.get("gamma", 1.0),
+            clahe=cfg.get("clahe", False),
+            clahe_clip=cfg.get("clahe_clip", 2.0),
+            clahe_grid=cfg.get("clahe_grid", 8),
+            max_width=cfg.get("max_width", 0),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_width or self.lut is not None or self.clahe is not None)
+
+    def _alloc(self, shape):
+        h, w = shape[:2]
+        if self.max_width and w > self.max_width:
+            h, w = int(round(h * self.max_width / w)), self.max_width
+            self._small = np.empty((h, w, 3), dtype=np.uint8)
+        else:
+            self._small = None
+        self._out = np.empty((h, w, 3), dtype=np.uint8)
+        if self.clahe is not None:
+            self._ycrcb = np.empty((h, w, 3), dtype=np.uint8)
+            self._luma = np.empty((h, w), dtype=np.uint8)
+        self._shape = shape
+
+    def __call__(self, frame: np.ndarray) -> np.ndarray:
+        if not self.enabled:
+            return frame
+        if frame.shape != self._shape:
+            self._alloc(frame.shape)
+
+        src = frame
+        if self._small is not None:
+            h, w = self._small.shape[:2]
+            cv2.resize(src, (w, h), dst=self._small, interpolation=cv2.INTER_AREA)
+            src = self._small
+
+        if self.lut is not None:
+            cv2.LUT(src, self.lut, dst=self._out)
+            src = self._out
+
+        if self.clahe is not None:
+            cv2.cvtColor(src, cv2.COLOR_BGR2YCrCb, dst=self._ycrcb)
+            cv2.extractChannel(self._ycrcb, 0, dst=self._luma)
+            self.clahe.apply(self._luma, dst=self._luma)
+            cv2.insertChannel(self._luma, self._ycrcb, 0)
+            cv2.cvtColor(self._ycrcb, cv2.COLOR_YCrCb2BGR, dst=self._out)
+            src = self._out
+
+        if src is not self._out:
+            np.copyto(self._out, src)
+        return self._out
@@ -0,0 +1,59 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class BaseTimer:
+    """Общий интерфейс замеров: stage() меряет блок и отдаёт время в observe()."""
+
+    def observe(self, stage: str, seconds: float):
+        raise NotImplementedError
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+
+class StageTimer(BaseTimer):
+    """Копит длительности стадий конвейера и считает по ним перцентили."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def observe(self, stage: str, seconds: float):
+        self.samples[stage].append(seconds)
+
+    def summary(self) -> dict:
+        out = {}
+        for stage, values in self.samples.items():
+            arr = np.asarray(values) * 1000
+            p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+            out[stage] = {
+                "count": len(arr),
+                "mean_ms": round(float(arr.mean()), 3),
+                "p50_ms": round(float(p50), 3),
+                "p95_ms": round(float(p95), 3),
+                "p99_ms": round(float(p99), 3),
+                "total_s": round(float(arr.sum()) / 1000, 3),
+            }
+        return out
+
+
+class NullTimer:
+    """Заглушка для продакшн-цикла, когда замеры не нужны."""
+
+    def observe(self, stage: str, seconds: float):
+        pass
+
+    @contextmanager
+    def stage(self, name: str):
+        yield
+
+
+NULL_TIMER = NullTimer()
@@ -0,0 +1,261 @@
+"""
+Офлайн-прогон конвейера детекции по видеофайлу.
+
+Кадры идут через те же стадии, что и в ml.py (предобработка, детектор,
+трекер, ассоциация, отрисовка события), но без RTSP и без бэкенда:
+события кодируются в JPEG и складываются в заглушку. На выходе — JSON
+с перцентилями времени по стадиям, итоговым FPS и списком событий.
+
+    python ml_service/replay.py media_server/test.mp4 --out report.json
+    python ml_service/replay.py media_server/test.mp4 --expect report.json
+
+С --expect события сравниваются с сохранённым отчётом, и при расхождении
+скрипт завершается с ненулевым кодом — так проверяем, что оптимизация
+не поменяла поведение.
+"""
+import argparse
+import json
+import sys
+import time
+
+from capture import FileSource
+from config import (
+    MODEL_PATH,
+    PERSON_CLASS,
+    LEFT_OBJECT_CLASSES,
+    OBJ_CONF_THR,
+    TARGET_FPS,
+    BRIGHTEN,
+    TRACKER,
+    INFERENCE_BACKEND,
+    INFERENCE_INT8,
+    INFERENCE_THREADS,
+    CASCADE_MODEL_PATH,
+    CASCADE_IMGSZ,
+)
+from delivery import frame_to_jpeg
+from detection import detect_views
+from pipeline import CameraPipeline
+from profiling import StageTimer
+from runtime import load_model
+
+
+class StubSink:
+    """Заглушка доставки: кодирует snapshot, как настоящий воркер, и запоминает событие."""
+
+    def __init__(self, pipeline: CameraPipeline, timer: StageTimer):
+        self.pipeline = pipeline
+        self.timer = timer
+        self.events = []
+        self.ts = 0.0
+
+    def submit(self, frame, bbox, owner_id=None, object_id=None, clip_key=None):
+        with self.timer.stage("encode"):
+            jpeg = frame_to_jpeg(frame)
+        with self.timer.stage("deliver"):
+            self.events.append({
+                "frame": self.pipeline.now,
+                "ts": round(self.ts, 3),
+                "owner_id": int(owner_id) if owner_id is not None else None,
+                "object_id": int(object_id) if object_id is not None else None,
+                "bbox": [round(float(v), 2) for v in bbox],
+                "snapshot_bytes": len(jpeg),
+            })
+
+
+def replay(
+    video: str,
+    model_path: str = MODEL_PATH,
+    target_fps: int = TARGET_FPS,
+    preprocess: dict = None,
+    tracker_cfg: str = TRACKER,
+    max_frames: int = 0,
+    motion: dict = None,
+    roi: list = None,
+    tiles: dict = None,
+    backend: str = INFERENCE_BACKEND,
+    int8: bool = INFERENCE_INT8,
+    threads: int = INFERENCE_THREADS,
+    cascade_model: str = CASCADE_MODEL_PATH,
+    cascade: dict = None,
+    on_frame=None,
+) -> dict:
+    """
+    on_frame(pipeline, inferred) вызывается после каждого кадра — для
+    внешних сборщиков статистики (например, bench_trackers.py).
+    С cascade_model перед полным детектором работает первая ступень каскада.
+    """
+    model = load_model(model_path, backend, int8, threads)
+    cheap_model = load_model(cascade_model, backend, int8, threads, imgsz=CASCADE_IMGSZ) if cascade_model else None
+    if cheap_model is None:
+        cascade = {"enabled": False}
+    elif cascade is None:
+        cascade = {}
+    source = FileSource(video, target_fps)
+    if not source.is_opened():
+        raise SystemExit(f"[ERR] Не удалось открыть видео {video}")
+
+    timer = StageTimer()
+    pipeline = CameraPipeline(
+        "replay", target_fps, tracker_cfg=tracker_cfg, preprocess=preprocess, motion=motion,
+        roi=roi, tiles=tiles, cascade=cascade, timer=timer,
+    )
+    sink = StubSink(pipeline, timer)
+
+    track_classes = list(LEFT_OBJECT_CLASSES | {PERSON_CLASS})
+
+    frames = 0
+    t0 = time.perf_counter()
+    while True:
+        with timer.stage("decode"):
+            item = source.read()
+        if item is None:
+            break
+        ts, frame = item
+
+        moved = pipeline.needs_inference(frame, ts)
+        views = None
+        if moved:
+            frame = pipeline.preprocess(frame)
+            if pipeline.cascade is None:
+                views = pipeline.views(frame)
+            else:
+                images, offsets = pipeline.screen_views(frame)
+                with timer.stage("screen"):
+                    cheap = detect_views(
+                        cheap_model, [images], conf=pipeline.cascade.conf, classes=track_classes, imgsz=CASCADE_IMGSZ,
+                    )[0]
+                views = pipeline.screen(frame, pipeline.merge(frame, offsets, cheap), ts)
+        if views is not None:
+            images, offsets = views
+            with timer.stage("inference"):
+                view_dets = detect_views(model, [images], conf=OBJ_CONF_THR, classes=track_classes)[0]
+            dets = pipeline.merge(frame, offsets, view_dets)
+            left_events = pipeline.process(frame, dets, ts)
+        else:
+            left_events = pipeline.process_idle(ts)
+            if left_events and not moved:
+                frame = pipeline.preprocess(frame)
+        if left_events:
+            sink.ts = ts
+            pipeline.emit(frame, left_events, sink)
+        if on_frame is not None:
+            on_frame(pipeline, views is not None)
+
+        frames += 1
+        if max_frames and frames >= max_frames:
+            break
+    wall = time.perf_counter() - t0
+    source.release()
+
+    return {
+        "video": video,
+        "model": model_path,
+        "backend": backend,
+        "int8": int8,
+        "threads": threads,
+        "target_fps": target_fps,
+        "tracker": tracker_cfg,
+        "preprocess": preprocess or {},
+        "roi": roi,
+        "tiles": tiles,
+        "frames": frames,
+        "idle_frames": pipeline.frames_idle,
+        "cascade": _cascade_stats(pipeline.cascade),
+        "wall_s": round(wall, 3),
+        "fps": round(frames / wall, 2) if wall > 0 else None,
+        "stages": timer.summary(),
+        "events": sink.events,
+    }
+
+
+def _cascade_stats(cascade) -> dict:
+    if cascade is None:
+        return None
+    return {
+        "screened": cascade.screened,
+        "escalated": cascade.escalated,
+        "escalated_share": round(cascade.escalated_share, 3),
+        "cropped": cascade.cropped,
+        "reasons": dict(cascade.reasons),
+    }
+
+
+def _event_key(e: dict) -> tuple:
+    return (e["frame"], e["owner_id"], e["object_id"], tuple(e["bbox"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video", nargs="?", default="media_server/test.mp4")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--fps", type=int, default=TARGET_FPS)
+    parser.add_argument("--tracker", default=TRACKER)
+    parser.add_argument("--brighten", action="store_true", default=BRIGHTEN, help="то же, что gain=1.4")
+    parser.add_argument("--preprocess", help='настройки Preprocessor в JSON, например \'{"clahe": true}\'')
+    parser.add_argument("--max-frames", type=int, default=0)
+    parser.add_argument("--roi", help="полигоны зоны интереса в JSON, в долях кадра")
+    parser.add_argument("--tiles", help='тайловый инференс в JSON, например \'{"size": 640, "min_width": 0}\'')
+    parser.add_argument("--backend", default=INFERENCE_BACKEND, choices=["torch", "onnx", "openvino"])
+    parser.add_argument("--int8", action="store_true", default=INFERENCE_INT8)
+    parser.add_argument("--threads", type=int, default=INFERENCE_THREADS)
+    parser.add_argument("--cascade-model", default=CASCADE_MODEL_PATH, help="дешёвая модель первой ступени каскада")
+    parser.add_argument("--cascade", help='настройки каскада в JSON, например \'{"crop": false}\'')
+    parser.add_argument("--no-motion", action="store_true", help="детектор на каждом кадре, без MotionGate")
+    parser.add_argument("--out", help="куда сохранить JSON-отчёт (по умолчанию stdout)")
+    parser.add_argument("--expect", help="отчёт, с событиями которого нужно совпасть")
+    args = parser.parse_args()
+
+    preprocess = json.loads(args.preprocess) if args.preprocess else {}
+    if args.brighten:
+        preprocess.setdefault("gain", 1.4)
+
+    report = replay(
+        args.video, args.model, args.fps, preprocess, args.tracker, args.max_frames,
+        motion={"enabled": False} if args.no_motion else None,
+        roi=json.loads(args.roi) if args.roi else None,
+        tiles=json.loads(args.tiles) if args.tiles else None,
+        backend=args.backend,
+        int8=args.int8,
+        threads=args.threads,
+        cascade_model=args.cascade_model,
+        cascade=json.loads(args.cascade) if args.cascade else None,
+    )
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    print(
+        f"[INFO] frames={report['frames']} idle={report['idle_frames']} fps={report['fps']} events={len(report['events'])}",
+        file=sys.stderr,
+    )
+    if report["cascade"]:
+        c = report["cascade"]
+        print(
+            f"[INFO] cascade screened={c['screened']} full={c['escalated']} "
+            f"({c['escalated_share']:.0%}) cropped={c['cropped']} reasons={c['reasons']}",
+            file=sys.stderr,
+        )
+    for stage, s in report["stages"].items():
+        print(
+            f"[INFO] {stage:<12} p50={s['p50_ms']:.2f}ms p95={s['p95_ms']:.2f}ms p99={s['p99_ms']:.2f}ms",
+            file=sys.stderr,
+        )
+
+    if args.expect:
+        with open(args.expect, encoding="utf-8") as f:
+            expected = json.load(f)["events"]
+        got = [_event_key(e) for e in report["events"]]
+        want = [_event_key(e) for e in expected]
+        if got != want:
+            print(f"[ERR] События расходятся: ожидалось {len(want)}, получено {len(got)}", file=sys.stderr)
+            sys.exit(1)
+        print("[OK] События совпадают с эталоном", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import cv2
+import numpy as np
+
+
+class Roi:
+    """
+    Зоны интереса камеры: один или несколько полигонов в долях ширины/высоты
+    кадра ([[x, y], ...], 0..1), поэтому не зависят от разрешения и от
+    уменьшения кадра в Preprocessor.
+
+    Детектор видит только описанный вокруг полигонов прямоугольник (crop),
+    а предметы, чья нижняя середина бокса (точка касания пола) вне полигонов,
+    отбрасываются. Маска и прямоугольник считаются один раз на размер кадра.
+    """
+
+    def __init__(self, polygons: list = None):
+        self.polygons = [np.asarray(p, dtype=float).reshape(-1, 2) for p in (polygons or [])]
+        self._cache = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.polygons)
+
+    def _prepare(self, shape):
+        h, w = shape[:2]
+        cached = self._cache.get((h, w))
+        if cached is not None:
+            return cached
+
+        if not self.enabled:
+            cached = ((0, 0, w, h), None)
+        else:
+            pts = [np.round(p * [w, h]).astype(np.int32) for p in self.polygons]
+            allpts = np.vstack(pts)
+            x0, y0 = np.clip(allpts.min(axis=0), 0, [w, h])
+            x1, y1 = np.clip(allpts.max(axis=0) + 1, 0, [w, h])
+            mask = np.zeros((h, w), dtype=np.uint8)
+            cv2.fillPoly(mask, pts, 1)
+            cached = ((int(x0), int(y0), int(x1), int(y1)), mask)
+        self._cache[(h, w)] = cached
+        return cached
+
+    def rect(self, shape) -> tuple:
+        """Прямоугольник (x0, y0, x1, y1) вокруг всех полигонов, в пикселях."""
+        return self._prepare(shape)[0]
+
+    def area(self, shape) -> float:
+        x0, y0, x1, y1 = self.rect(shape)
+        return float((x1 - x0) * (y1 - y0))
+
+    def crop(self, frame: np.ndarray) -> np.ndarray:
+        """View на прямоугольник ROI без копирования."""
+        x0, y0, x1, y1 = self.rect(frame.shape)
+        return frame[y0:y1, x0:x1]
+
+    def contains(self, xyxy: np.ndarray, shape) -> np.ndarray:
+        """Маска (N,): нижняя середина бокса внутри полигонов."""
+        mask = self._prepare(shape)[1]
+        if mask is None or not len(xyxy):
+            return np.ones(len(xyxy), dtype=bool)
+        h, w = mask.shape
+        cx = np.clip(((xyxy[:, 0] + xyxy[:, 2]) / 2).astype(int), 0, w - 1)
+        cy = np.clip(xyxy[:, 3].astype(int) - 1, 0, h - 1)
+        return mask[cy, cx] > 0
@@ -0,0 +1,207 @@
+import os
+import shutil
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+from ultralytics.data.augment import LetterBox
+
+from config import (
+    MODEL_PATH,
+    INFERENCE_BACKEND,
+    INFERENCE_INT8,
+    INFERENCE_THREADS,
+    INFERENCE_IMGSZ,
+    CALIBRATION_VIDEO,
+    CALIBRATION_FRAMES,
+    MODEL_EXPORT_DIR,
+    WARMUP_RUNS,
+)
+
+BACKENDS = ("torch", "onnx", "openvino")
+
+
+def calibration_frames(video: str, count: int = CALIBRATION_FRAMES, imgsz: int = INFERENCE_IMGSZ) -> list:
+    """
+    count кадров, равномерно взятых из ролика, подготовленных так же,
+    как их готовит predictor ultralytics: letterbox, RGB, NCHW, float32 0..1.
+    """
+    cap = cv2.VideoCapture(video)
+    if not cap.isOpened():
+        raise RuntimeError(f"Не удалось открыть калибровочное видео {video}")
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or count
+    wanted = set(np.linspace(0, total - 1, num=min(count, total), dtype=int).tolist())
+
+    letterbox = LetterBox((imgsz, imgsz), auto=False)
+    frames = []
+    idx = 0
+    while len(frames) < len(wanted):
+        ok = cap.grab()
+        if not ok:
+            break
+        if idx in wanted:
+            ok, frame = cap.retrieve()
+            if ok:
+                img = letterbox(image=frame)[:, :, ::-1].transpose(2, 0, 1)
+                frames.append(np.ascontiguousarray(img, dtype=np.float32)[None] / 255.0)
+        idx += 1
+    cap.release()
+    if not frames:
+        raise RuntimeError(f"В калибровочном видео {video} нет кадров")
+    return frames
+
+
+def _export(model_path: str, fmt: str, imgsz: int, dst: str) -> str:
+    """Экспорт через ultralytics и перенос результата в кэш dst."""
+    print(f"[INFO] Экспорт {model_path} в {fmt} (imgsz={imgsz})")
+    out = YOLO(model_path).export(format=fmt, imgsz=imgsz, dynamic=True, batch=1)
+    shutil.move(str(out), dst)
+    return dst
+
+
+def _quantize_onnx(src: str, dst: str, frames: list):
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    class _Reader(CalibrationDataReader):
+        def __init__(self):
+            self._it = iter(frames)
+
+        def get_next(self):
+            frame = next(self._it, None)
+            return None if frame is None else {"images": frame}
+
+    print(f"[INFO] INT8-квантизация ONNX по {len(frames)} кадрам")
+    quantize_static(
+        src,
+        dst,
+        _Reader(),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+
+
+def _quantize_openvino(src_dir: str, dst_dir: str, frames: list):
+    import nncf
+    import openvino as ov
+
+    xml = next(f for f in os.listdir(src_dir) if f.endswith(".xml"))
+    core = ov.Core()
+    model = core.read_model(os.path.join(src_dir, xml))
+
+    print(f"[INFO] INT8-квантизация OpenVINO по {len(frames)} кадрам")
+    quantized = nncf.quantize(
+        model,
+        nncf.Dataset(frames),
+        preset=nncf.QuantizationPreset.MIXED,
+        subset_size=len(frames),
+        # постобработка головы (DFL, sigmoid) в INT8 заметно теряет точность
+        ignored_scope=nncf.IgnoredScope(types=["Multiply", "Subtract", "Sigmoid"]),
+    )
+    os.makedirs(dst_dir, exist_ok=True)
+    ov.save_model(quantized, os.path.join(dst_dir, xml))
+    shutil.copy(os.path.join(src_dir, "metadata.yaml"), os.path.join(dst_dir, "metadata.yaml"))
+
+
+def prepare_model(
+    model_path: str = MODEL_PATH,
+    backend: str = INFERENCE_BACKEND,
+    int8: bool = INFERENCE_INT8,
+    imgsz: int = INFERENCE_IMGSZ,
+    calib_video: str = CALIBRATION_VIDEO,
+    export_dir: str = MODEL_EXPORT_DIR,
+) -> str:
+    """
+    Путь к модели под выбранный рантайм. Экспорт и квантизация делаются
+    один раз и кэшируются в export_dir (имя зависит от весов и imgsz).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Неизвестный INFERENCE_BACKEND={backend}, ожидается один из {BACKENDS}")
+    if backend == "torch":
+        if int8:
+            print("[WARN] INT8 поддерживается только для onnx/openvino, модель остаётся FP32")
+        return model_path
+
+    os.makedirs(export_dir, exist_ok=True)
+    stem = f"{os.path.splitext(os.path.basename(model_path))[0]}_{imgsz}"
+
+    if backend == "onnx":
+        fp32 = os.path.join(export_dir, f"{stem}.onnx")
+        target = os.path.join(export_dir, f"{stem}_int8.onnx") if int8 else fp32
+    else:
+        fp32 = os.path.join(export_dir, f"{stem}_openvino_model")
+        target = os.path.join(export_dir, f"{stem}_int8_openvino_model") if int8 else fp32
+
+    if os.path.exists(target):
+        return target
+    if not os.path.exists(fp32):
+        _export(model_path, backend, imgsz, fp32)
+    if int8:
+        frames = calibration_frames(calib_video, imgsz=imgsz)
+        if backend == "onnx":
+            _quantize_onnx(fp32, target, frames)
+        else:
+            _quantize_openvino(fp32, target, frames)
+    return target
+
+
+def _set_threads(model: YOLO, backend: str, threads: int):
+    """
+    AutoBackend ultralytics не принимает число потоков, поэтому после первого
+    прогона сессия (onnx) или скомпилированная модель (openvino) пересоздаются
+    с нужными настройками.
+    """
+    if backend == "torch":
+        import torch
+
+        torch.set_num_threads(threads)
+        return
+
+    ab = model.predictor.model
+    path = str(model.ckpt_path)
+    if backend == "onnx":
+        import onnxruntime as ort
+
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = threads
+        opts.inter_op_num_threads = 1
+        ab.session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+    else:
+        import openvino as ov
+
+        xml = next(f for f in os.listdir(path) if f.endswith(".xml"))
+        hint = ab.ov_compiled_model.get_property("PERFORMANCE_HINT")
+        ab.ov_compiled_model = ov.Core().compile_model(
+            os.path.join(path, xml),
+            device_name="CPU",
+            config={"PERFORMANCE_HINT": hint, "INFERENCE_NUM_THREADS": threads},
+        )
+
+
+def warmup(model: YOLO, imgsz: int = INFERENCE_IMGSZ, batch: int = 1, runs: int = WARMUP_RUNS):
+    """Пустые прогоны до старта потоков: ленивая инициализация и первые аллокации не попадают на живые кадры."""
+    frames = [np.zeros((imgsz, imgsz, 3), dtype=np.uint8)] * batch
+    for _ in range(runs):
+        model.predict(frames, verbose=False)
+
+
+def load_model(
+    model_path: str = MODEL_PATH,
+    backend: str = INFERENCE_BACKEND,
+    int8: bool = INFERENCE_INT8,
+    threads: int = INFERENCE_THREADS,
+    imgsz: int = INFERENCE_IMGSZ,
+    calib_video: str = CALIBRATION_VIDEO,
+    warmup_batch: int = 1,
+) -> YOLO:
+    path = prepare_model(model_path, backend, int8, imgsz, calib_video)
+    print(f"[INFO] Loading YOLO model: {path} (backend={backend}, int8={int8}, threads={threads or 'auto'})")
+    model = YOLO(path, task="detect")
+
+    # первый прогон создаёт predictor и AutoBackend
+    warmup(model, imgsz, warmup_batch, runs=1)
+    if threads:
+        _set_threads(model, backend, threads)
+    warmup(model, imgsz, warmup_batch)
+    return model
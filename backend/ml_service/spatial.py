@@ -0,0 +1,62 @@
+class CenterGrid:
+    """
+    Равномерная сетка центров боксов, раздельная по классам.
+
+    Размер ячейки равен радиусу поиска, поэтому все соседи ближе cell_size
+    лежат в 3x3 ячейках вокруг точки, и поиск не зависит от общего
+    числа объектов.
+    """
+
+    def __init__(self, cell_size: float):
+        self.cell_size = float(cell_size)
+        self._cells: dict = {}  # (class_id, gx, gy) -> {key: center}
+        self._where: dict = {}  # key -> (class_id, gx, gy)
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, key):
+        return key in self._where
+
+    def _cell(self, class_id, center):
+        return (
+            class_id,
+            int(center[0] // self.cell_size),
+            int(center[1] // self.cell_size),
+        )
+
+    def insert(self, key, class_id, center):
+        cell = self._cell(class_id, center)
+        self._cells.setdefault(cell, {})[key] = center
+        self._where[key] = cell
+
+    def move(self, key, class_id, center):
+        old = self._where.get(key)
+        new = self._cell(class_id, center)
+        if old == new:
+            self._cells[new][key] = center
+            return
+        if old is not None:
+            self._discard(old, key)
+        self._cells.setdefault(new, {})[key] = center
+        self._where[key] = new
+
+    def remove(self, key):
+        cell = self._where.pop(key, None)
+        if cell is not None:
+            self._discard(cell, key)
+
+    def _discard(self, cell, key):
+        bucket = self._cells[cell]
+        del bucket[key]
+        if not bucket:
+            del self._cells[cell]
+
+    def nearby(self, class_id, center):
+        """Ключи и центры из 3x3 ячеек вокруг center (кандидаты, не отфильтрованы по расстоянию)."""
+        _, gx, gy = self._cell(class_id, center)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                bucket = self._cells.get((class_id, gx + dx, gy + dy))
+                if bucket:
+                    yield from bucket.items()
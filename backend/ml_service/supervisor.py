@@ -0,0 +1,200 @@
+"""
+Многопроцессный режим ML-воркера (ML_WORKERS > 0).
+
+Декодирование и инференс в одном процессе делят GIL, поэтому здесь они
+разнесены: по процессу-декодеру на камеру (BusGrabber пишет кадры в
+FrameBus) и ML_WORKERS процессов инференса (run_on_cameras с BusSource
+вместо FrameGrabber), каждый со своей моделью и своим набором камер.
+Кадры между процессами не сериализуются: инференс читает их из общей
+памяти по номеру слота.
+
+Супервизор раздаёт камеры процессам инференса по кругу, следит за
+процессами и пульсом в общей памяти и перезапускает упавшие или
+зависшие с экспоненциальной задержкой. Перезапущенный процесс инференса
+поднимает состояние трекинга из чекпоинтов (checkpoint.py).
+"""
+import multiprocessing as mp
+import os
+import signal
+import sys
+import time
+
+from config import (
+    MODEL_PATH,
+    TARGET_FPS,
+    ML_WORKERS,
+    EVENT_JOURNAL_DIR,
+    METRICS_PORT,
+    SUPERVISOR_HEARTBEAT_TIMEOUT,
+)
+from framebus import FrameBus, BusGrabber, BusSource
+
+CHECK_INTERVAL = 1.0
+RESTART_MIN = 1.0
+RESTART_MAX = 60.0
+# процесс, проживший дольше, считается здоровым: задержка перезапуска сбрасывается
+HEALTHY_UPTIME = 60.0
+
+
+def _close_bus(bus: FrameBus):
+    try:
+        bus.close()
+    except BufferError:
+        # кто-то ещё держит view на кадр; процесс всё равно завершается
+        pass
+
+
+def decoder_main(bus_spec: tuple, index: int, url: str, target_fps: int):
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    bus = FrameBus.attach(*bus_spec)
+    grabber = BusGrabber(bus, index, url, target_fps)
+    print(f"[INFO] Декодер {index}: {url} (pid {os.getpid()})")
+    grabber.start()
+    try:
+        while grabber.is_alive():
+            grabber.beat()
+            time.sleep(0.5)
+    finally:
+        grabber.stop()
+        grabber.join(2.0)
+        # поток ещё пишет в общую память — отключаться от неё нельзя
+        if not grabber.is_alive():
+            _close_bus(bus)
+
+
+def worker_main(bus_spec: tuple, worker_index: int, camera_configs: list, indices: list, model_path: str, target_fps: int):
+    # ml импортирует supervisor, поэтому run_on_cameras — только здесь
+    from ml import run_on_cameras
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    bus = FrameBus.attach(*bus_spec)
+    sources = [BusSource(bus, i) for i in indices]
+    # у каждого процесса свой журнал недоставленных событий
+    journal_dir = EVENT_JOURNAL_DIR if worker_index == 0 else os.path.join(EVENT_JOURNAL_DIR, f"worker-{worker_index}")
+    metrics_port = METRICS_PORT + worker_index if METRICS_PORT else 0
+    print(f"[INFO] Инференс {worker_index}: камеры {[c.id for c in camera_configs]} (pid {os.getpid()})")
+    try:
+        run_on_cameras(camera_configs, model_path, target_fps, sources, journal_dir, metrics_port)
+    finally:
+        _close_bus(bus)
+
+
+class Supervisor:
+    def __init__(
+        self,
+        cameras: list,
+        workers: int = ML_WORKERS,
+        model_path: str = MODEL_PATH,
+        target_fps: int = TARGET_FPS,
+        heartbeat_timeout: float = SUPERVISOR_HEARTBEAT_TIMEOUT,
+    ):
+        self.cameras = cameras
+        self.workers = max(1, min(workers, len(cameras)))
+        self.model_path = model_path
+        self.target_fps = target_fps
+        self.heartbeat_timeout = heartbeat_timeout
+        # камеры по процессам инференса — по кругу
+        self.assignment = [list(range(k, len(cameras), self.workers)) for k in range(self.workers)]
+        self._index = {cam.id: i for i, cam in enumerate(cameras)}
+
+        # spawn, а не fork: у родителя уже могут быть потоки и состояние OpenCV/torch
+        self._ctx = mp.get_context("spawn")
+        self.bus = None
+        self._procs = {}  # имя -> Process
+        self._started = {}  # имя -> time.monotonic() запуска
+        self._backoff = {}
+        self._restart_at = {}
+        self.restarts = {}
+
+    def _names(self) -> list:
+        return [f"decoder:{cam.id}" for cam in self.cameras] + [f"worker:{k}" for k in range(self.workers)]
+
+    def _target(self, name: str) -> tuple:
+        kind, key = name.split(":", 1)
+        if kind == "decoder":
+            index = self._index[key]
+            return decoder_main, (self.bus.spec, index, self.cameras[index].url, self.target_fps)
+        k = int(key)
+        indices = self.assignment[k]
+        configs = [self.cameras[i] for i in indices]
+        return worker_main, (self.bus.spec, k, configs, indices, self.model_path, self.target_fps)
+
+    def _start(self, name: str):
+        # пульс прошлого экземпляра не должен сразу признать новый зависшим
+        kind, key = name.split(":", 1)
+        if kind == "decoder":
+            self.bus.reset_decoder(self._index[key])
+        else:
+            for i in self.assignment[int(key)]:
+                self.bus.reset_reader(i)
+
+        target, args = self._target(name)
+        proc = self._ctx.Process(target=target, args=args, name=name, daemon=False)
+        proc.start()
+        self._procs[name] = proc
+        self._started[name] = time.monotonic()
+        self._restart_at.pop(name, None)
+
+    def _stale(self, name: str) -> bool:
+        kind, key = name.split(":", 1)
+        if kind == "decoder":
+            ages = [self.bus.decoder_age(self._index[key])]
+        else:
+            ages = [self.bus.reader_age(i) for i in self.assignment[int(key)]]
+        return any(age is not None and age > self.heartbeat_timeout for age in ages)
+
+    def _schedule_restart(self, name: str, reason: str):
+        now = time.monotonic()
+        if now - self._started.get(name, now) > HEALTHY_UPTIME:
+            self._backoff[name] = RESTART_MIN
+        delay = self._backoff.get(name, RESTART_MIN)
+        self._backoff[name] = min(delay * 2, RESTART_MAX)
+        self._restart_at[name] = now + delay
+        self.restarts[name] = self.restarts.get(name, 0) + 1
+        print(f"[WARN] {name}: {reason}, перезапуск через {delay:.1f}s (всего {self.restarts[name]})")
+
+    def _check(self):
+        now = time.monotonic()
+        for name, proc in list(self._procs.items()):
+            if name in self._restart_at:
+                if now >= self._restart_at[name]:
+                    self._start(name)
+                continue
+            if not proc.is_alive():
+                self._schedule_restart(name, f"процесс завершился с кодом {proc.exitcode}")
+            elif self._stale(name):
+                proc.kill()
+                proc.join(5.0)
+                self._schedule_restart(name, f"нет пульса дольше {self.heartbeat_timeout:.0f}s")
+
+    def run(self):
+        self.bus = FrameBus.create(len(self.cameras))
+        print(
+            f"[INFO] Общая память кадров: {self.bus.shm.size / 2 ** 20:.0f} МБ, "
+            f"камер {len(self.cameras)}, процессов инференса {self.workers}"
+        )
+        try:
+            for name in self._names():
+                self._start(name)
+            while True:
+                time.sleep(CHECK_INTERVAL)
+                self._check()
+        finally:
+            self.stop()
+
+    def stop(self, timeout: float = 10.0):
+        """SIGTERM всем: сначала инференс (пишет чекпоинты и журнал), потом декодеры."""
+        for prefix in ("worker:", "decoder:"):
+            procs = [p for name, p in self._procs.items() if name.startswith(prefix) and p.is_alive()]
+            for p in procs:
+                p.terminate()
+            for p in procs:
+                p.join(timeout)
+                if p.is_alive():
+                    p.kill()
+                    p.join()
+        self._procs.clear()
+        if self.bus is not None:
+            self.bus.close()
+            self.bus.unlink()
+            self.bus = None
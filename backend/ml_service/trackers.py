@@ -0,0 +1,116 @@
+import numpy as np
+from ultralytics.trackers.track import TRACKER_MAP
+from ultralytics.utils import IterableSimpleNamespace, YAML
+from ultralytics.utils.checks import check_yaml
+
+from association import iou_matrix
+from config import MAX_COORD_DIST
+from detection import Detections
+
+# лёгкий трекер без ultralytics, для статичных камер
+CENTROID = "centroid"
+
+
+class CentroidTracker:
+    """
+    IoU/центроидный трекер для статичных камер: ни фильтра Калмана,
+    ни компенсации движения камеры. Детекции кадра сопоставляются с живыми
+    треками того же класса жадно — сначала по IoU (>= min_iou), остаток — по
+    расстоянию центров (< MAX_COORD_DIST, как при поиске потерянных треков
+    в ObjectStore). Трек без совпадений живёт max_age кадров.
+
+    update() возвращает массив в формате трекеров ultralytics:
+    [x1, y1, x2, y2, track_id, score, cls, idx].
+    """
+
+    def __init__(self, min_iou: float = 0.3, max_dist: float = MAX_COORD_DIST, max_age: int = 30):
+        self.min_iou = min_iou
+        self.max_dist = max_dist
+        self.max_age = max_age
+        self.boxes = np.zeros((0, 4))
+        self.cls = np.zeros(0)
+        self.ids = np.zeros(0, dtype=int)
+        self.missed = np.zeros(0, dtype=int)
+        self._next_id = 1
+
+    def reset(self):
+        self.__init__(self.min_iou, self.max_dist, self.max_age)
+
+    def _match(self, dets: Detections) -> np.ndarray:
+        """Индекс трека для каждой детекции или -1."""
+        n_t = len(self.ids)
+        assigned = np.full(len(dets), -1, dtype=int)
+        if not n_t or not len(dets):
+            return assigned
+
+        same_cls = self.cls[:, None] == dets.cls[None, :]
+        iou = np.where(same_cls, iou_matrix(self.boxes, dets.xyxy), 0.0)
+        tc = (self.boxes[:, :2] + self.boxes[:, 2:]) / 2
+        dc = (dets.xyxy[:, :2] + dets.xyxy[:, 2:]) / 2
+        dist = np.where(same_cls, np.linalg.norm(tc[:, None] - dc[None, :], axis=2), np.inf)
+
+        free_t = np.ones(n_t, dtype=bool)
+        for score, ok in ((iou, iou >= self.min_iou), (-dist, dist < self.max_dist)):
+            cand = np.argwhere(ok & free_t[:, None] & (assigned == -1)[None, :])
+            if not len(cand):
+                continue
+            order = np.argsort(-score[cand[:, 0], cand[:, 1]], kind="stable")
+            for ti, di in cand[order]:
+                if free_t[ti] and assigned[di] == -1:
+                    assigned[di] = ti
+                    free_t[ti] = False
+        return assigned
+
+    def update(self, dets: Detections, frame=None) -> np.ndarray:
+        assigned = self._match(dets)
+
+        matched_t = assigned[assigned >= 0]
+        self.missed += 1
+        self.missed[matched_t] = 0
+        self.boxes[matched_t] = dets.xyxy[assigned >= 0]
+
+        new = assigned == -1
+        n_new = int(new.sum())
+        new_ids = np.arange(self._next_id, self._next_id + n_new)
+        self._next_id += n_new
+
+        out_ids = np.empty(len(dets), dtype=int)
+        out_ids[~new] = self.ids[matched_t]
+        out_ids[new] = new_ids
+
+        alive = self.missed <= self.max_age
+        self.boxes = np.concatenate([self.boxes[alive], dets.xyxy[new]])
+        self.cls = np.concatenate([self.cls[alive], dets.cls[new]])
+        self.ids = np.concatenate([self.ids[alive], new_ids])
+        self.missed = np.concatenate([self.missed[alive], np.zeros(n_new, dtype=int)])
+
+        if not len(dets):
+            return np.zeros((0, 8))
+        return np.column_stack([dets.xyxy, out_ids, dets.conf, dets.cls, np.arange(len(dets))])
+
+
+def make_tracker(tracker_cfg: str = "botsort.yaml", frame_rate: int = 30):
+    """
+    Отдельный экземпляр трекера для одной камеры: "centroid" — свой
+    CentroidTracker, иначе yaml трекера ultralytics (botsort.yaml,
+    bytetrack.yaml) — так же, как его создаёт model.track(), но без
+    привязки к predictor.
+    """
+    if tracker_cfg == CENTROID:
+        return CentroidTracker()
+    cfg = IterableSimpleNamespace(**YAML.load(check_yaml(tracker_cfg)))
+    if cfg.tracker_type not in TRACKER_MAP:
+        raise ValueError(f"Неизвестный тип трекера: {cfg.tracker_type}")
+    return TRACKER_MAP[cfg.tracker_type](args=cfg, frame_rate=frame_rate)
+
+
+def apply_tracker(tracker, dets: Detections, frame) -> Detections:
+    """
+    Прогоняет детекции через трекер. Как и в model.track(): если трекер
+    ничего не вернул, детекции остаются как есть, без id.
+    """
+    tracks = tracker.update(dets, frame)
+    if len(tracks) == 0:
+        return dets
+    # [x1, y1, x2, y2, track_id, score, cls, idx]
+    return Detections(tracks[:, :4], tracks[:, 5], tracks[:, 6], tracks[:, 4])
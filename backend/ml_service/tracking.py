@@ -0,0 +1,184 @@
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+from config import MAX_COORD_DIST, OBJECT_STORE_MAX
+from spatial import CenterGrid
+
+
+def bbox_center(xyxy):
+    x1, y1, x2, y2 = xyxy
+    return (0.5 * (x1 + x2), 0.5 * (y1 + y2))
+
+
+class TrackedObject:
+    __slots__ = (
+        "tid",
+        "bbox",
+        "class_id",
+        "appeared_frame",
+        "last_seen_frame",
+        "owner_id",
+        "last_owner_frame",
+        "last_person_near_frame",
+        "flagged_left",
+    )
+
+    def __init__(self, tid, bbox, class_id, frame_idx):
+        self.tid = tid
+        self.bbox = bbox
+        self.class_id = class_id
+
+        self.appeared_frame = frame_idx
+        self.last_seen_frame = frame_idx
+
+        self.owner_id = None
+        self.last_owner_frame = None
+
+        self.last_person_near_frame = None
+
+        self.flagged_left = False
+
+
+class ObjectStore:
+    """
+    Отслеживаемые предметы камеры: словарь tid -> TrackedObject
+    плюс сетка центров для быстрого поиска "потерянных" треков.
+    Боксы меняются только через move()/seen(), чтобы сетка не разъезжалась со словарём.
+
+    Размер ограничен: объекты, не виденные дольше ttl тиков, удаляются
+    в expire() независимо от владельца; если всё равно набралось max_size,
+    при добавлении вытесняется дольше всех не виденный (LRU).
+    """
+
+    def __init__(self, cell_size: float = MAX_COORD_DIST, ttl: int = None, max_size: int = OBJECT_STORE_MAX):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._objects: dict = {}
+        self._order: dict = {}  # tid -> порядковый номер вставки
+        self._seq = 0
+        self._grid = CenterGrid(cell_size)
+        # tid в порядке последнего появления в кадре: слева — самые старые
+        self._lru = OrderedDict()
+
+        self.evicted_ttl = 0
+        self.evicted_lru = 0
+
+    def __len__(self):
+        return len(self._objects)
+
+    def __contains__(self, tid):
+        return tid in self._objects
+
+    def __getitem__(self, tid):
+        return self._objects[tid]
+
+    def __iter__(self):
+        return iter(self._objects)
+
+    def __delitem__(self, tid):
+        del self._objects[tid]
+        del self._order[tid]
+        del self._lru[tid]
+        self._grid.remove(tid)
+
+    def keys(self):
+        return self._objects.keys()
+
+    def values(self):
+        return self._objects.values()
+
+    def items(self):
+        return self._objects.items()
+
+    def add(self, obj: TrackedObject):
+        if obj.tid in self._objects:
+            del self[obj.tid]
+        while self.max_size and len(self._objects) >= self.max_size:
+            del self[next(iter(self._lru))]
+            self.evicted_lru += 1
+        self._objects[obj.tid] = obj
+        self._order[obj.tid] = self._seq
+        self._seq += 1
+        self._lru[obj.tid] = None
+        self._grid.insert(obj.tid, obj.class_id, bbox_center(obj.bbox))
+
+    def move(self, tid, bbox):
+        obj = self._objects[tid]
+        obj.bbox = bbox
+        self._grid.move(tid, obj.class_id, bbox_center(bbox))
+
+    def seen(self, tid, bbox, now: int):
+        """Объект снова в кадре: новый бокс и last_seen_frame."""
+        self.move(tid, bbox)
+        self._objects[tid].last_seen_frame = now
+        self._lru.move_to_end(tid)
+
+    def expire(self, now: int) -> int:
+        """
+        Удаляет объекты, не виденные дольше ttl. Идёт с начала LRU,
+        поэтому стоит O(удалённых), а не O(всех объектов).
+        """
+        if self.ttl is None:
+            return 0
+        removed = 0
+        while self._lru:
+            tid = next(iter(self._lru))
+            if now - self._objects[tid].last_seen_frame <= self.ttl:
+                break
+            del self[tid]
+            removed += 1
+        self.evicted_ttl += removed
+        return removed
+
+    def find_nearest(self, bbox, class_id):
+        """
+        Ближайший объект того же класса с центром ближе MAX_COORD_DIST.
+        При равных расстояниях побеждает более ранний объект,
+        как при линейном обходе словаря.
+        """
+        cx, cy = bbox_center(bbox)
+        best_tid = None
+        best = (10**9, 0)
+        for tid_, (px, py) in self._grid.nearby(class_id, (cx, cy)):
+            dx = cx - px
+            dy = cy - py
+            d = math.sqrt(dx * dx + dy * dy)
+            if d >= MAX_COORD_DIST:
+                continue
+            key = (d, self._order[tid_])
+            if key < best:
+                best = key
+                best_tid = tid_
+        return best_tid
+
+
+def update_tracked_objects(
+    tracked_objects: ObjectStore,
+    boxes: np.ndarray,
+    ids: np.ndarray,
+    classes: np.ndarray,
+    now: int,
+):
+    """
+    Обновляет/создаёт TrackedObject по детекциям предметов текущего кадра.
+    Детекция без id трекера (или с новым id) сначала пытается
+    прицепиться к уже известному объекту того же класса по близости центра.
+    """
+    for i in range(len(boxes)):
+        raw_tid = int(ids[i])
+        bbox = tuple(boxes[i].tolist())
+        class_id = int(classes[i])
+
+        if raw_tid != -1 and raw_tid in tracked_objects:
+            tracked_objects.seen(raw_tid, bbox, now)
+            continue
+
+        match_tid = tracked_objects.find_nearest(bbox, class_id)
+        if match_tid is not None:
+            tracked_objects.seen(match_tid, bbox, now)
+            continue
+
+        new_tid = raw_tid if raw_tid != -1 else f"ghost_{now}_{hash(bbox)}"
+        tracked_objects.add(TrackedObject(new_tid, bbox, class_id, now))
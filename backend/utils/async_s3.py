@@ -0,0 +1,123 @@
+import asyncio
+import os
+from contextlib import AsyncExitStack
+
+from aiobotocore.config import AioConfig
+from aiobotocore.session import get_session
+
+# соединений к S3 на процесс uvicorn, общие для всех запросов
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "32"))
+# файлы больше этого уходят multipart-загрузкой частями такого же размера
+S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", str(8 * 2**20)))
+
+
+class AsyncS3:
+    """
+    Один клиент aiobotocore на процесс: пул keep-alive соединений общий,
+    загрузка не занимает поток из threadpool. Клиент создаётся при старте
+    приложения (start) или при первом обращении.
+    """
+
+    def __init__(
+        self,
+        endpoint_url: str,
+        access_key: str,
+        secret_key: str,
+        secure: bool = False,
+        max_pool_connections: int = S3_MAX_POOL_CONNECTIONS,
+    ):
+        self.endpoint_url = endpoint_url
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.secure = secure
+        self.max_pool_connections = max_pool_connections
+
+        self._stack = None
+        self._client = None
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        async with self._lock:
+            if self._client is not None:
+                return
+            stack = AsyncExitStack()
+            self._client = await stack.enter_async_context(
+                get_session().create_client(
+                    "s3",
+                    endpoint_url=self.endpoint_url,
+                    aws_access_key_id=self.access_key,
+                    aws_secret_access_key=self.secret_key,
+                    config=AioConfig(signature_version="s3v4", max_pool_connections=self.max_pool_connections),
+                    verify=self.secure,
+                )
+            )
+            self._stack = stack
+
+    async def stop(self):
+        async with self._lock:
+            if self._stack is not None:
+                await self._stack.aclose()
+            self._stack = None
+            self._client = None
+
+    async def put_object(self, bucket: str, key: str, body: bytes, content_type: str) -> None:
+        if self._client is None:
+            await self.start()
+        await self._client.put_object(Bucket=bucket, Key=key, Body=body, ContentType=content_type)
+
+    async def upload_fileobj(
+        self,
+        bucket: str,
+        key: str,
+        fileobj,
+        content_type: str,
+        part_size: int = S3_MULTIPART_THRESHOLD,
+    ) -> None:
+        """
+        Загрузка из файла (в т.ч. UploadFile.file, который Starlette держит
+        на диске) без чтения целиком в память: небольшой файл уходит телом
+        запроса потоком, большой — multipart частями по part_size.
+        """
+        if self._client is None:
+            await self.start()
+        fileobj.seek(0, os.SEEK_END)
+        size = fileobj.tell()
+        fileobj.seek(0)
+        if size <= part_size:
+            await self._client.put_object(Bucket=bucket, Key=key, Body=fileobj, ContentType=content_type)
+            return
+
+        upload = await self._client.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)
+        upload_id = upload["UploadId"]
+        try:
+            parts = []
+            number = 1
+            while True:
+                chunk = await asyncio.to_thread(fileobj.read, part_size)
+                if not chunk:
+                    break
+                resp = await self._client.upload_part(
+                    Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=chunk,
+                )
+                parts.append({"PartNumber": number, "ETag": resp["ETag"]})
+                number += 1
+            await self._client.complete_multipart_upload(
+                Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts},
+            )
+        except BaseException:
+            await self._client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+            raise
+
+    async def delete_objects(self, bucket: str, keys: list) -> None:
+        """Удаление ключей запросами DeleteObjects (до 1000 ключей в одном)."""
+        if self._client is None:
+            await self.start()
+        for start in range(0, len(keys), 1000):
+            chunk = keys[start:start + 1000]
+            resp = await self._client.delete_objects(
+                Bucket=bucket,
+                Delete={"Objects": [{"Key": key} for key in chunk], "Quiet": True},
+            )
+            errors = resp.get("Errors")
+            if errors:
+                raise RuntimeError(f"S3 delete failed for {len(errors)} keys: {errors[0].get('Message')}")
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+
+# сообщений в очереди одного подписчика; кто не успевает — отключается и
+# догоняет по Last-Event-ID после переподключения
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "256"))
+# рассылка между репликами бэкенда через Postgres LISTEN/NOTIFY
+EVENTS_NOTIFY = os.getenv("EVENTS_NOTIFY", "false").lower() == "true"
+EVENTS_NOTIFY_CHANNEL = os.getenv("EVENTS_NOTIFY_CHANNEL", "events_stream")
+
+
+def sse_frame(kind: str, stream_id: str, data: str) -> str:
+    return f"id: {stream_id}\nevent: {kind}\ndata: {data}\n\n"
+
+
+class Broadcaster:
+    """
+    Рассылка изменений событий всем открытым /events/stream процесса.
+
+    Сообщение сериализуется один раз и кладётся готовым SSE-кадром в очередь
+    каждого подписчика, так что число операторов не добавляет ни запросов
+    к БД, ни сериализаций.
+
+    С notify_dsn публикация идёт через pg_notify, а каждый процесс слушает
+    канал и рассылает своим подписчикам — так изменения видны клиентам
+    всех реплик. Пока соединения нет, рассылка только локальная.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = STREAM_QUEUE_SIZE,
+        notify_dsn: str = None,
+        channel: str = EVENTS_NOTIFY_CHANNEL,
+    ):
+        self.queue_size = queue_size
+        self.notify_dsn = notify_dsn
+        self.channel = channel
+
+        self._subscribers = set()
+        # вызываются на каждое сообщение из канала (в т.ч. от других реплик)
+        self._listeners = []
+        self._conn = None
+        self._conn_lock = asyncio.Lock()
+        self._listen_task = None
+
+        self.published = 0
+        self.dropped = 0
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    async def start(self):
+        if self.notify_dsn and self._listen_task is None:
+            self._listen_task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listen_task is not None:
+            self._listen_task.cancel()
+            try:
+                await self._listen_task
+            except asyncio.CancelledError:
+                pass
+            self._listen_task = None
+        for queue in list(self._subscribers):
+            self._close(queue)
+
+    def add_listener(self, callback):
+        """callback(kind, data) на сообщения, пришедшие через LISTEN."""
+        self._listeners.append(callback)
+
+    @asynccontextmanager
+    async def subscribe(self):
+        """Очередь SSE-кадров; None в очереди — подписчик отключён как отстающий."""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers.discard(queue)
+
+    async def publish(self, kind: str, stream_id: str, data: str):
+        self.published += 1
+        if self._conn is not None:
+            payload = json.dumps({"kind": kind, "id": stream_id, "data": data})
+            try:
+                async with self._conn_lock:
+                    await self._conn.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+                return
+            except Exception as e:
+                print(f"[WARN] pg_notify не удался, рассылка только локальная: {e}")
+        self._fanout(sse_frame(kind, stream_id, data))
+
+    def _fanout(self, frame: str):
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                self.dropped += 1
+                self._close(queue)
+
+    def _close(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+        # освобождаем место под маркер отключения
+        while True:
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+        queue.put_nowait(None)
+
+    def _on_notify(self, conn, pid, channel, payload):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        for callback in self._listeners:
+            try:
+                callback(message["kind"], message["data"])
+            except Exception as e:
+                print(f"[WARN] Обработчик канала {self.channel} упал: {e}")
+        self._fanout(sse_frame(message["kind"], message["id"], message["data"]))
+
+    async def _listen(self):
+        import asyncpg
+
+        delay = 1.0
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(self.notify_dsn)
+                await conn.add_listener(self.channel, self._on_notify)
+                self._conn = conn
+                delay = 1.0
+                print(f"[OK] Слушаем канал событий {self.channel}")
+                while not conn.is_closed():
+                    await asyncio.sleep(5)
+                    # заодно проверка живости соединения
+                    async with self._conn_lock:
+                        await conn.execute("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[WARN] LISTEN {self.channel} прерван: {e}; переподключение через {delay:.0f}с")
+            finally:
+                self._conn = None
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
@@ -0,0 +1,497 @@
+import asyncio
+import fcntl
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from itertools import count
+
+INGEST_DIR = os.getenv("INGEST_DIR", "data/ingest")
+# размер сегмента журнала, после которого начинается следующий
+INGEST_SEGMENT_BYTES = int(os.getenv("INGEST_SEGMENT_BYTES", str(64 * 2**20)))
+# событий, которые фоновый писатель забирает из журнала за раз
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "50"))
+INGEST_RETRY_MAX_DELAY = float(os.getenv("INGEST_RETRY_MAX_DELAY", "30"))
+# как часто простаивающий процесс ищет каталоги slot-N без владельца
+INGEST_ORPHAN_CHECK_INTERVAL = float(os.getenv("INGEST_ORPHAN_CHECK_INTERVAL", "30"))
+
+# длина метаданных, длина тела, crc32 метаданных и тела
+_HEADER = struct.Struct("<III")
+_SUFFIX = ".wal"
+_CURSOR = "cursor.json"
+# записи, которые хранилище отвергло по содержимому; формат как у сегментов
+_DEAD_LETTER = "dead-letter.log"
+
+
+class RecordRejected(Exception):
+    """
+    write() не может записать пачку из-за содержимого записей (а не из-за
+    недоступности хранилища): повтор той же пачки ничего не даст.
+    """
+
+
+class IngestRecord:
+    __slots__ = ("segment", "end", "meta", "body")
+
+    def __init__(self, segment: int, end: int, meta: dict, body: bytes):
+        self.segment = segment
+        self.end = end
+        self.meta = meta
+        self.body = body
+
+
+def _encode(meta: dict, body: bytes) -> bytes:
+    raw_meta = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+    crc = zlib.crc32(body, zlib.crc32(raw_meta))
+    return _HEADER.pack(len(raw_meta), len(body), crc) + raw_meta + body
+
+
+def _read_records(path: str, segment: int, offset: int, limit: int, max_records: int) -> tuple:
+    """
+    Записи сегмента с offset до limit байт. Возвращает (записи, дочитан ли
+    сегмент до конца). Недописанная или битая запись в хвосте — конец данных
+    (процесс упал посреди записи, клиент подтверждения не получил).
+    """
+    records = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while offset < limit and len(records) < max_records:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return records, True
+            meta_len, body_len, crc = _HEADER.unpack(header)
+            end = offset + _HEADER.size + meta_len + body_len
+            if end > limit:
+                return records, True
+            raw_meta = f.read(meta_len)
+            body = f.read(body_len)
+            if len(body) < body_len or zlib.crc32(body, zlib.crc32(raw_meta)) != crc:
+                return records, True
+            records.append(IngestRecord(segment, end, json.loads(raw_meta), body))
+            offset = end
+    return records, offset >= limit
+
+
+class IngestQueue:
+    """
+    Локальный журнал (write-ahead) принятых событий.
+
+    put() дописывает событие в текущий сегмент и возвращается после fsync:
+    поток записи сбрасывает на диск всё, что накопилось за время предыдущего
+    fsync, одним вызовом (group commit). Фоновая задача читает журнал от
+    сохранённого курсора пачками по batch_size и отдаёт их write(records);
+    курсор сдвигается только после успешной записи, иначе та же пачка
+    повторяется с backoff. После падения процесса пачка может уйти повторно,
+    поэтому write должен быть идемпотентным. Если write отвергает пачку
+    (RecordRejected), записи пишутся по одной, а отвергнутые сами по себе
+    уходят в dead-letter.log каталога — одна плохая запись не стопорит очередь.
+
+    Каждый процесс (воркер uvicorn) берёт свой каталог slot-N под flock,
+    каталог упавшего процесса подхватит следующий запущенный. Если воркеров
+    стало меньше, незаписанное из лишних каталогов дописывает простаивающий
+    процесс (раз в orphan_check_interval ищет каталоги без владельца).
+    """
+
+    def __init__(
+        self,
+        root: str = INGEST_DIR,
+        segment_bytes: int = INGEST_SEGMENT_BYTES,
+        batch_size: int = INGEST_BATCH_SIZE,
+        retry_max_delay: float = INGEST_RETRY_MAX_DELAY,
+        orphan_check_interval: float = INGEST_ORPHAN_CHECK_INTERVAL,
+    ):
+        self.root = root
+        self.segment_bytes = segment_bytes
+        self.batch_size = batch_size
+        self.retry_max_delay = retry_max_delay
+        self.orphan_check_interval = orphan_check_interval
+
+        self.dir = None
+        self._lock_file = None
+        self._file = None
+        self._segment = 0
+        self._flushed = 0
+        self._state_lock = threading.Lock()
+        self._cursor = (0, 0)
+
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._closing = False
+        self._flusher = None
+
+        self._loop = None
+        self._has_data = None
+        self._drain_task = None
+        # чужой каталог slot-N, который сейчас дописываем (тоже IngestQueue, только чтение)
+        self._orphan = None
+        self._next_orphan_check = 0.0
+
+        # время приёма каждого ещё не записанного события, по порядку журнала
+        self._pending = deque()
+        self.accepted = 0
+        self.written = 0
+        self.skipped = 0
+        self.dead_lettered = 0
+        self.retries = 0
+        self.last_error = None
+        self.last_write_at = None
+
+    # ---------- запуск / остановка ----------
+
+    async def start(self, write):
+        if self._drain_task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._has_data = asyncio.Event()
+        await asyncio.to_thread(self._open)
+        self._closing = False
+        self._flusher = threading.Thread(target=self._flush_loop, name="ingest-wal", daemon=True)
+        self._flusher.start()
+        self._drain_task = asyncio.create_task(self._drain(write))
+        if self._pending:
+            print(f"[INFO] В журнале приёма {len(self._pending)} незаписанных событий ({self.dir})")
+            self._has_data.set()
+
+    async def stop(self):
+        if self._drain_task is None:
+            return
+        self._drain_task.cancel()
+        try:
+            await self._drain_task
+        except asyncio.CancelledError:
+            pass
+        self._drain_task = None
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        await asyncio.to_thread(self._flusher.join)
+        self._file.close()
+        self._lock_file.close()
+        if self._orphan is not None:
+            self._orphan._lock_file.close()
+            self._orphan = None
+
+    @staticmethod
+    def _try_lock(path: str):
+        lock_file = open(os.path.join(path, ".lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def _acquire_dir(self) -> str:
+        for n in count():
+            path = os.path.join(self.root, f"slot-{n}")
+            os.makedirs(path, exist_ok=True)
+            lock_file = self._try_lock(path)
+            if lock_file is not None:
+                self._lock_file = lock_file
+                return path
+
+    def _segments(self) -> list:
+        return sorted(int(name[:-len(_SUFFIX)]) for name in os.listdir(self.dir) if name.endswith(_SUFFIX))
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.dir, f"{segment:08d}{_SUFFIX}")
+
+    def _recover(self) -> list:
+        """Курсор и незаписанные события каталога self.dir; возвращает номера сегментов."""
+        cursor_path = os.path.join(self.dir, _CURSOR)
+        if os.path.exists(cursor_path):
+            with open(cursor_path, encoding="utf-8") as f:
+                saved = json.load(f)
+            self._cursor = (saved["segment"], saved["offset"])
+
+        segments = self._segments()
+        for segment in segments:
+            if segment < self._cursor[0]:
+                os.remove(self._path(segment))
+                continue
+            offset = self._cursor[1] if segment == self._cursor[0] else 0
+            size = os.path.getsize(self._path(segment))
+            while offset < size:
+                records, _ = _read_records(self._path(segment), segment, offset, size, self.batch_size)
+                if not records:
+                    break
+                self._pending.extend(r.meta["accepted_at"] for r in records)
+                offset = records[-1].end
+        return segments
+
+    def _open(self):
+        self.dir = self._acquire_dir()
+        segments = self._recover()
+        # в старые сегменты не дописываем: хвост мог остаться недописанным
+        self._segment = max(segments + [self._cursor[0]]) + 1
+        self._file = open(self._path(self._segment), "ab", buffering=0)
+        self._flushed = 0
+
+    def _claim_orphan(self):
+        """
+        Каталог slot-N без владельца, в котором остались незаписанные события
+        (процессов стало меньше, чем было). Возвращает IngestQueue этого
+        каталога под flock или None.
+        """
+        for name in sorted(os.listdir(self.root)):
+            path = os.path.join(self.root, name)
+            if not name.startswith("slot-") or path == self.dir:
+                continue
+            lock_file = self._try_lock(path)
+            if lock_file is None:
+                continue
+            orphan = IngestQueue(self.root, self.segment_bytes, self.batch_size)
+            orphan.dir, orphan._lock_file = path, lock_file
+            segments = orphan._recover()
+            if not orphan._pending:
+                lock_file.close()
+                continue
+            # в каталог больше никто не пишет: последний сегмент читается до конца файла
+            orphan._segment = segments[-1]
+            orphan._flushed = os.path.getsize(orphan._path(segments[-1]))
+            return orphan
+        return None
+
+    def _release_orphan(self):
+        orphan, self._orphan = self._orphan, None
+        for segment in orphan._segments():
+            os.remove(orphan._path(segment))
+        orphan._lock_file.close()
+
+    # ---------- приём ----------
+
+    async def put(self, meta: dict, body: bytes) -> None:
+        """Дописывает событие в журнал; возвращается, когда оно на диске."""
+        if self._flusher is None or self._closing:
+            raise RuntimeError("Ingest queue is not running")
+        meta = dict(meta, accepted_at=time.time())
+        future = self._loop.create_future()
+        with self._cond:
+            self._waiting.append((_encode(meta, body), meta["accepted_at"], future))
+            self._cond.notify()
+        await future
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._waiting and not self._closing:
+                    self._cond.wait()
+                if not self._waiting:
+                    return
+                items, self._waiting = self._waiting, []
+
+            error = None
+            try:
+                for data, _, _ in items:
+                    view = memoryview(data)
+                    while view:
+                        view = view[self._file.write(view):]
+                os.fsync(self._file.fileno())
+            except Exception as e:
+                error = e
+                # клиент получит ошибку и повторит: недописанное не должно уйти в БД вторым экземпляром
+                try:
+                    os.ftruncate(self._file.fileno(), self._flushed)
+                    os.fsync(self._file.fileno())
+                except OSError as te:
+                    print(f"[ERR] Не удалось откатить журнал приёма {self._path(self._segment)}, возможны дубли: {te}")
+
+            if error is None:
+                # до сдвига _flushed: писатель не должен увидеть запись раньше, чем она в _pending
+                self._pending.extend(accepted_at for _, accepted_at, _ in items)
+                self.accepted += len(items)
+                with self._state_lock:
+                    self._flushed = self._file.tell()
+            if error is not None or self._flushed >= self.segment_bytes:
+                # после ошибки в хвосте может остаться мусор, пишем дальше в новый сегмент
+                self._rotate()
+
+            for _, _, future in items:
+                self._loop.call_soon_threadsafe(_resolve, future, error)
+            self._loop.call_soon_threadsafe(self._has_data.set)
+
+    def _rotate(self):
+        try:
+            self._file.close()
+        except OSError:
+            pass
+        with self._state_lock:
+            self._segment += 1
+            self._flushed = 0
+            self._file = open(self._path(self._segment), "ab", buffering=0)
+
+    # ---------- фоновая запись ----------
+
+    def _read_batch(self) -> list:
+        segment, offset = self._cursor
+        records = []
+        while len(records) < self.batch_size:
+            with self._state_lock:
+                active, flushed = self._segment, self._flushed
+            if segment > active:
+                break
+            path = self._path(segment)
+            if segment == active:
+                limit = flushed
+            elif os.path.exists(path):
+                limit = os.path.getsize(path)
+            else:
+                segment, offset = segment + 1, 0
+                continue
+            found, finished = _read_records(path, segment, offset, limit, self.batch_size - len(records))
+            records += found
+            if found:
+                offset = found[-1].end
+            if segment == active or not finished:
+                break
+            segment, offset = segment + 1, 0
+        return records
+
+    def _commit(self, records: list):
+        last = records[-1]
+        self._cursor = (last.segment, last.end)
+        cursor_path = os.path.join(self.dir, _CURSOR)
+        tmp_path = cursor_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"segment": last.segment, "offset": last.end}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, cursor_path)
+        for segment in self._segments():
+            if segment < last.segment:
+                os.remove(self._path(segment))
+
+    async def _drain(self, write):
+        delay = 0.5
+        while True:
+            self._has_data.clear()
+            records = await asyncio.to_thread(self._read_batch)
+            if not records:
+                if await self._drain_orphan(write):
+                    continue
+                try:
+                    await asyncio.wait_for(self._has_data.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                skipped = await self._write(write, records, self.dir)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.retries += 1
+                # у ошибок SQLAlchemy в тексте весь запрос с параметрами
+                self.last_error = f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}"
+                print(f"[WARN] Запись из журнала приёма не удалась, повтор через {delay:.1f}с: {self.last_error}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.retry_max_delay)
+                continue
+
+            await asyncio.to_thread(self._commit, records)
+            for _ in records:
+                self._pending.popleft()
+            self.written += len(records) - (skipped or 0)
+            self.skipped += skipped or 0
+            self.last_error = None
+            self.last_write_at = time.time()
+            delay = 0.5
+
+    async def _write(self, write, records: list, directory: str) -> int:
+        """write(records); возвращает число пропущенных, включая ушедшие в dead letter."""
+        try:
+            return await write(records) or 0
+        except RecordRejected as e:
+            if len(records) == 1:
+                await asyncio.to_thread(self._dead_letter, directory, records[0], e)
+                return 1
+        skipped = 0
+        for record in records:
+            skipped += await self._write(write, [record], directory)
+        return skipped
+
+    def _dead_letter(self, directory: str, record: IngestRecord, error: Exception):
+        meta = dict(record.meta, error=f"{type(error).__name__}: {str(error)[:500]}")
+        with open(os.path.join(directory, _DEAD_LETTER), "ab") as f:
+            f.write(_encode(meta, record.body))
+            f.flush()
+            os.fsync(f.fileno())
+        self.dead_lettered += 1
+        print(f"[ERR] Запись {record.meta.get('ingest_id')} отвергнута хранилищем, перенесена в {_DEAD_LETTER}: {error}")
+
+    async def _drain_orphan(self, write) -> bool:
+        """Одна пачка из чужого каталога, пока свой журнал пуст; True — пачка записана."""
+        if self._orphan is None:
+            if time.monotonic() < self._next_orphan_check:
+                return False
+            self._next_orphan_check = time.monotonic() + self.orphan_check_interval
+            self._orphan = await asyncio.to_thread(self._claim_orphan)
+            if self._orphan is None:
+                return False
+            print(f"[INFO] Подхватываем {len(self._orphan._pending)} незаписанных событий из {self._orphan.dir}")
+
+        orphan = self._orphan
+        records = await asyncio.to_thread(orphan._read_batch)
+        if not records:
+            await asyncio.to_thread(self._release_orphan)
+            return False
+        try:
+            skipped = await self._write(write, records, orphan.dir)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # повтор при следующем простое, свой журнал не ждёт
+            self.retries += 1
+            self.last_error = f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}"
+            print(f"[WARN] Запись из {orphan.dir} не удалась: {self.last_error}")
+            return False
+        await asyncio.to_thread(orphan._commit, records)
+        for _ in records:
+            orphan._pending.popleft()
+        self.written += len(records) - (skipped or 0)
+        self.skipped += skipped or 0
+        self.last_error = None
+        self.last_write_at = time.time()
+        return True
+
+    # ---------- состояние ----------
+
+    def status(self) -> dict:
+        pending = [self._pending[0]] if self._pending else []
+        orphan = self._orphan
+        if orphan is not None and orphan._pending:
+            pending.append(orphan._pending[0])
+        oldest = min(pending) if pending else None
+        wal_bytes = 0
+        if self.dir is not None:
+            for segment in self._segments():
+                try:
+                    wal_bytes += os.path.getsize(self._path(segment))
+                except FileNotFoundError:
+                    pass
+        return {
+            "running": self._drain_task is not None,
+            "dir": self.dir,
+            "pending": len(self._pending) + (len(orphan._pending) if orphan is not None else 0),
+            "lag_seconds": time.time() - oldest if oldest is not None else 0.0,
+            "accepted": self.accepted,
+            "written": self.written,
+            "skipped": self.skipped,
+            "dead_lettered": self.dead_lettered,
+            "retries": self.retries,
+            "last_error": self.last_error,
+            "last_write_at": self.last_write_at,
+            "wal_bytes": wal_bytes,
+        }
+
+
+def _resolve(future, error):
+    if future.done():
+        return
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(error)
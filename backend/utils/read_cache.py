@@ -0,0 +1,82 @@
+import os
+import time
+from collections import OrderedDict
+
+# ответов GET /events и GET /events/{id} в кэше процесса
+READ_CACHE_SIZE = int(os.getenv("READ_CACHE_SIZE", "1024"))
+# страховка на случай изменений, о которых процесс не узнал
+# (несколько реплик без EVENTS_NOTIFY)
+READ_CACHE_TTL = float(os.getenv("READ_CACHE_TTL", "60"))
+
+
+class CachedResponse:
+    __slots__ = ("body", "etag", "last_modified", "headers")
+
+    def __init__(self, body: bytes, etag: str, last_modified: str, headers: dict = None):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.headers = headers or {}
+
+
+class ReadCache:
+    """
+    Готовые ответы чтения событий (тело JSON + ETag), LRU с ограничением
+    размера. Страницы ленты и отдельные события хранятся раздельно:
+    любое создание или смена статуса сбрасывает все страницы (новое событие
+    сдвигает их), а из событий — только изменённое.
+
+    Ответ, прочитанный из БД во время сброса, в кэш не кладётся: версия
+    проверяется до и после загрузки.
+    """
+
+    def __init__(self, max_entries: int = READ_CACHE_SIZE, ttl: float = READ_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._pages = OrderedDict()
+        self._items = OrderedDict()
+        self._version = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get_page(self, key) -> CachedResponse:
+        return self._get(self._pages, key)
+
+    def get_item(self, event_id: int) -> CachedResponse:
+        return self._get(self._items, event_id)
+
+    def put_page(self, key, value: CachedResponse, version: int):
+        self._put(self._pages, key, value, version)
+
+    def put_item(self, event_id: int, value: CachedResponse, version: int):
+        self._put(self._items, event_id, value, version)
+
+    def invalidate(self, event_id: int = None):
+        self._version += 1
+        self._pages.clear()
+        if event_id is None:
+            self._items.clear()
+        else:
+            self._items.pop(event_id, None)
+
+    def _get(self, entries: OrderedDict, key):
+        entry = entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+        entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def _put(self, entries: OrderedDict, key, value: CachedResponse, version: int):
+        if version != self._version or self.max_entries <= 0:
+            return
+        entries[key] = (time.monotonic() + self.ttl, value)
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
@@ -6,6 +6,7 @@ export interface EventDto {
   owner_id: number | null;
   bbox: number[] | null;
   frame_snapshot_url: string;
+  clip_url: string | null;
   status: EventStatus;
   event_timestamp: string;
   created_at: string;
@@ -28,6 +29,24 @@ export async function fetchEvents(status?: EventStatus): Promise<EventDto[]> {
   return resp.json();
 }
 
+export type EventStreamKind = "created" | "updated";
+
+// SSE /events/stream: браузер сам переподключается и присылает Last-Event-ID,
+// пропущенное за разрыв бэкенд досылает; reset — пропущено слишком много
+export function subscribeEvents(
+  onEvent: (kind: EventStreamKind, event: EventDto) => void,
+  onReset: () => void
+): () => void {
+  const source = new EventSource(`${API_BASE}/events/stream`);
+  const handle = (kind: EventStreamKind) => (msg: MessageEvent) => {
+    onEvent(kind, JSON.parse(msg.data) as EventDto);
+  };
+  source.addEventListener("created", handle("created"));
+  source.addEventListener("updated", handle("updated"));
+  source.addEventListener("reset", () => onReset());
+  return () => source.close();
+}
+
 export async function fetchStreamHlsUrl(): Promise<string> {
   const resp = await fetch(`${API_BASE}/streams/hls`);
   if (!resp.ok) {
@@ -2,6 +2,7 @@ import { useEffect, useState, useCallback } from "react";
 import type { EventDto, EventStatus } from "../api";
 import {
   fetchEvents,
+  subscribeEvents,
   updateEventStatus,
 } from "../api";
 import EventCard from "./EventCard";
@@ -14,6 +15,24 @@ const STATUS_TABS: { label: string; value?: EventStatus }[] = [
   { label: "Ложные", value: "dismissed" },
 ];
 
+const MAX_EVENTS = 100;
+
+// событие из потока или ответа PATCH: заменить/вставить или убрать из вкладки
+function mergeEvent(
+  list: EventDto[],
+  event: EventDto,
+  status?: EventStatus
+): EventDto[] {
+  const current = list.find((e) => e.id === event.id);
+  // при догоне после переподключения могут прийти устаревшие состояния
+  if (current && current.updated_at > event.updated_at) return list;
+  const rest = list.filter((e) => e.id !== event.id);
+  if (status && event.status !== status) return rest;
+  return [event, ...rest]
+    .sort((a, b) => b.created_at.localeCompare(a.created_at) || b.id - a.id)
+    .slice(0, MAX_EVENTS);
+}
+
 export default function EventsPanel() {
   const [events, setEvents] = useState<EventDto[]>([]);
   const [statusFilter, setStatusFilter] = useState<EventStatus | undefined>(
@@ -44,18 +63,21 @@ export default function EventsPanel() {
   );
 
   useEffect(() => {
+    // подписка до загрузки, чтобы не пропустить события между ними
+    const unsubscribe = subscribeEvents(
+      (_kind, event) =>
+        setEvents((prev) => mergeEvent(prev, event, statusFilter)),
+      () => loadEvents(statusFilter)
+    );
     loadEvents(statusFilter);
-    const timer = setInterval(() => {
-      loadEvents(statusFilter);
-    }, 5000);
 
-    return () => clearInterval(timer);
+    return unsubscribe;
   }, [statusFilter, loadEvents]);
 
   const handleConfirm = async (id: number) => {
     try {
-      await updateEventStatus(id, "confirmed");
-      await loadEvents(statusFilter);
+      const updated = await updateEventStatus(id, "confirmed");
+      setEvents((prev) => mergeEvent(prev, updated, statusFilter));
     } catch (e) {
       console.error(e);
     }
@@ -63,8 +85,8 @@ export default function EventsPanel() {
 
   const handleDismiss = async (id: number) => {
     try {
-      await updateEventStatus(id, "dismissed");
-      await loadEvents(statusFilter);
+      const updated = await updateEventStatus(id, "dismissed");
+      setEvents((prev) => mergeEvent(prev, updated, statusFilter));
     } catch (e) {
       console.error(e);
     }
@@ -33,12 +33,23 @@ export default function ImageModal({ event, onClose }: ImageModalProps) {
         </div>
 
         <div className="flex-1 bg-black flex items-center justify-center">
-          {/* eslint-disable-next-line jsx-a11y/img-redundant-alt */}
-          <img
-            src={event.frame_snapshot_url}
-            alt={`Event ${event.id} full image`}
-            className="max-h-[80vh] w-auto object-contain"
-          />
+          {event.clip_url ? (
+            <video
+              src={event.clip_url}
+              poster={event.frame_snapshot_url}
+              controls
+              autoPlay
+              muted
+              className="max-h-[80vh] w-auto object-contain"
+            />
+          ) : (
+            /* eslint-disable-next-line jsx-a11y/img-redundant-alt */
+            <img
+              src={event.frame_snapshot_url}
+              alt={`Event ${event.id} full image`}
+              className="max-h-[80vh] w-auto object-contain"
+            />
+          )}
         </div>
 
         <div className="px-4 py-2 border-t border-slate-800 text-xs text-slate-400 flex flex-wrap gap-x-4 gap-y-1">